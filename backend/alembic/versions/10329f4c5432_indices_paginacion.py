@@ -0,0 +1,29 @@
+"""indices para paginacion keyset del catalogo
+
+Revision ID: 10329f4c5432
+Revises: ea9659b51b8f
+Create Date: 2026-10-18 10:02:17.884120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '10329f4c5432'
+down_revision: Union[str, None] = 'ea9659b51b8f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Orden del catálogo público: (titulo, id) y (nombre, id)
+    op.create_index('ix_libros_titulo_id', 'libros', ['titulo', 'id'])
+    op.create_index('ix_recursos_nombre_id', 'recursos', ['nombre', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_recursos_nombre_id', table_name='recursos')
+    op.drop_index('ix_libros_titulo_id', table_name='libros')
@@ -0,0 +1,55 @@
+"""indices compuestos para las consultas calientes de reservas
+
+Revision ID: 203a40dc0f66
+Revises: 9222145e26a7
+Create Date: 2026-10-18 16:10:37.559204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '203a40dc0f66'
+down_revision: Union[str, None] = '9222145e26a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # IF NOT EXISTS: el create_all del arranque crea lo que declaran los modelos
+    # Disponibilidad de salas: recurso + estado, rango sobre hora_inicio
+    op.create_index('ix_reservas_recurso_estado_inicio', 'reservas', ['recurso_id', 'estado', 'hora_inicio'], if_not_exists=True)
+    # Reservas vivas de un libro que se solapan con un periodo
+    op.create_index('ix_reservas_libro_estado_periodo', 'reservas', ['libro_id', 'estado', 'hora_inicio', 'hora_fin'], if_not_exists=True)
+    # Límites por usuario (turnos del día, préstamos activos)
+    op.create_index('ix_reservas_usuario_tipo_estado', 'reservas', ['usuario_dni', 'tipo_servicio', 'estado'], if_not_exists=True)
+    # Listado admin (filtro por estado y/o día, orden por fecha) y KPIs
+    op.create_index('ix_reservas_estado_fecha', 'reservas', ['estado', 'fecha_reserva'], if_not_exists=True)
+    op.create_index('ix_reservas_fecha_reserva', 'reservas', ['fecha_reserva'], if_not_exists=True)
+
+    # Escaneo de QR por qr_token: el modelo lo declara unique, pero las bases
+    # creadas antes de eso no tienen la restricción (ni su índice).
+    op.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_index i
+                JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+                WHERE i.indrelid = 'reservas'::regclass AND i.indnatts = 1 AND a.attname = 'qr_token'
+            ) THEN
+                CREATE UNIQUE INDEX ix_reservas_qr_token ON reservas (qr_token);
+            END IF;
+        END $$
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_reservas_qr_token")
+    op.drop_index('ix_reservas_fecha_reserva', table_name='reservas')
+    op.drop_index('ix_reservas_estado_fecha', table_name='reservas')
+    op.drop_index('ix_reservas_usuario_tipo_estado', table_name='reservas')
+    op.drop_index('ix_reservas_libro_estado_periodo', table_name='reservas')
+    op.drop_index('ix_reservas_recurso_estado_inicio', table_name='reservas')
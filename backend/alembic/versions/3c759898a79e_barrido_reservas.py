@@ -0,0 +1,41 @@
+"""marca de strike por reserva e indices del barrido de vencidas
+
+Revision ID: 3c759898a79e
+Revises: 203a40dc0f66
+Create Date: 2026-10-18 17:03:12.480915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c759898a79e'
+down_revision: Union[str, None] = '203a40dc0f66'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Cuándo se aplicó el strike de esta reserva (NO_SHOW o devolución tardía):
+    # evita cobrarlo dos veces entre el barrido y el check-out.
+    # (IF NOT EXISTS: el create_all del arranque crea lo que declaran los modelos)
+    op.execute("ALTER TABLE reservas ADD COLUMN IF NOT EXISTS strike_aplicado_en timestamp without time zone")
+
+    # Índices parciales chicos: solo las filas candidatas del barrido
+    op.create_index(
+        'ix_reservas_barrido_salas', 'reservas', ['hora_inicio'],
+        postgresql_where=sa.text("estado = 'PENDIENTE' AND tipo_servicio = 'SALA'"), if_not_exists=True,
+    )
+    op.create_index(
+        'ix_reservas_barrido_prestamos', 'reservas', ['hora_fin'],
+        postgresql_where=sa.text("estado = 'ENTREGADO' AND strike_aplicado_en IS NULL"), if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_reservas_barrido_prestamos', table_name='reservas')
+    op.drop_index('ix_reservas_barrido_salas', table_name='reservas')
+    op.drop_column('reservas', 'strike_aplicado_en')
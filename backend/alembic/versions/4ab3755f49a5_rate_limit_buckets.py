@@ -0,0 +1,38 @@
+"""token buckets compartidos para rate limiting
+
+Revision ID: 4ab3755f49a5
+Revises: 3c759898a79e
+Create Date: 2026-10-18 18:41:07.220394
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4ab3755f49a5'
+down_revision: Union[str, None] = '3c759898a79e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # UNLOGGED: sin WAL (se escribe en cada request limitado); tras un crash
+    # la tabla queda vacía, que para buckets equivale a "todos llenos".
+    # Idempotente: el create_all del arranque crea lo que declaran los modelos
+    if not sa.inspect(op.get_bind()).has_table('rate_limit_buckets'):
+        op.create_table(
+            'rate_limit_buckets',
+            sa.Column('clave', sa.String(), nullable=False),
+            sa.Column('tokens', sa.Float(), nullable=False),
+            sa.Column('permitido', sa.Boolean(), nullable=False),
+            sa.Column('actualizado', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+            sa.PrimaryKeyConstraint('clave'),
+            prefixes=['UNLOGGED'],
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('rate_limit_buckets')
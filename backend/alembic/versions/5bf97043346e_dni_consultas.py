@@ -0,0 +1,44 @@
+"""cache persistente de DNI y verificacion diferida de usuarios
+
+Revision ID: 5bf97043346e
+Revises: 4ab3755f49a5
+Create Date: 2026-10-18 19:26:51.903117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5bf97043346e'
+down_revision: Union[str, None] = '4ab3755f49a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Idempotente: el create_all del arranque crea lo que declaran los modelos
+    if not sa.inspect(op.get_bind()).has_table('dni_consultas'):
+        op.create_table(
+            'dni_consultas',
+            sa.Column('dni', sa.String(length=8), nullable=False),
+            sa.Column('nombre', sa.String(), nullable=False),
+            sa.Column('consultado_en', sa.DateTime(timezone=False), server_default=sa.text('now()'), nullable=False),
+            sa.PrimaryKeyConstraint('dni'),
+        )
+
+    # Los usuarios existentes se validaron al registrarse
+    op.execute("ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS dni_verificado boolean NOT NULL DEFAULT true")
+    # Solo los pendientes (pocos): lo recorre scripts/verificar_dnis.py
+    op.create_index(
+        'ix_usuarios_dni_pendiente', 'usuarios', ['creado_en'],
+        postgresql_where=sa.text('NOT dni_verificado'), if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_usuarios_dni_pendiente', table_name='usuarios')
+    op.drop_column('usuarios', 'dni_verificado')
+    op.drop_table('dni_consultas')
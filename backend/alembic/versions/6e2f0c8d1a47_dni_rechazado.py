@@ -0,0 +1,39 @@
+"""estado terminal para DNI no encontrados en la verificacion diferida
+
+Revision ID: 6e2f0c8d1a47
+Revises: 5bf97043346e
+Create Date: 2026-10-18 21:05:12.480193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e2f0c8d1a47'
+down_revision: Union[str, None] = '5bf97043346e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # IF NOT EXISTS: en una base nueva el create_all del arranque ya la crea
+    op.execute("ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS dni_rechazado boolean NOT NULL DEFAULT false")
+
+    # Los rechazados salen del índice de pendientes: la cola solo tiene reintentables
+    op.execute("DROP INDEX IF EXISTS ix_usuarios_dni_pendiente")
+    op.create_index(
+        'ix_usuarios_dni_pendiente', 'usuarios', ['creado_en'],
+        postgresql_where=sa.text('NOT dni_verificado AND NOT dni_rechazado'),
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_usuarios_dni_pendiente")
+    op.create_index(
+        'ix_usuarios_dni_pendiente', 'usuarios', ['creado_en'],
+        postgresql_where=sa.text('NOT dni_verificado'),
+    )
+    op.drop_column('usuarios', 'dni_rechazado')
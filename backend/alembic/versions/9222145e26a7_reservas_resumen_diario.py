@@ -0,0 +1,106 @@
+"""resumen diario por item para rankings (top libros / top salas)
+
+Revision ID: 9222145e26a7
+Revises: f15e559eb3a7
+Create Date: 2026-10-18 15:02:44.207518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9222145e26a7'
+down_revision: Union[str, None] = 'f15e559eb3a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Idempotente: el create_all del arranque pudo haber creado ya la tabla
+    # (vacía y sin trigger). Trigger y carga inicial se rehacen igual.
+    if not sa.inspect(op.get_bind()).has_table('reservas_resumen_diario'):
+        op.create_table(
+            'reservas_resumen_diario',
+            sa.Column('tipo_servicio', sa.String(), nullable=False),
+            sa.Column('dia', sa.Date(), nullable=False),
+            sa.Column('item_id', sa.Integer(), nullable=False),
+            sa.Column('reservas', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('completadas', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('no_shows', sa.Integer(), nullable=False, server_default='0'),
+            # (tipo, dia) primero: los rankings filtran por tipo y rango de fechas
+            sa.PrimaryKeyConstraint('tipo_servicio', 'dia', 'item_id'),
+        )
+
+    # Cada reserva suma 1 en (tipo, día de fecha_reserva, libro/recurso), y
+    # además en completadas/no_shows según su estado. Igual que la ocupación
+    # diaria: se resta la versión vieja de la fila y se suma la nueva.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION fn_reservas_resumen() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            -- Cambio de estado sin mover la reserva de fila: solo los deltas
+            IF TG_OP = 'UPDATE'
+               AND OLD.tipo_servicio = NEW.tipo_servicio
+               AND OLD.fecha_reserva::date = NEW.fecha_reserva::date
+               AND coalesce(OLD.libro_id, OLD.recurso_id) IS NOT DISTINCT FROM coalesce(NEW.libro_id, NEW.recurso_id) THEN
+                IF coalesce(NEW.libro_id, NEW.recurso_id) IS NOT NULL THEN
+                    UPDATE reservas_resumen_diario
+                    SET completadas = completadas + (NEW.estado::text = 'FINALIZADA')::int - (OLD.estado::text = 'FINALIZADA')::int,
+                        no_shows = no_shows + (NEW.estado::text = 'NO_SHOW')::int - (OLD.estado::text = 'NO_SHOW')::int
+                    WHERE tipo_servicio = NEW.tipo_servicio::text AND dia = NEW.fecha_reserva::date
+                      AND item_id = coalesce(NEW.libro_id, NEW.recurso_id);
+                END IF;
+                RETURN NULL;
+            END IF;
+
+            IF TG_OP IN ('UPDATE', 'DELETE') AND coalesce(OLD.libro_id, OLD.recurso_id) IS NOT NULL THEN
+                UPDATE reservas_resumen_diario
+                SET reservas = reservas - 1,
+                    completadas = completadas - (OLD.estado::text = 'FINALIZADA')::int,
+                    no_shows = no_shows - (OLD.estado::text = 'NO_SHOW')::int
+                WHERE tipo_servicio = OLD.tipo_servicio::text AND dia = OLD.fecha_reserva::date
+                  AND item_id = coalesce(OLD.libro_id, OLD.recurso_id);
+            END IF;
+
+            IF TG_OP IN ('INSERT', 'UPDATE') AND coalesce(NEW.libro_id, NEW.recurso_id) IS NOT NULL THEN
+                INSERT INTO reservas_resumen_diario AS r (tipo_servicio, dia, item_id, reservas, completadas, no_shows)
+                VALUES (NEW.tipo_servicio::text, NEW.fecha_reserva::date, coalesce(NEW.libro_id, NEW.recurso_id), 1,
+                        (NEW.estado::text = 'FINALIZADA')::int, (NEW.estado::text = 'NO_SHOW')::int)
+                ON CONFLICT (tipo_servicio, dia, item_id) DO UPDATE
+                SET reservas = r.reservas + 1,
+                    completadas = r.completadas + EXCLUDED.completadas,
+                    no_shows = r.no_shows + EXCLUDED.no_shows;
+            END IF;
+
+            RETURN NULL;
+        END $$
+    """)
+    op.execute("DROP TRIGGER IF EXISTS trg_reservas_resumen ON reservas")
+    op.execute("""
+        CREATE TRIGGER trg_reservas_resumen
+        AFTER INSERT OR DELETE OR UPDATE OF estado, tipo_servicio, fecha_reserva, libro_id, recurso_id ON reservas
+        FOR EACH ROW EXECUTE FUNCTION fn_reservas_resumen()
+    """)
+
+    # Carga inicial desde el historial existente. CREATE TRIGGER bloquea las
+    # escrituras sobre reservas hasta el commit de la migración, así que nada
+    # se cuela entre el trigger y esta carga.
+    op.execute("DELETE FROM reservas_resumen_diario")
+    op.execute("""
+        INSERT INTO reservas_resumen_diario (tipo_servicio, dia, item_id, reservas, completadas, no_shows)
+        SELECT tipo_servicio::text, fecha_reserva::date, coalesce(libro_id, recurso_id), count(*),
+               count(*) FILTER (WHERE estado::text = 'FINALIZADA'),
+               count(*) FILTER (WHERE estado::text = 'NO_SHOW')
+        FROM reservas
+        WHERE coalesce(libro_id, recurso_id) IS NOT NULL
+        GROUP BY 1, 2, 3
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_reservas_resumen ON reservas")
+    op.execute("DROP FUNCTION IF EXISTS fn_reservas_resumen()")
+    op.drop_table('reservas_resumen_diario')
@@ -0,0 +1,93 @@
+"""garantias en BD contra doble reserva (salas) y sobreventa (libros)
+
+Revision ID: df51773d996a
+Revises: e5377d7e3683
+Create Date: 2026-10-18 12:05:33.417902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'df51773d996a'
+down_revision: Union[str, None] = 'e5377d7e3683'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Misma función que en e5377d7e3683, con un chequeo de stock opcional al final
+_FUNCION = """
+    CREATE OR REPLACE FUNCTION fn_libro_ocupacion() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        ocupaba boolean := false;
+        ocupa boolean := false;
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            ocupaba := OLD.libro_id IS NOT NULL AND OLD.hora_inicio IS NOT NULL AND OLD.hora_fin IS NOT NULL
+                       AND OLD.estado::text IN ('PENDIENTE', 'ENTREGADO');
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            ocupa := NEW.libro_id IS NOT NULL AND NEW.hora_inicio IS NOT NULL AND NEW.hora_fin IS NOT NULL
+                     AND NEW.estado::text IN ('PENDIENTE', 'ENTREGADO');
+        END IF;
+
+        -- PENDIENTE -> ENTREGADO con el mismo rango: nada que mover
+        IF ocupaba AND ocupa AND OLD.libro_id = NEW.libro_id
+           AND OLD.hora_inicio::date = NEW.hora_inicio::date
+           AND OLD.hora_fin::date = NEW.hora_fin::date THEN
+            RETURN NULL;
+        END IF;
+
+        IF ocupaba THEN
+            UPDATE libro_ocupacion_diaria SET reservados = reservados - 1
+            WHERE libro_id = OLD.libro_id
+              AND dia BETWEEN OLD.hora_inicio::date AND OLD.hora_fin::date;
+        END IF;
+
+        IF ocupa THEN
+            INSERT INTO libro_ocupacion_diaria (libro_id, dia, reservados)
+            SELECT NEW.libro_id, d::date, 1
+            FROM generate_series(NEW.hora_inicio::date, NEW.hora_fin::date, interval '1 day') AS d
+            ON CONFLICT (libro_id, dia)
+            DO UPDATE SET reservados = libro_ocupacion_diaria.reservados + 1;
+            {chequeo}
+        END IF;
+
+        RETURN NULL;
+    END $$
+"""
+
+# Si la reserva nueva deja algún día por encima del stock, se aborta la
+# transacción (check_violation -> IntegrityError en SQLAlchemy).
+_CHEQUEO_STOCK = """
+            IF EXISTS (
+                SELECT 1 FROM libro_ocupacion_diaria o
+                JOIN libros l ON l.id = o.libro_id
+                WHERE o.libro_id = NEW.libro_id
+                  AND o.dia BETWEEN NEW.hora_inicio::date AND NEW.hora_fin::date
+                  AND o.reservados > l.stock_total
+            ) THEN
+                RAISE EXCEPTION 'Sin stock para el libro %', NEW.libro_id
+                    USING ERRCODE = 'check_violation', CONSTRAINT = 'ck_libro_ocupacion_stock';
+            END IF;
+"""
+
+
+def upgrade() -> None:
+    # Una sala no puede tener dos reservas vivas en el mismo turno
+    # (IF NOT EXISTS: el create_all del arranque crea los índices de los modelos)
+    op.create_index(
+        'uq_reservas_sala_turno_activo', 'reservas', ['recurso_id', 'hora_inicio'],
+        unique=True, if_not_exists=True,
+        postgresql_where=sa.text("recurso_id IS NOT NULL AND estado IN ('PENDIENTE', 'EN_USO')"),
+    )
+    op.execute(_FUNCION.format(chequeo=_CHEQUEO_STOCK))
+
+
+def downgrade() -> None:
+    op.execute(_FUNCION.format(chequeo=""))
+    op.drop_index('uq_reservas_sala_turno_activo', table_name='reservas')
@@ -0,0 +1,100 @@
+"""ocupacion diaria de libros mantenida por trigger
+
+Revision ID: e5377d7e3683
+Revises: 10329f4c5432
+Create Date: 2026-10-18 11:20:51.093377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5377d7e3683'
+down_revision: Union[str, None] = '10329f4c5432'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Idempotente: el create_all del arranque pudo haber creado ya la tabla
+    # (vacía y sin trigger). Trigger y carga inicial se rehacen igual.
+    if not sa.inspect(op.get_bind()).has_table('libro_ocupacion_diaria'):
+        op.create_table(
+            'libro_ocupacion_diaria',
+            sa.Column('libro_id', sa.Integer(), sa.ForeignKey('libros.id', ondelete='CASCADE'), nullable=False),
+            sa.Column('dia', sa.Date(), nullable=False),
+            sa.Column('reservados', sa.Integer(), nullable=False, server_default='0'),
+            sa.PrimaryKeyConstraint('libro_id', 'dia'),
+        )
+
+    # Una reserva de libro ocupa 1 ejemplar cada día entre hora_inicio y
+    # hora_fin (inclusive) mientras esté PENDIENTE o ENTREGADO. El trigger
+    # resta la versión vieja de la fila y suma la nueva, en la misma
+    # transacción que el INSERT/UPDATE/DELETE sobre reservas.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION fn_libro_ocupacion() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            ocupaba boolean := false;
+            ocupa boolean := false;
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                ocupaba := OLD.libro_id IS NOT NULL AND OLD.hora_inicio IS NOT NULL AND OLD.hora_fin IS NOT NULL
+                           AND OLD.estado::text IN ('PENDIENTE', 'ENTREGADO');
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                ocupa := NEW.libro_id IS NOT NULL AND NEW.hora_inicio IS NOT NULL AND NEW.hora_fin IS NOT NULL
+                         AND NEW.estado::text IN ('PENDIENTE', 'ENTREGADO');
+            END IF;
+
+            -- PENDIENTE -> ENTREGADO con el mismo rango: nada que mover
+            IF ocupaba AND ocupa AND OLD.libro_id = NEW.libro_id
+               AND OLD.hora_inicio::date = NEW.hora_inicio::date
+               AND OLD.hora_fin::date = NEW.hora_fin::date THEN
+                RETURN NULL;
+            END IF;
+
+            IF ocupaba THEN
+                UPDATE libro_ocupacion_diaria SET reservados = reservados - 1
+                WHERE libro_id = OLD.libro_id
+                  AND dia BETWEEN OLD.hora_inicio::date AND OLD.hora_fin::date;
+            END IF;
+
+            IF ocupa THEN
+                INSERT INTO libro_ocupacion_diaria (libro_id, dia, reservados)
+                SELECT NEW.libro_id, d::date, 1
+                FROM generate_series(NEW.hora_inicio::date, NEW.hora_fin::date, interval '1 day') AS d
+                ON CONFLICT (libro_id, dia)
+                DO UPDATE SET reservados = libro_ocupacion_diaria.reservados + 1;
+            END IF;
+
+            RETURN NULL;
+        END $$
+    """)
+    op.execute("DROP TRIGGER IF EXISTS trg_reservas_ocupacion ON reservas")
+    op.execute("""
+        CREATE TRIGGER trg_reservas_ocupacion
+        AFTER INSERT OR DELETE OR UPDATE OF estado, libro_id, hora_inicio, hora_fin ON reservas
+        FOR EACH ROW EXECUTE FUNCTION fn_libro_ocupacion()
+    """)
+
+    # Carga inicial desde el historial existente
+    op.execute("DELETE FROM libro_ocupacion_diaria")
+    op.execute("""
+        INSERT INTO libro_ocupacion_diaria (libro_id, dia, reservados)
+        SELECT r.libro_id, d::date, count(*)
+        FROM reservas r
+        CROSS JOIN LATERAL generate_series(r.hora_inicio::date, r.hora_fin::date, interval '1 day') AS d
+        WHERE r.libro_id IS NOT NULL AND r.hora_inicio IS NOT NULL AND r.hora_fin IS NOT NULL
+          AND r.estado::text IN ('PENDIENTE', 'ENTREGADO')
+        GROUP BY r.libro_id, d::date
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_reservas_ocupacion ON reservas")
+    op.execute("DROP FUNCTION IF EXISTS fn_libro_ocupacion()")
+    op.drop_table('libro_ocupacion_diaria')
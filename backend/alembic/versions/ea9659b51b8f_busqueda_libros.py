@@ -0,0 +1,57 @@
+"""busqueda full-text y trigramas en libros
+
+Revision ID: ea9659b51b8f
+Revises: 768d813068b9
+Create Date: 2026-10-18 09:12:40.512301
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ea9659b51b8f'
+down_revision: Union[str, None] = '768d813068b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # unaccent() es STABLE; para usarlo en columnas generadas e índices
+    # necesitamos un wrapper IMMUTABLE con el diccionario fijo.
+    # (Sin calificar el schema: en Supabase la extensión puede vivir en "extensions")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+        AS $$ SELECT unaccent('unaccent'::regdictionary, $1) $$
+    """)
+
+    # Título pesa más que autor en el ranking
+    op.execute("""
+        ALTER TABLE libros ADD COLUMN IF NOT EXISTS busqueda tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('spanish', f_unaccent(coalesce(titulo, ''))), 'A') ||
+            setweight(to_tsvector('spanish', f_unaccent(coalesce(autor, ''))), 'B')
+        ) STORED
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_libros_busqueda ON libros USING gin (busqueda)")
+
+    # Trigramas para tolerancia a errores de tipeo (operador <% / word_similarity)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_libros_titulo_trgm ON libros USING gin (f_unaccent(lower(titulo)) gin_trgm_ops)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_libros_autor_trgm ON libros USING gin (f_unaccent(lower(autor)) gin_trgm_ops)")
+
+    # Camino rápido por ISBN exacto (se compara sin guiones)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_libros_isbn_normalizado ON libros (replace(isbn, '-', ''))")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_libros_isbn_normalizado")
+    op.execute("DROP INDEX IF EXISTS ix_libros_autor_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_libros_titulo_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_libros_busqueda")
+    op.execute("ALTER TABLE libros DROP COLUMN IF EXISTS busqueda")
+    op.execute("DROP FUNCTION IF EXISTS f_unaccent(text)")
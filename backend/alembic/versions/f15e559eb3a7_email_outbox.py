@@ -0,0 +1,47 @@
+"""outbox transaccional de correos
+
+Revision ID: f15e559eb3a7
+Revises: df51773d996a
+Create Date: 2026-10-18 13:20:08.611342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f15e559eb3a7'
+down_revision: Union[str, None] = 'df51773d996a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Idempotente: el create_all del arranque crea lo que declaran los modelos
+    if not sa.inspect(op.get_bind()).has_table('email_outbox'):
+        op.create_table(
+            'email_outbox',
+            sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('destinatario', sa.String(), nullable=False),
+            sa.Column('asunto', sa.String(), nullable=False),
+            sa.Column('html', sa.Text(), nullable=False),
+            sa.Column('estado', sa.String(), nullable=False, server_default='PENDIENTE'),
+            sa.Column('intentos', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('proximo_intento', sa.DateTime(timezone=False), nullable=False, server_default=sa.text('now()')),
+            sa.Column('ultimo_error', sa.Text(), nullable=True),
+            sa.Column('creado_en', sa.DateTime(timezone=False), server_default=sa.text('now()'), nullable=True),
+            sa.Column('enviado_en', sa.DateTime(timezone=False), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    # El worker solo recorre las pendientes vencidas: índice parcial chico
+    op.create_index(
+        'ix_email_outbox_pendientes', 'email_outbox', ['proximo_intento'],
+        postgresql_where=sa.text("estado = 'PENDIENTE'"), if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_email_outbox_pendientes', table_name='email_outbox')
+    op.drop_table('email_outbox')
@@ -0,0 +1,125 @@
+import hashlib
+import json
+from typing import Callable, FrozenSet
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.paginacion import HEADER_CURSOR, HEADER_TOTAL
+from app.models.models import Libro, Recurso, Sede, Reserva
+
+catalogo_cache = TTLCache(
+    "catalogo_http", maxsize=settings.CATALOGO_CACHE_MAX, ttl=settings.CATALOGO_CACHE_TTL_SECONDS
+)
+
+# Cabeceras del response original que se guardan junto al body
+_HEADERS_CACHEADOS = ("content-type", HEADER_CURSOR.lower(), HEADER_TOTAL.lower())
+_MODELOS_CATALOGO = (Libro, Recurso, Sede)
+# Único listado que depende de las reservas (stock_disponible)
+_RUTA_LIBROS = f"{settings.API_V1_STR}/catalogo/libros"
+
+
+def invalidar_catalogo():
+    catalogo_cache.clear()
+
+
+def invalidar_stock_libros(libro_ids):
+    """Solo las páginas de /catalogo/libros que muestran alguno de esos libros."""
+    ids = set(libro_ids)
+    catalogo_cache.invalidate_where(lambda clave, valor: clave[0] == _RUTA_LIBROS and not ids.isdisjoint(valor[3]))
+
+
+def marcar_catalogo_modificado(session: Session):
+    """Para escrituras con SQL directo, que no pasan por el flush del ORM."""
+    session.info["catalogo_modificado"] = True
+
+
+def marcar_stock_modificado(session: Session, libro_id: int):
+    """Una reserva de libro nueva o que cambió de estado (SQL directo u ORM)."""
+    session.info.setdefault("libros_stock", set()).add(libro_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _marcar_cambios_catalogo(session, flush_context):
+    cambios = list(session.new) + list(session.dirty) + list(session.deleted)
+    if any(isinstance(obj, _MODELOS_CATALOGO) for obj in cambios):
+        marcar_catalogo_modificado(session)
+    for obj in cambios:
+        if isinstance(obj, Reserva) and obj.libro_id:
+            marcar_stock_modificado(session, obj.libro_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_tras_commit(session):
+    # Cualquier alta/edición/baja de libros, recursos o sedes (CRUD de admin.py)
+    libros = session.info.pop("libros_stock", None)
+    if session.info.pop("catalogo_modificado", False):
+        invalidar_catalogo()
+    elif libros:
+        invalidar_stock_libros(libros)
+
+
+def _libros_de(body: bytes) -> FrozenSet[int]:
+    return frozenset(item["id"] for item in json.loads(body))
+
+
+def _clave(request: Request) -> tuple:
+    # Normalizada: orden estable y sin parámetros vacíos (?q= del frontend)
+    params = tuple(sorted((k, v) for k, v in request.query_params.multi_items() if v != ""))
+    return request.url.path, params
+
+
+def _etag_coincide(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (t.strip().removeprefix("W/") for t in header.split(","))
+
+
+def _responder(request: Request, body: bytes, etag: str, headers: dict) -> Response:
+    comunes = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.CATALOGO_CACHE_MAX_AGE}",
+    }
+    if _etag_coincide(request, etag):
+        return Response(status_code=304, headers=comunes)
+    return Response(content=body, headers={**headers, **comunes})
+
+
+class RutaCacheada(APIRoute):
+    """
+    Ruta GET con caché de respuesta en memoria + ETag fuerte.
+    En un hit no se ejecuta el endpoint: ni BD ni serialización Pydantic.
+    """
+
+    def get_route_handler(self) -> Callable:
+        original = super().get_route_handler()
+
+        async def handler(request: Request) -> Response:
+            if request.method != "GET":
+                return await original(request)
+
+            clave = _clave(request)
+            hit = catalogo_cache.get(clave)
+            if hit is not None:
+                return _responder(request, *hit[:3])
+
+            response = await original(request)
+            if response.status_code != 200 or not hasattr(response, "body"):
+                return response
+
+            body = bytes(response.body)
+            etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+            headers = {k: v for k, v in response.headers.items() if k in _HEADERS_CACHEADOS}
+            # Para los libros se guardan los ids de la página (ver invalidar_stock_libros)
+            libros = _libros_de(body) if clave[0] == _RUTA_LIBROS else frozenset()
+            catalogo_cache.set(clave, (body, etag, headers, libros))
+            return _responder(request, body, etag, headers)
+
+        return handler
@@ -1,23 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, or_
-from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, desc, or_, and_, select
+from sqlalchemy.exc import IntegrityError
+from datetime import date, datetime, timedelta, timezone
 from typing import List, Optional
 from fastapi.responses import StreamingResponse
-import csv
-import io
-
-from app.deps import get_db, require_admin
-from app.models.models import Reserva, Usuario, Libro, Recurso, Sede, EstadoReserva, TipoServicio
+import importlib.util
+import time
+
+from app.deps import get_db, get_async_db, require_admin, require_admin_lectura, invalidar_principal
+from app.core.cache import TTLCache, registro as caches
+from app.core.config import settings
+from app.core.hashing import pool_hashing
+from app.core.limitador import limitador
+from app.core.paginacion import decodificar_cursor, cortar_pagina, escribir_headers, estimar_filas
+from app.db.session import engine, pool_metrics, async_engine, async_pool_metrics
+from app.models.models import Reserva, Usuario, Libro, Recurso, Sede, EstadoReserva, TipoServicio, EmailOutbox, ReservaResumenDiario
 from app.schemas.inventario import (
     LibroCreate, LibroUpdate, LibroOut, 
     RecursoCreate, RecursoUpdate, RecursoOut, 
     SedeCreate, SedeUpdate, SedeOut
 )
-from app.schemas.reserva import ReservaOut
+from app.schemas.reserva import ReservaOut, EscaneoLote, EscaneoResultado
+from app.core.security import QR_PREFIJO, QRInvalido, verificar_qr
+from app.services.asistencia import no_show_revertible, procesar_escaneo, rechazo_por_ventana
+from app.services.apiperu import cliente_apiperu, verificar_pendientes
+from app.services.barrido import barrer_reservas, barrendero
+from app.services.disponibilidad import rango_del_dia
+from app.services.exportacion import (
+    consulta_reservas, consulta_usuarios, consulta_libros, consulta_recursos, csv_en_bloques,
+    consulta_reservas_historial, columnar_en_bloques, EXTENSIONES_COLUMNAR,
+)
+from app.services.outbox import worker as outbox_worker
 
 router = APIRouter()
 
+kpi_cache = TTLCache("kpis", maxsize=8, ttl=settings.KPI_CACHE_TTL_SECONDS)
+
 # --- UTILITARIOS ---
 TZ_PERU = timezone(timedelta(hours=-5))
 
@@ -37,14 +57,19 @@ def generar_codigo_inventario(db: Session, sede_id: int, tipo: str) -> str:
     count = db.query(Libro if tipo == "LIBRO" else Recurso).filter_by(sede_id=sede_id).count()
     return f"{sede.codigo}-{prefijo}-{count + 1:04d}"
 
+# Dos lecturas del mismo QR en menos de esto son la misma (lote offline)
+ESCANEO_DUPLICADO_SEGUNDOS = 60
+
 def aplicar_strike(db: Session, dni: str):
-    user = db.query(Usuario).filter(Usuario.dni == dni).first()
+    # FOR UPDATE + releer: el barrido suma strikes con SQL directo en paralelo
+    user = db.query(Usuario).filter(Usuario.dni == dni).with_for_update().populate_existing().first()
     if user:
         user.strikes += 1
         # Si llega a 3 strikes, banear por 6 meses desde HOY
         if user.strikes >= 3:
             user.banned_until = get_now_peru() + timedelta(days=180)
         db.add(user)
+        invalidar_principal(db, dni)
 
 # =================================================================
 # 1. VALIDACIÓN DE ASISTENCIA (BLINDADA)
@@ -56,86 +81,156 @@ def validar_asistencia(
     db: Session = Depends(get_db), 
     admin = Depends(require_admin)
 ):
-    # Buscar por token (QR) o código legible
-    reserva = db.query(Reserva).filter(
-        or_(Reserva.qr_token == qr_token, Reserva.code == qr_token)
-    ).first()
+    ahora = get_now_peru() # Hora exacta Perú
+
+    if qr_token.startswith(QR_PREFIJO):
+        # QR firmado: firma y ventana se validan sin tocar la BD
+        try:
+            qr = verificar_qr(qr_token)
+        except QRInvalido:
+            raise HTTPException(404, "Reserva no encontrada o código inválido.")
+        rechazo = rechazo_por_ventana(qr, ahora)
+        if rechazo:
+            raise HTTPException(400, rechazo)
+        reserva = db.query(Reserva).filter(Reserva.code == qr.code).with_for_update(of=Reserva).first()
+    else:
+        # QR antiguo (uuid) o código legible tipeado
+        reserva = db.query(Reserva).filter(
+            or_(Reserva.qr_token == qr_token, Reserva.code == qr_token)
+        ).with_for_update(of=Reserva).first()
 
     if not reserva:
         raise HTTPException(404, "Reserva no encontrada o código inválido.")
 
-    ahora = get_now_peru() # Hora exacta Perú
+    resultado = procesar_escaneo(reserva, ahora, lambda dni: aplicar_strike(db, dni))
+    db.commit()  # también en NO_SHOW: el strike queda registrado
+    if not resultado.ok:
+        raise HTTPException(400, resultado.mensaje)
 
-    # --- CASO 1: CHECK-IN (Entrada / Recojo) ---
-    if reserva.estado == EstadoReserva.PENDIENTE:
-        
-        # REGLA CRÍTICA: No permitir entrada antes de tiempo
-        # Damos un margen de cortesía de 15 min antes (opcional)
-        inicio_permitido = reserva.hora_inicio - timedelta(minutes=15)
-        
-        if ahora < inicio_permitido:
-            falta = reserva.hora_inicio - ahora
-            # Formato amigable de tiempo restante
-            dias = falta.days
-            horas, resto = divmod(falta.seconds, 3600)
-            minutos = resto // 60
-            
-            tiempo_txt = f"{horas}h {minutos}m"
-            if dias > 0:
-                tiempo_txt = f"{dias} días, {tiempo_txt}"
-            
-            raise HTTPException(400, f"Aún no inicia tu reserva. Faltan {tiempo_txt}.")
-
-        # Validación de Tolerancia (Solo Salas) - Llegada tarde
-        if reserva.tipo_servicio == TipoServicio.SALA:
-            limite_tolerancia = reserva.hora_inicio + timedelta(minutes=20)
-            if ahora > limite_tolerancia:
-                reserva.estado = EstadoReserva.NO_SHOW
-                aplicar_strike(db, reserva.usuario_dni)
-                db.commit()
-                raise HTTPException(400, "Tolerancia de 20 min excedida. Se aplicó Strike y se canceló el turno.")
-
-        # Check-in Exitoso
-        reserva.estado = EstadoReserva.EN_USO if reserva.tipo_servicio == TipoServicio.SALA else EstadoReserva.ENTREGADO
-        reserva.check_in_at = ahora
-        db.commit()
-        
-        return {
-            "status": "CHECK-IN EXITOSO", 
-            "mensaje": f"Entrada registrada a las {ahora.strftime('%H:%M')}.",
-            "usuario": {"nombre": reserva.usuario.nombre, "dni": reserva.usuario_dni}
-        }
-
-    # --- CASO 2: CHECK-OUT (Salida / Devolución) ---
-    elif reserva.estado in [EstadoReserva.EN_USO, EstadoReserva.ENTREGADO]:
-        
-        reserva.estado = EstadoReserva.FINALIZADA
-        reserva.check_out_at = ahora
-        
-        mensaje_extra = ""
-        
-        # REGLA CRÍTICA: Devolución Tardía = Strike
-        if ahora > reserva.hora_fin:
-            aplicar_strike(db, reserva.usuario_dni)
-            retraso = ahora - reserva.hora_fin
-            
-            # Calcular cuánto se pasó
-            dias = retraso.days
-            horas = retraso.seconds // 3600
-            
-            tiempo_txt = f"{dias} días" if dias > 0 else f"{horas} horas"
-            mensaje_extra = f"⚠️ ENTREGA TARDÍA (+{tiempo_txt}). Se aplicó 1 Strike."
-        
-        db.commit()
-        
-        return {
-            "status": "CHECK-OUT REGISTRADO", 
-            "mensaje": f"Salida registrada. {mensaje_extra}",
-            "usuario": {"nombre": reserva.usuario.nombre, "dni": reserva.usuario_dni}
-        }
+    return {
+        "status": resultado.status,
+        "mensaje": resultado.mensaje,
+        "usuario": {"nombre": reserva.usuario.nombre, "dni": reserva.usuario_dni}
+    }
 
-    else:
-        raise HTTPException(400, f"La reserva ya finalizó o fue cancelada (Estado: {reserva.estado}).")
+@router.post("/validar-qr/lote", response_model=List[EscaneoResultado])
+def validar_asistencia_lote(
+    lote: EscaneoLote,
+    db: Session = Depends(get_db),
+    admin = Depends(require_admin)
+):
+    """
+    Sincroniza escaneos hechos sin conexión: mismas reglas que /validar-qr,
+    evaluadas con la hora del dispositivo y en orden cronológico, en una sola
+    transacción (dos SELECT para todo el lote y un commit).
+    """
+    ahora = get_now_peru()
+    limite_futuro = ahora + timedelta(minutes=5)  # tolerancia al desfase de reloj
+    # Más viejo que esto ya no puede ser un QR vigente (misma vigencia que el QR firmado)
+    limite_pasado = ahora - timedelta(days=settings.QR_VIGENCIA_TRAS_FIN_DIAS)
+
+    # QR firmados verificados (sin BD); los que no validan quedan sin reserva
+    qr_de = {}
+    antiguos = set()
+    for e in lote.escaneos:
+        if e.token.startswith(QR_PREFIJO):
+            try:
+                qr_de[e.token] = verificar_qr(e.token)
+            except QRInvalido:
+                pass
+        else:
+            antiguos.add(e.token)
+
+    filtro = Reserva.code.in_({qr.code for qr in qr_de.values()} | antiguos)
+    if antiguos:
+        filtro = or_(filtro, Reserva.qr_token.in_(antiguos))
+    reservas = db.query(Reserva).filter(filtro).with_for_update(of=Reserva).all()
+    por_codigo = {r.code: r for r in reservas}
+    por_qr = {r.qr_token: r for r in reservas}
+
+    def buscar(token: str):
+        if token in qr_de:
+            return por_codigo.get(qr_de[token].code)
+        return por_qr.get(token) or por_codigo.get(token)
+
+    usuarios = {
+        u.dni: u for u in db.query(Usuario).filter(
+            Usuario.dni.in_({r.usuario_dni for r in reservas})
+        ).with_for_update().all()
+    }
+
+    def cobrar_strike(dni: str):
+        user = usuarios.get(dni)
+        if user:
+            user.strikes += 1
+            if user.strikes >= 3:
+                user.banned_until = ahora + timedelta(days=180)
+            invalidar_principal(db, dni)
+
+    def descontar_strike(dni: str):
+        user = usuarios.get(dni)
+        if user:
+            user.strikes = max(user.strikes - 1, 0)
+            # El baneo solo se aplica al llegar a 3: por debajo ya no corresponde
+            if user.strikes < 3:
+                user.banned_until = None
+            invalidar_principal(db, dni)
+
+    resultados = [None] * len(lote.escaneos)
+    ultimo_escaneo = {}  # reserva.id -> hora del último escaneo aplicado
+    orden = sorted(range(len(lote.escaneos)), key=lambda i: lote.escaneos[i].escaneado_en_peru())
+    for i in orden:
+        escaneo = lote.escaneos[i]
+        hora = escaneo.escaneado_en_peru()
+        reserva = buscar(escaneo.token)
+        base = {"id_local": escaneo.id_local, "token": escaneo.token}
+
+        if reserva is None:
+            resultados[i] = EscaneoResultado(**base, ok=False, status="NO_ENCONTRADA", mensaje="Reserva no encontrada o código inválido.")
+            continue
+        base.update(reserva_id=reserva.id, dni=reserva.usuario_dni)
+        if hora > limite_futuro:
+            resultados[i] = EscaneoResultado(**base, ok=False, status="RECHAZADO", mensaje="Hora del escaneo en el futuro.")
+            continue
+        if hora < limite_pasado:
+            resultados[i] = EscaneoResultado(**base, ok=False, status="RECHAZADO", mensaje="Hora del escaneo demasiado antigua.")
+            continue
+        # Igual que /validar-qr, pero con la hora del dispositivo
+        rechazo = rechazo_por_ventana(qr_de[escaneo.token], hora) if escaneo.token in qr_de else None
+        if rechazo:
+            resultados[i] = EscaneoResultado(**base, ok=False, status="RECHAZADO", mensaje=rechazo)
+            continue
+        previo = ultimo_escaneo.get(reserva.id)
+        if previo is not None and hora - previo < timedelta(seconds=ESCANEO_DUPLICADO_SEGUNDOS):
+            # Lectura doble del mismo QR: no debe convertirse en check-out inmediato
+            resultados[i] = EscaneoResultado(**base, ok=False, status="DUPLICADO", mensaje="Escaneo repetido, se ignoró.")
+            continue
+
+        if no_show_revertible(reserva, hora):
+            # Llegó a tiempo: se devuelve el strike y se registra la entrada.
+            # El NO_SHOW liberó el turno y otro pudo reservarlo: el índice único
+            # lo detecta en el savepoint y solo este escaneo queda rechazado.
+            try:
+                with db.begin_nested():
+                    reserva.estado = EstadoReserva.PENDIENTE
+                    reserva.strike_aplicado_en = None
+                    descontar_strike(reserva.usuario_dni)
+            except IntegrityError as e:
+                if getattr(getattr(e.orig, "diag", None), "constraint_name", None) != "uq_reservas_sala_turno_activo":
+                    raise
+                resultados[i] = EscaneoResultado(
+                    **base, ok=False, status="CONFLICTO",
+                    mensaje="El turno ya fue reservado por otra persona; se mantiene el NO_SHOW.",
+                )
+                continue
+
+        resultado = procesar_escaneo(reserva, hora, cobrar_strike)
+        if resultado.ok or resultado.status == "NO_SHOW":
+            ultimo_escaneo[reserva.id] = hora
+        resultados[i] = EscaneoResultado(**base, **resultado._asdict())
+
+    db.commit()
+    return resultados
 
 # =================================================================
 # 2. GESTIÓN DE SEDES (CRUD COMPLETO CON AUTO-CÓDIGO)
@@ -158,7 +253,7 @@ def crear_sede(sede_in: SedeCreate, db: Session = Depends(get_db), admin = Depen
     return nueva
 
 @router.get("/sedes", response_model=List[SedeOut])
-def listar_sedes(db: Session = Depends(get_db), admin = Depends(require_admin)):
+def listar_sedes(db: Session = Depends(get_db), admin = Depends(require_admin_lectura)):
     return db.query(Sede).all()
 
 @router.put("/sedes/{sede_id}", response_model=SedeOut)
@@ -219,8 +314,26 @@ def crear_libro(item: LibroCreate, db: Session = Depends(get_db), admin = Depend
 
 # NUEVO: Listar TODO para el admin (público solo ve disponible=True)
 @router.get("/libros", response_model=List[LibroOut])
-def listar_libros_admin(db: Session = Depends(get_db), admin = Depends(require_admin)):
-    return db.query(Libro).order_by(Libro.id.desc()).all()
+def listar_libros_admin(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    estimar_total: bool = False,
+    db: Session = Depends(get_db), 
+    admin = Depends(require_admin_lectura)
+):
+    query = db.query(Libro)
+    total = estimar_filas(db, query.statement) if estimar_total else None
+
+    # Keyset sobre la PK: la página N cuesta lo mismo que la primera
+    after = decodificar_cursor(cursor, "id")
+    if after:
+        query = query.filter(Libro.id < after["id"])
+    filas = query.order_by(Libro.id.desc()).limit(limit + 1).all()
+
+    libros, siguiente = cortar_pagina(filas, limit, lambda l: {"id": l.id})
+    escribir_headers(response, siguiente, total)
+    return libros
 
 # Actualizar (Ya lo tenías)
 @router.put("/libros/{libro_id}", response_model=LibroOut)
@@ -282,8 +395,25 @@ def crear_recurso(item: RecursoCreate, db: Session = Depends(get_db), admin = De
 
 # NUEVO: Listar TODO para admin
 @router.get("/recursos", response_model=List[RecursoOut])
-def listar_recursos_admin(db: Session = Depends(get_db), admin = Depends(require_admin)):
-    return db.query(Recurso).order_by(Recurso.id.desc()).all()
+def listar_recursos_admin(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    estimar_total: bool = False,
+    db: Session = Depends(get_db), 
+    admin = Depends(require_admin_lectura)
+):
+    query = db.query(Recurso)
+    total = estimar_filas(db, query.statement) if estimar_total else None
+
+    after = decodificar_cursor(cursor, "id")
+    if after:
+        query = query.filter(Recurso.id < after["id"])
+    filas = query.order_by(Recurso.id.desc()).limit(limit + 1).all()
+
+    recursos, siguiente = cortar_pagina(filas, limit, lambda r: {"id": r.id})
+    escribir_headers(response, siguiente, total)
+    return recursos
 
 @router.put("/recursos/{recurso_id}", response_model=RecursoOut)
 def actualizar_recurso(recurso_id: int, item: RecursoUpdate, db: Session = Depends(get_db), admin = Depends(require_admin)):
@@ -328,112 +458,266 @@ def listar_reservas_admin(
     estado: Optional[EstadoReserva] = None,
     fecha: Optional[str] = None, # YYYY-MM-DD
     db: Session = Depends(get_db), 
-    admin = Depends(require_admin)
+    admin = Depends(require_admin_lectura)
 ):
     query = db.query(Reserva)
     if estado:
         query = query.filter(Reserva.estado == estado)
     if fecha:
         try:
-            fecha_dt = datetime.strptime(fecha, "%Y-%m-%d").date()
-            query = query.filter(func.date(Reserva.fecha_reserva) == fecha_dt)
+            inicio, fin = rango_del_dia(datetime.strptime(fecha, "%Y-%m-%d").date())
+            query = query.filter(Reserva.fecha_reserva >= inicio, Reserva.fecha_reserva < fin)
         except ValueError:
             pass
     return query.order_by(desc(Reserva.fecha_reserva)).limit(100).all()
 
 # --- NUEVO: EXPORTACIÓN DE DATOS (CSV) ---
 @router.get("/reportes/exportar/{tipo}")
-def exportar_data(tipo: str, db: Session = Depends(get_db), admin = Depends(require_admin)):
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
+def exportar_data(
+    tipo: str,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    sede_id: Optional[int] = None,
+    gzip: bool = False,
+    formato: str = "csv",
+    particionar: Optional[str] = None,
+    admin = Depends(require_admin_lectura),
+):
+    """
+    CSV en streaming (memoria constante). desde/hasta filtran por fecha de
+    reserva (reservas) o de registro (usuarios); sede_id por sede.
+    Para reservas también formato=parquet|arrow (columnar, con tipos), con
+    particionar=mes opcional (ZIP con un archivo por mes).
+    """
+    if formato != "csv":
+        return _exportar_columnar(tipo, formato, particionar, desde, hasta, sede_id)
+
     filename = f"reporte_{tipo}_{datetime.now().strftime('%Y%m%d')}.csv"
-    
+
     if tipo == "reservas":
-        # Encabezados
-        writer.writerow(["ID", "Codigo", "Usuario", "Servicio", "Fecha", "Estado", "Sede"])
-        reservas = db.query(Reserva).all()
-        for r in reservas:
-            # Obtener nombre sede
-            sede_nom = "-"
-            if r.libro and r.libro.sede_rel: sede_nom = r.libro.sede_rel.nombre
-            elif r.recurso and r.recurso.sede_rel: sede_nom = r.recurso.sede_rel.nombre
-            
-            writer.writerow([
-                r.id, r.code, r.usuario_dni, r.tipo_servicio, 
-                r.fecha_reserva, r.estado, sede_nom
-            ])
-            
+        encabezado = ["ID", "Codigo", "Usuario", "Servicio", "Fecha", "Estado", "Sede"]
+        secciones = [(consulta_reservas(desde, hasta, sede_id), None)]
+
     elif tipo == "usuarios":
-        writer.writerow(["DNI", "Nombre", "Email", "Strikes", "Estado"])
-        users = db.query(Usuario).all()
-        for u in users:
-            estado = "BANEADO" if (u.banned_until and u.banned_until > datetime.now(timezone.utc)) else "ACTIVO"
-            writer.writerow([u.dni, u.nombre, u.email, u.strikes, estado])
-            
+        if sede_id:
+            raise HTTPException(400, "El filtro por sede no aplica a usuarios")
+        encabezado = ["DNI", "Nombre", "Email", "Strikes", "Estado"]
+        ahora = get_now_peru()
+        secciones = [(consulta_usuarios(desde, hasta), lambda u: [
+            u.dni, u.nombre, u.email, u.strikes,
+            "BANEADO" if (u.banned_until and u.banned_until > ahora) else "ACTIVO",
+        ])]
+
     elif tipo == "inventario":
-        writer.writerow(["Codigo", "Tipo", "Nombre/Titulo", "Sede", "Estado", "Stock/Capacidad"])
-        libros = db.query(Libro).all()
-        recursos = db.query(Recurso).all()
-        
-        for l in libros:
-            writer.writerow([l.codigo_inventario, "LIBRO", l.titulo, l.sede_rel.nombre, 
-                             "DISPONIBLE" if l.disponible else "AGOTADO", l.stock_total])
-        for r in recursos:
-            writer.writerow([r.codigo_inventario, r.tipo_recurso, r.nombre, r.sede_rel.nombre, 
-                             "ACTIVO" if r.disponible else "INACTIVO", r.capacidad])
-            
+        encabezado = ["Codigo", "Tipo", "Nombre/Titulo", "Sede", "Estado", "Stock/Capacidad"]
+        secciones = [
+            (consulta_libros(sede_id), lambda l: [
+                l.codigo_inventario, "LIBRO", l.titulo, l.sede,
+                "DISPONIBLE" if l.disponible else "AGOTADO", l.stock_total,
+            ]),
+            (consulta_recursos(sede_id), lambda r: [
+                r.codigo_inventario, r.tipo_recurso, r.nombre, r.sede,
+                "ACTIVO" if r.disponible else "INACTIVO", r.capacidad,
+            ]),
+        ]
+
     else:
         raise HTTPException(400, "Tipo de reporte no válido (reservas, usuarios, inventario)")
-    
-    output.seek(0)
+
+    if gzip:
+        filename += ".gz"
     return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
+        csv_en_bloques(encabezado, secciones, comprimir=gzip),
+        media_type="application/gzip" if gzip else "text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+def _exportar_columnar(tipo, formato, particionar, desde, hasta, sede_id):
+    if tipo != "reservas":
+        raise HTTPException(400, "El formato columnar solo está disponible para reservas")
+    if formato not in EXTENSIONES_COLUMNAR:
+        raise HTTPException(400, "Formato no válido (csv, parquet, arrow)")
+    if particionar not in (None, "mes"):
+        raise HTTPException(400, "Partición no válida (mes)")
+    if importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(501, "Exportación columnar no disponible: falta pyarrow")
+
+    filename = f"reservas_{datetime.now().strftime('%Y%m%d')}"
+    if particionar:
+        filename, media_type = f"{filename}_por_mes.zip", "application/zip"
+    elif formato == "parquet":
+        filename, media_type = f"{filename}.parquet", "application/vnd.apache.parquet"
+    else:
+        filename, media_type = f"{filename}.arrows", "application/vnd.apache.arrow.stream"
+    return StreamingResponse(
+        columnar_en_bloques(consulta_reservas_historial(desde, hasta, sede_id), formato, particionar == "mes"),
+        media_type=media_type,
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 # --- DASHBOARD JSON (KPIs) ---
 @router.get("/reportes/general")
-def reporte_general(db: Session = Depends(get_db), admin = Depends(require_admin)):
-    total_usuarios = db.query(Usuario).count()
-    usuarios_baneados = db.query(Usuario).filter(Usuario.banned_until > datetime.now(timezone.utc)).count()
-    reservas_activas = db.query(Reserva).filter(Reserva.estado.in_([EstadoReserva.EN_USO, EstadoReserva.ENTREGADO])).count()
-    no_shows_hoy = db.query(Reserva).filter(
-        Reserva.estado == EstadoReserva.NO_SHOW,
-        func.date(Reserva.fecha_reserva) == datetime.now().date()
-    ).count()
-    
+def reporte_general(refrescar: bool = False, db: Session = Depends(get_db), admin = Depends(require_admin_lectura)):
+    """
+    KPIs del dashboard en una sola consulta (count ... FILTER), cacheados
+    unos segundos: varios admins con el dashboard abierto comparten la lectura.
+    """
+    cacheado = None if refrescar else kpi_cache.get("general")
+    if cacheado is None:
+        ahora = get_now_peru()
+        hoy, manana = rango_del_dia(ahora.date())
+        en_curso = Reserva.estado.in_([EstadoReserva.EN_USO, EstadoReserva.ENTREGADO])
+        falta_hoy = and_(
+            Reserva.estado == EstadoReserva.NO_SHOW,
+            Reserva.fecha_reserva >= hoy, Reserva.fecha_reserva < manana,
+        )
+        usuarios = select(
+            func.count().label("total_usuarios"),
+            func.count().filter(Usuario.banned_until > ahora).label("usuarios_baneados"),
+        ).subquery()
+        reservas = select(
+            func.count().filter(en_curso).label("reservas_en_curso"),
+            func.count().filter(falta_hoy).label("faltas_hoy"),
+        ).where(or_(en_curso, falta_hoy)).subquery()
+        fila = db.execute(select(usuarios, reservas)).one()
+        cacheado = (dict(fila._mapping), ahora, time.monotonic())
+        kpi_cache.set("general", cacheado)
+
+    kpis, generado_en, generado_mono = cacheado
     return {
-        "total_usuarios": total_usuarios,
-        "usuarios_baneados": usuarios_baneados,
-        "reservas_en_curso": reservas_activas,
-        "faltas_hoy": no_shows_hoy
+        **kpis,
+        # Frescura: el dashboard puede mostrar "actualizado hace N s"
+        "generado_en": generado_en.isoformat(),
+        "edad_segundos": round(time.monotonic() - generado_mono, 1),
+        "ttl_segundos": kpi_cache.ttl,
     }
 
+def _ranking(modelo, nombre, tipo: TipoServicio, limit: int, desde: Optional[date], hasta: Optional[date], sede_id: Optional[int]):
+    """Ranking por item leyendo solo el resumen diario (nunca el historial de reservas)."""
+    total = func.sum(ReservaResumenDiario.reservas).label("total")
+    query = select(
+        nombre, total,
+        func.sum(ReservaResumenDiario.completadas).label("completadas"),
+        func.sum(ReservaResumenDiario.no_shows).label("no_shows"),
+    ).join(modelo, modelo.id == ReservaResumenDiario.item_id)\
+     .where(ReservaResumenDiario.tipo_servicio == tipo.value)
+    if desde:
+        query = query.where(ReservaResumenDiario.dia >= desde)
+    if hasta:
+        query = query.where(ReservaResumenDiario.dia <= hasta)
+    if sede_id:
+        query = query.where(modelo.sede_id == sede_id)
+    return query.group_by(modelo.id, nombre).order_by(desc(total), modelo.id).limit(limit)
+
 @router.get("/reportes/top-libros")
-def top_libros(limit: int = 5, db: Session = Depends(get_db), admin = Depends(require_admin)):
-    results = db.query(Libro.titulo, func.count(Reserva.id).label("total"))\
-        .join(Reserva, Reserva.libro_id == Libro.id)\
-        .filter(Reserva.tipo_servicio == TipoServicio.LIBRO)\
-        .group_by(Libro.id, Libro.titulo)\
-        .order_by(desc("total")).limit(limit).all()
-    return [{"titulo": r[0], "solicitudes": r[1]} for r in results]
+def top_libros(
+    limit: int = 5, desde: Optional[date] = None, hasta: Optional[date] = None, sede_id: Optional[int] = None,
+    db: Session = Depends(get_db), admin = Depends(require_admin_lectura)
+):
+    results = db.execute(_ranking(Libro, Libro.titulo, TipoServicio.LIBRO, limit, desde, hasta, sede_id)).all()
+    return [{"titulo": r[0], "solicitudes": r.total, "completadas": r.completadas, "no_shows": r.no_shows} for r in results]
 
 @router.get("/reportes/top-salas")
-def top_salas(limit: int = 5, db: Session = Depends(get_db), admin = Depends(require_admin)):
-    results = db.query(Recurso.nombre, func.count(Reserva.id).label("total"))\
-        .join(Reserva, Reserva.recurso_id == Recurso.id)\
-        .filter(Reserva.tipo_servicio == TipoServicio.SALA)\
-        .group_by(Recurso.id, Recurso.nombre)\
-        .order_by(desc("total")).limit(limit).all()
-    return [{"nombre": r[0], "reservas": r[1]} for r in results]
+def top_salas(
+    limit: int = 5, desde: Optional[date] = None, hasta: Optional[date] = None, sede_id: Optional[int] = None,
+    db: Session = Depends(get_db), admin = Depends(require_admin_lectura)
+):
+    results = db.execute(_ranking(Recurso, Recurso.nombre, TipoServicio.SALA, limit, desde, hasta, sede_id)).all()
+    return [{"nombre": r[0], "reservas": r.total, "completadas": r.completadas, "no_shows": r.no_shows} for r in results]
 
 @router.get("/reportes/usuarios-riesgo")
-def usuarios_riesgo(db: Session = Depends(get_db), admin = Depends(require_admin)):
+def usuarios_riesgo(db: Session = Depends(get_db), admin = Depends(require_admin_lectura)):
     users = db.query(Usuario).filter(Usuario.strikes > 0).order_by(desc(Usuario.strikes)).all()
     return [
         {"dni": u.dni, "nombre": u.nombre, "strikes": u.strikes, 
-         "estado": "BANEADO" if (u.banned_until and u.banned_until > datetime.now(timezone.utc)) else "ADVERTENCIA"}
+         "estado": "BANEADO" if (u.banned_until and u.banned_until > get_now_peru()) else "ADVERTENCIA"}
         for u in users
-    ]
\ No newline at end of file
+    ]
+
+# =================================================================
+# 6. SISTEMA (MÉTRICAS DE INFRAESTRUCTURA)
+# =================================================================
+
+def _snapshot_pools() -> dict:
+    return {
+        "sync": pool_metrics.snapshot(engine.pool),
+        "async": async_pool_metrics.snapshot(async_engine.sync_engine.pool),
+    }
+
+
+@router.get("/sistema/pool")
+def metricas_pool(admin = Depends(require_admin_lectura)):
+    """Latencia de checkout, saturación y churn del pool de conexiones."""
+    return _snapshot_pools()
+
+
+@router.post("/sistema/pool/reset")
+def reiniciar_metricas_pool(admin = Depends(require_admin)):
+    """Devuelve las métricas acumuladas y las pone en cero (p. ej. entre corridas de bench)."""
+    data = _snapshot_pools()
+    pool_metrics.reset()
+    async_pool_metrics.reset()
+    return data
+
+
+@router.get("/sistema/cache")
+def metricas_cache(admin = Depends(require_admin_lectura)):
+    """Hits/misses de las cachés en memoria de esta instancia."""
+    return {nombre: cache.stats() for nombre, cache in caches.items()}
+
+
+@router.get("/sistema/hashing")
+def estado_hashing(admin = Depends(require_admin_lectura)):
+    """Procesos, costo bcrypt y verificaciones en curso del pool de hashing."""
+    return pool_hashing.stats()
+
+
+@router.get("/sistema/rate-limit")
+def estado_rate_limit(admin = Depends(require_admin_lectura)):
+    """Reglas vigentes y requests rechazados (429) por ruta en esta instancia."""
+    return limitador.stats()
+
+
+@router.get("/sistema/outbox")
+def estado_outbox(db: Session = Depends(get_db), admin = Depends(require_admin_lectura)):
+    """Correos por estado (FALLIDO = dead letter) y contadores del worker local."""
+    conteo = dict(db.query(EmailOutbox.estado, func.count()).group_by(EmailOutbox.estado).all())
+    return {"estados": conteo, "worker": outbox_worker.stats()}
+
+
+@router.post("/sistema/outbox/reintentar")
+def reintentar_outbox(db: Session = Depends(get_db), admin = Depends(require_admin)):
+    """Devuelve los correos en dead letter a la cola (p. ej. tras corregir credenciales)."""
+    n = db.query(EmailOutbox).filter(EmailOutbox.estado == "FALLIDO").update(
+        {"estado": "PENDIENTE", "intentos": 0, "proximo_intento": func.now()}, synchronize_session=False
+    )
+    db.commit()
+    outbox_worker.notificar()
+    return {"msg": f"{n} correos reencolados"}
+
+
+@router.post("/sistema/barrido")
+def ejecutar_barrido(db: Session = Depends(get_db), admin = Depends(require_admin)):
+    """Corre ya el barrido de NO_SHOW y devoluciones vencidas (normalmente es periódico)."""
+    return {"resultado": barrer_reservas(db), "ultimo_periodico": barrendero.ultimo}
+
+
+@router.get("/sistema/apiperu")
+async def estado_apiperu(db: AsyncSession = Depends(get_async_db), admin = Depends(require_admin_lectura)):
+    """Circuito, consultas y hits de caché de la validación de DNI; usuarios sin verificar."""
+    fila = (await db.execute(
+        select(
+            func.count().filter(Usuario.dni_rechazado.is_(False)),
+            func.count().filter(Usuario.dni_rechazado.is_(True)),
+        ).where(Usuario.dni_verificado.is_(False))
+    )).one()
+    return {**cliente_apiperu.stats(), "usuarios_sin_verificar": fila[0], "usuarios_dni_rechazado": fila[1]}
+
+
+@router.post("/sistema/apiperu/verificar-pendientes")
+async def verificar_dnis_pendientes(
+    limite: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db), admin = Depends(require_admin)
+):
+    """Reintenta contra el proveedor los DNI registrados con verificación diferida."""
+    return await verificar_pendientes(db, limite)
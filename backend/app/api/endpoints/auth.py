@@ -1,17 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 import random
-import httpx
 
-from app.deps import get_db
+from app.deps import get_db, get_async_db
 from app.models.models import Usuario
 from app.core import security
 from app.core.config import settings
+from app.core.hashing import pool_hashing
 from app.schemas.usuario import UsuarioCreate, UsuarioOut, RecoveryVerify, RecoveryReset
-from app.services.email import send_otp_email
+from app.services.apiperu import DniNoEncontrado, ProveedorNoDisponible, cliente_apiperu
+from app.services.email import mensaje_otp
+from app.services.outbox import encolar_email
 
 router = APIRouter()
 
@@ -21,54 +25,56 @@ class ForgotRequest(BaseModel):
     email: str
 
 @router.post("/register", response_model=UsuarioOut)
-async def register(user_in: UsuarioCreate, db: Session = Depends(get_db)):
-    if db.query(Usuario).filter(Usuario.dni == user_in.dni).first():
+async def register(user_in: UsuarioCreate, db: AsyncSession = Depends(get_async_db)):
+    if await db.scalar(select(Usuario.dni).where(Usuario.dni == user_in.dni)):
         raise HTTPException(400, "El DNI ya está registrado")
-    if db.query(Usuario).filter(Usuario.email == user_in.email).first():
+    if await db.scalar(select(Usuario.dni).where(Usuario.email == user_in.email)):
         raise HTTPException(400, "El email ya está registrado")
 
-    # Validación ApiPeruDev
+    # Validación ApiPeruDev (cliente compartido, caché y circuit breaker)
     nombre_completo = None
+    dni_verificado = True
     if not settings.APIPERU_TOKEN:
         nombre_completo = f"Ciudadano {user_in.dni}"
     else:
         try:
-            async with httpx.AsyncClient() as client:
-                url = "https://apiperu.dev/api/dni"
-                headers = {
-                    "Authorization": f"Bearer {settings.APIPERU_TOKEN}",
-                    "Content-Type": "application/json",
-                    "Accept": "application/json"
-                }
-                payload = {"dni": user_in.dni}
-                response = await client.post(url, headers=headers, json=payload, timeout=5.0)
-                
-                if response.status_code == 200 and response.json().get("success"):
-                    d = response.json().get("data", {})
-                    nombre_completo = f"{d.get('nombres')} {d.get('apellido_paterno')} {d.get('apellido_materno')}".strip()
-                else:
-                    raise HTTPException(400, "DNI no válido o no encontrado")
-        except Exception:
-            raise HTTPException(503, "Error de validación externa")
+            nombre_completo = await cliente_apiperu.nombre_por_dni(db, user_in.dni)
+        except DniNoEncontrado:
+            raise HTTPException(400, "DNI no válido o no encontrado")
+        except ProveedorNoDisponible:
+            if not settings.APIPERU_VERIFICACION_DIFERIDA:
+                raise HTTPException(503, "Error de validación externa")
+            # Se registra igual; el nombre real llega con scripts/verificar_dnis.py
+            dni_verificado = False
 
     new_user = Usuario(
         dni=user_in.dni,
         email=user_in.email,
         nombre=nombre_completo or f"Usuario {user_in.dni}",
-        password_hash=security.get_password_hash(user_in.password),
-        rol="USER"
+        password_hash=await pool_hashing.hashear(user_in.password),
+        rol="USER",
+        dni_verificado=dni_verificado,
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 @router.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(Usuario).filter(Usuario.dni == form_data.username).first()
-    if not user or not security.verify_password(form_data.password, user.password_hash):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(Usuario).where(Usuario.dni == form_data.username))
+    if not user:
         raise HTTPException(status_code=400, detail="Credenciales incorrectas")
-    
+    # bcrypt corre en el pool de procesos (ver core/hashing.py)
+    ok, nuevo_hash = await pool_hashing.verificar(form_data.password, user.password_hash)
+    if not ok:
+        raise HTTPException(status_code=400, detail="Credenciales incorrectas")
+
+    # Cambió BCRYPT_ROUNDS: se guarda el hash con el costo nuevo
+    if nuevo_hash:
+        user.password_hash = nuevo_hash
+        await db.commit()
+
     if user.banned_until and user.banned_until > datetime.now():
          raise HTTPException(status_code=403, detail="Usuario bloqueado")
 
@@ -94,19 +100,13 @@ def forgot_password(data: ForgotRequest, db: Session = Depends(get_db)):
     # Generar OTP
     otp = str(random.randint(100000, 999999))
     
-    # Guardar en BD
+    # Guardar en BD junto con el correo (lo envía el worker del outbox;
+    # si SendGrid falla se reintenta sin que el usuario espere)
     user.recovery_token = otp
     user.recovery_expires = datetime.utcnow() + timedelta(minutes=settings.OTP_EXP_MINUTES)
+    encolar_email(db, user.email, *mensaje_otp(otp))
     db.commit()
 
-    # --- ENVÍO REAL CON SENDGRID ---
-    enviado = send_otp_email(user.email, otp)
-    
-    if not enviado:
-        # Opcional: Podrías lanzar un 500 si es crítico, 
-        # pero mejor no revelar que falló el servicio de correo al usuario final por seguridad.
-        print(f"Fallo al enviar correo a {user.email}")
-
     return {"msg": "Código enviado"}
 
 @router.post("/forgot/verify")
@@ -136,7 +136,7 @@ def reset_password(data: RecoveryReset, db: Session = Depends(get_db)):
         raise HTTPException(400, "El código ha expirado")
         
     # Actualizar contraseña
-    user.password_hash = security.get_password_hash(data.new_password)
+    user.password_hash = pool_hashing.hashear_sync(data.new_password)
     
     # Limpiar token para que no se pueda reusar
     user.recovery_token = None
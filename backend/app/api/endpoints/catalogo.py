@@ -1,25 +1,41 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy import select, func, tuple_, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from app.deps import get_db
+from datetime import date, datetime
+from app.api.cache_http import RutaCacheada
+from app.deps import get_async_db, TZ_PERU
+from app.db.guard import limite_queries
+from app.core.config import settings
+from app.core.paginacion import decodificar_cursor, cortar_pagina, escribir_headers, estimar_filas_async
 from app.models.models import Libro, Recurso, Sede
 from app.schemas.inventario import LibroOut, RecursoOut, SedeOut
+from app.services.busqueda import filtro_libros, normalizar_isbn
+from app.services.disponibilidad import stock_disponible_en
 
-router = APIRouter()
+# Todas las rutas del catálogo son GET públicos: respuesta cacheada con ETag
+router = APIRouter(route_class=RutaCacheada)
 
 # Endpoint para llenar el dropdown de Sedes en el Landing Page
-@router.get("/sedes", response_model=List[SedeOut])
-def obtener_sedes_publicas(db: Session = Depends(get_db)):
-    return db.query(Sede).filter(Sede.activo == True).all()
+@router.get("/sedes", response_model=List[SedeOut], dependencies=[Depends(limite_queries(1))])
+async def obtener_sedes_publicas(db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(Sede).filter(Sede.activo == True))
+    return result.scalars().all()
 
-@router.get("/libros", response_model=List[LibroOut])
-def buscar_libros(
+@router.get("/libros", response_model=List[LibroOut], dependencies=[Depends(limite_queries(2))])
+async def buscar_libros(
+    response: Response,
     q: Optional[str] = None,       # Búsqueda general (Título/Autor/ISBN)
     sede_id: Optional[int] = None, # Filtro por Sede
     categoria: Optional[str] = None, # Filtro por Categoría
-    db: Session = Depends(get_db)
+    fecha: Optional[date] = None,  # Día para stock_disponible (default: hoy)
+    cursor: Optional[str] = None,  # Opaco: viene de la cabecera X-Next-Cursor
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    estimar_total: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(Libro).join(Sede).filter(Libro.disponible == True)
+    # El nombre de la sede viene en el mismo SELECT (no hay lazy load en async)
+    query = select(Libro, Sede.nombre).join(Sede).filter(Libro.disponible == True)
     
     if sede_id:
         query = query.filter(Libro.sede_id == sede_id)
@@ -27,37 +43,86 @@ def buscar_libros(
     if categoria:
         query = query.filter(Libro.categoria == categoria)
         
-    if q:
-        search = f"%{q}%"
-        query = query.filter(
-            (Libro.titulo.ilike(search)) | 
-            (Libro.autor.ilike(search)) | 
-            (Libro.isbn.ilike(search))
-        )
-    
-    # Enriquecer respuesta con nombre de sede
-    resultados = query.all()
-    for libro in resultados:
-        libro.nombre_sede = libro.sede_rel.nombre
+    rank = None
+    if q and q.strip():
+        isbn = normalizar_isbn(q)
+        if isbn:
+            # Camino rápido: ISBN exacto por índice, sin ranking
+            query = query.filter(func.replace(Libro.isbn, "-", "") == isbn)
+        else:
+            condicion, rank = filtro_libros(q.strip())
+            query = query.filter(condicion)
+
+    total = await estimar_filas_async(db, query) if estimar_total else None
+
+    # Stock real del día en el mismo SELECT (subconsulta agregada por libro)
+    dia = fecha or datetime.now(TZ_PERU).date()
+    query = query.add_columns(stock_disponible_en(dia))
+
+    # Keyset: (rank DESC, id) en búsquedas, (titulo, id) en el listado normal
+    if rank is not None:
+        after = decodificar_cursor(cursor, "rank", "id")
+        rank = rank.label("rank")
+        query = query.add_columns(rank).order_by(rank.desc(), Libro.id)
+        if after:
+            query = query.filter(or_(
+                rank < after["rank"], and_(rank == after["rank"], Libro.id > after["id"])
+            ))
+        clave = lambda fila: {"rank": fila.rank, "id": fila.Libro.id}
+    else:
+        after = decodificar_cursor(cursor, "titulo", "id")
+        query = query.order_by(Libro.titulo, Libro.id)
+        if after:
+            query = query.filter(tuple_(Libro.titulo, Libro.id) > tuple_(after["titulo"], after["id"]))
+        clave = lambda fila: {"titulo": fila.Libro.titulo, "id": fila.Libro.id}
+
+    filas, siguiente = cortar_pagina((await db.execute(query.limit(limit + 1))).all(), limit, clave)
+    escribir_headers(response, siguiente, total)
+
+    # Enriquecer respuesta con nombre de sede y stock del día
+    resultados = []
+    for fila in filas:
+        libro = fila.Libro
+        libro.nombre_sede = fila.nombre
+        libro.stock_disponible = fila.stock_disponible
+        resultados.append(libro)
         
     return resultados
 
-@router.get("/recursos", response_model=List[RecursoOut])
-def buscar_recursos(
+@router.get("/recursos", response_model=List[RecursoOut], dependencies=[Depends(limite_queries(2))])
+async def buscar_recursos(
+    response: Response,
     tipo: Optional[str] = None,    # SALA o EQUIPO
     sede_id: Optional[int] = None, # Filtro por Sede
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    estimar_total: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(Recurso).join(Sede).filter(Recurso.disponible == True)
+    query = select(Recurso, Sede.nombre).join(Sede).filter(Recurso.disponible == True)
     
     if sede_id:
         query = query.filter(Recurso.sede_id == sede_id)
         
     if tipo:
         query = query.filter(Recurso.tipo_recurso == tipo)
+
+    total = await estimar_filas_async(db, query) if estimar_total else None
+
+    after = decodificar_cursor(cursor, "nombre", "id")
+    query = query.order_by(Recurso.nombre, Recurso.id)
+    if after:
+        query = query.filter(tuple_(Recurso.nombre, Recurso.id) > tuple_(after["nombre"], after["id"]))
+
+    filas, siguiente = cortar_pagina(
+        (await db.execute(query.limit(limit + 1))).all(), limit,
+        lambda fila: {"nombre": fila[0].nombre, "id": fila[0].id}
+    )
+    escribir_headers(response, siguiente, total)
         
-    resultados = query.all()
-    for recurso in resultados:
-        recurso.nombre_sede = recurso.sede_rel.nombre
+    resultados = []
+    for recurso, nombre_sede in filas:
+        recurso.nombre_sede = nombre_sede
+        resultados.append(recurso)
         
-    return resultados
\ No newline at end of file
+    return resultados
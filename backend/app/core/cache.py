@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# Registro global para exponer estadísticas en /admin/sistema/cache
+registro: Dict[str, "TTLCache"] = {}
+
+_FALTA = object()
+
+
+class TTLCache:
+    """Caché LRU en memoria con expiración por entrada (thread-safe)."""
+
+    def __init__(self, nombre: str, maxsize: int = 1024, ttl: float = 60.0):
+        self.nombre = nombre
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidaciones = 0
+        registro[nombre] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _FALTA)
+            if item is _FALTA or item[0] < time.monotonic():
+                if item is not _FALTA:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expira = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expira, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            if self._data.pop(key, _FALTA) is not _FALTA:
+                self.invalidaciones += 1
+
+    def invalidate_where(self, predicado: Callable[[Hashable, Any], bool]) -> int:
+        """Invalida las entradas para las que predicado(clave, valor) es verdadero."""
+        with self._lock:
+            claves = [k for k, (_, v) in self._data.items() if predicado(k, v)]
+            for k in claves:
+                del self._data[k]
+            self.invalidaciones += len(claves)
+        return len(claves)
+
+    def clear(self):
+        with self._lock:
+            self.invalidaciones += len(self._data)
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+                "invalidaciones": self.invalidaciones,
+            }
@@ -1,7 +1,7 @@
 import os
 from pydantic_settings import BaseSettings
 from urllib.parse import quote_plus
-from typing import Optional
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
@@ -16,14 +16,71 @@ class Settings(BaseSettings):
     DB_SSLMODE: str = "require"
     NULL_POOL: bool = True
 
+    # --- Pool (solo aplica con NULL_POOL=False) ---
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30          # segundos esperando una conexión libre
+    DB_POOL_RECYCLE: int = 1800        # segundos antes de reciclar una conexión
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 15000
+    # Supabase Transaction Pooler (pgbouncer en modo transacción):
+    # sin prepared statements del lado del servidor ni parámetros de sesión.
+    DB_PGBOUNCER_TRANSACTION_MODE: bool = False
+    # Límite de statements por request en endpoints marcados: off | warn | raise (tests)
+    QUERY_GUARD: str = "off"
+
     # --- Auth ---
     SECRET_KEY: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 # 1 día
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_CACHE_MAX: int = 10000
+    # bcrypt: costo y procesos dedicados (0 = uno por núcleo). Si se cambia el
+    # costo, los hashes viejos se recalculan en el siguiente login correcto.
+    BCRYPT_ROUNDS: int = 12
+    BCRYPT_WORKERS: int = 0
+
+    # --- Rate limiting (token buckets, ver app/core/limitador.py) ---
+    RATE_LIMIT_HABILITADO: bool = True
+    RATE_LIMIT_BACKEND: str = "memoria"     # memoria (por instancia) | postgres (compartido)
+    RATE_LIMIT_MAX_CLAVES: int = 100000     # buckets en memoria
+    # Proxies propios delante de la API que agregan su salto a X-Forwarded-For
+    # (Cloud Run: 1; +1 con un load balancer). 0 = IP de la conexión. Tomar
+    # el salto que puso nuestro proxy, no el primero, que lo elige el cliente.
+    RATE_LIMIT_PROXIES_CONFIABLES: int = 0
+    # "METODO /ruta" (sin API_V1_STR) -> "ip=N/seg dni=N/seg": N requests de
+    # ráfaga que se reponen en `seg` segundos. Se puede pisar con JSON en el .env.
+    RATE_LIMIT_RUTAS: Dict[str, str] = {
+        "POST /auth/login": "ip=30/60 dni=10/300",
+        "POST /auth/register": "ip=10/600",
+        "POST /auth/forgot": "ip=10/600 dni=3/900",
+        "POST /auth/forgot/verify": "ip=30/600 dni=5/900",
+        "POST /auth/forgot/reset": "ip=30/600 dni=5/900",
+        "POST /reservas/": "ip=60/60 dni=10/60",
+    }
 
     # --- Servicios Externos ---
     APIPERU_TOKEN: Optional[str] = None
+    APIPERU_URL: str = "https://apiperu.dev/api"   # scripts/mock_apiperu.py para pruebas
+    APIPERU_TIMEOUT_SECONDS: float = 3.0
+    APIPERU_MAX_CONEXIONES: int = 20
+    APIPERU_CACHE_DIAS: int = 30               # vigencia de dni_consultas
+    APIPERU_CB_FALLOS: int = 5                 # fallas seguidas que abren el circuito
+    APIPERU_CB_ESPERA_SEGUNDOS: int = 30       # circuito abierto antes de reintentar
+    # Con el proveedor caído se registra igual y el DNI se verifica después
+    # (scripts/verificar_dnis.py); en False responde 503 como antes.
+    APIPERU_VERIFICACION_DIFERIDA: bool = True
     SENDGRID_API_KEY: Optional[str] = None
     SENDGRID_SENDER: Optional[str] = None
+    SENDGRID_TIMEOUT_SECONDS: float = 10.0
+
+    # --- Outbox de correos ---
+    EMAIL_TRANSPORTE: str = "sendgrid"       # sendgrid | falso (tests / desarrollo)
+    EMAIL_WORKER_EN_PROCESO: bool = True     # False si se corre scripts/outbox_worker.py aparte
+    EMAIL_WORKER_CONCURRENCIA: int = 4       # envíos simultáneos por worker
+    EMAIL_WORKER_LOTE: int = 20              # filas reclamadas por vuelta
+    EMAIL_WORKER_INTERVALO: float = 2.0      # segundos entre vueltas sin trabajo
+    EMAIL_MAX_INTENTOS: int = 5              # luego pasa a FALLIDO (dead letter)
+    EMAIL_BACKOFF_SEGUNDOS: int = 30         # base del backoff exponencial
 
     # --- Políticas de Negocio ---
     MAX_DIAS_PRESTAMO: int = 21
@@ -31,7 +88,30 @@ class Settings(BaseSettings):
     ANTICIPACION_MINIMA_HORAS: int = 2
     VENTANA_CANCELACION_HORAS: int = 2
     CONCURRENCIA_MAXIMA_POR_USUARIO: int = 2
+    TOLERANCIA_NO_SHOW_MINUTOS: int = 20
+
+    # --- Barrido de reservas vencidas (NO_SHOW / devoluciones tardías) ---
+    BARRIDO_EN_PROCESO: bool = True           # False si se corre scripts/barrido.py (cron)
+    BARRIDO_INTERVALO_SEGUNDOS: int = 60
     
+    # --- Paginación (keyset) ---
+    PAGE_SIZE_DEFAULT: int = 50
+    PAGE_SIZE_MAX: int = 200
+
+    # --- Caché HTTP del catálogo público ---
+    CATALOGO_CACHE_TTL_SECONDS: int = 60
+    CATALOGO_CACHE_MAX_AGE: int = 30   # Cache-Control para navegador/CDN
+    CATALOGO_CACHE_MAX: int = 2000
+
+    # --- Dashboard admin ---
+    KPI_CACHE_TTL_SECONDS: int = 15
+
+    # --- QR de reservas ---
+    API_PUBLIC_URL: str = "http://localhost:8000"  # base de las URLs que van en los correos
+    QR_BOX_SIZE: int = 8               # píxeles por módulo en el PNG
+    QR_CACHE_MAX: int = 5000
+    QR_VIGENCIA_TRAS_FIN_DIAS: int = 90   # el QR firmado deja de aceptarse después
+
     # --- OTP ---
     OTP_EXP_MINUTES: int = 15
 
@@ -40,6 +120,15 @@ class Settings(BaseSettings):
         password = quote_plus(self.DB_PASSWORD)
         return f"postgresql+psycopg2://{self.DB_USER}:{password}@{self.POOLER_HOST}:{self.POOLER_PORT}/{self.DB_NAME}?sslmode={self.DB_SSLMODE}"
 
+    def get_async_database_url(self) -> str:
+        # asyncpg usa "ssl" en lugar de "sslmode"
+        password = quote_plus(self.DB_PASSWORD)
+        url = f"postgresql+asyncpg://{self.DB_USER}:{password}@{self.POOLER_HOST}:{self.POOLER_PORT}/{self.DB_NAME}?ssl={self.DB_SSLMODE}"
+        if self.DB_PGBOUNCER_TRANSACTION_MODE:
+            # pgbouncer (modo transacción) no soporta prepared statements con nombre
+            url += "&prepared_statement_cache_size=0"
+        return url
+
     class Config:
         env_file = ".env"
         # Esto permite que haya variables extra en el .env sin que explote,
@@ -0,0 +1,111 @@
+"""
+Hash y verificación de contraseñas en un pool de procesos dedicado.
+
+bcrypt cuesta ~250ms de CPU por llamada (con 12 rondas) y retiene el GIL: si
+corre en el threadpool de FastAPI una ráfaga de logins frena al resto de los
+endpoints. Aquí se manda a BCRYPT_WORKERS procesos aparte; el event loop solo
+espera el resultado.
+
+Las rondas salen de BCRYPT_ROUNDS. Un hash con otro costo se sigue aceptando
+y `verificar` devuelve el hash recalculado para guardarlo (rehash en el login).
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=4)
+def contexto(rondas: int) -> CryptContext:
+    # min = max = default: cualquier hash con otro costo queda "needs_update"
+    return CryptContext(
+        schemes=["bcrypt"], deprecated="auto",
+        bcrypt__default_rounds=rondas, bcrypt__min_rounds=rondas, bcrypt__max_rounds=rondas,
+    )
+
+
+# --- Funciones que corren dentro de los procesos del pool ---
+# Reciben las rondas como argumento para no depender del estado del padre.
+
+def _hashear(password: str, rondas: int) -> str:
+    return contexto(rondas).hash(password)
+
+
+def _verificar(password: str, password_hash: str, rondas: int) -> Tuple[bool, Optional[str]]:
+    """(ok, nuevo_hash); nuevo_hash solo si la contraseña es correcta y el costo cambió."""
+    try:
+        return contexto(rondas).verify_and_update(password, password_hash)
+    except ValueError:
+        # Hash corrupto o de otro esquema: se trata como contraseña incorrecta
+        return False, None
+
+
+def _calentar(rondas: int):
+    contexto(rondas)
+
+
+class PoolHashing:
+    def __init__(self, workers: int, rondas: int):
+        self.workers = workers or os.cpu_count() or 1
+        self.rondas = rondas
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.en_curso = 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # spawn: el padre ya tiene hilos (threadpool, engine); un fork
+                    # podría heredar locks tomados
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_calentar, initargs=(self.rondas,),
+                    )
+                    logger.info("hashing.pool workers=%s rondas=%s", self.workers, self.rondas)
+        return self._executor
+
+    async def _ejecutar(self, fn, *args):
+        self.en_curso += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), fn, *args)
+        finally:
+            self.en_curso -= 1
+
+    async def hashear(self, password: str) -> str:
+        return await self._ejecutar(_hashear, password, self.rondas)
+
+    async def verificar(self, password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+        return await self._ejecutar(_verificar, password, password_hash, self.rondas)
+
+    def hashear_sync(self, password: str) -> str:
+        """Para endpoints sync: el hilo espera sin retener el GIL."""
+        return self._pool().submit(_hashear, password, self.rondas).result()
+
+    def cerrar(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "rondas": self.rondas,
+            "iniciado": self._executor is not None,
+            "en_curso": self.en_curso,
+        }
+
+
+pool_hashing = PoolHashing(settings.BCRYPT_WORKERS, settings.BCRYPT_ROUNDS)
@@ -0,0 +1,292 @@
+"""
+Rate limiting por token bucket para rutas caras (bcrypt, correos, reservas).
+
+Cada ruta de RATE_LIMIT_RUTAS puede tener un bucket por IP y otro por DNI.
+El de IP se revisa primero, sin leer el body, así un cliente ya limitado no
+cuesta ni el parseo; detrás de un proxy (Cloud Run) la IP sale de
+X-Forwarded-For según RATE_LIMIT_PROXIES_CONFIABLES. El DNI sale del
+formulario de login, del JSON de las rutas de recuperación o del JWT en las
+autenticadas. Al pasarse se responde 429 con Retry-After.
+
+Backends:
+  - BackendMemoria: por instancia, en un TTLCache (visible en /admin/sistema/cache).
+  - BackendPostgres: tabla UNLOGGED rate_limit_buckets, un UPSERT atómico por
+    chequeo; comparte los límites entre instancias.
+Cualquier objeto con `consumir(clave, regla)` sirve de reemplazo en pruebas
+(ver `limitador.backend`). Si el backend falla se deja pasar el request.
+"""
+import json
+import logging
+import math
+import random
+import time
+from collections import Counter
+from typing import Dict, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs
+
+from jose import JWTError, jwt
+from sqlalchemy import text
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Body máximo que se lee para sacar el DNI (los de auth son de pocos bytes)
+MAX_BODY_DNI = 16 * 1024
+
+# De dónde sale el DNI de cada ruta; por defecto, del JWT
+FUENTE_DNI = {
+    "POST /auth/login": "form:username",
+    "POST /auth/forgot": "json:dni",
+    "POST /auth/forgot/verify": "json:dni",
+    "POST /auth/forgot/reset": "json:dni",
+}
+
+
+class Regla(NamedTuple):
+    capacidad: int
+    periodo: float  # segundos para reponer la capacidad completa
+
+    @property
+    def tasa(self) -> float:
+        return self.capacidad / self.periodo
+
+
+class ReglasRuta(NamedTuple):
+    ruta: str
+    ip: Optional[Regla]
+    dni: Optional[Regla]
+
+
+def parsear_reglas(ruta: str, spec: str) -> ReglasRuta:
+    """'ip=30/60 dni=10/300' -> ReglasRuta."""
+    reglas = {}
+    for parte in spec.split():
+        dimension, _, valor = parte.partition("=")
+        capacidad, _, periodo = valor.partition("/")
+        if dimension not in ("ip", "dni") or not capacidad or not periodo:
+            raise ValueError(f"Regla de rate limit inválida para {ruta}: {parte!r}")
+        reglas[dimension] = Regla(int(capacidad), float(periodo))
+    return ReglasRuta(ruta, reglas.get("ip"), reglas.get("dni"))
+
+
+def _espera(tokens: float, regla: Regla) -> int:
+    """Segundos hasta tener un token completo (para Retry-After)."""
+    return max(1, math.ceil((1 - tokens) / regla.tasa))
+
+
+class BackendMemoria:
+    def __init__(self, maxsize: int):
+        # Un bucket sin uso durante `periodo` está lleno de nuevo: expirarlo es exacto
+        self.buckets = TTLCache("rate_limit", maxsize=maxsize, ttl=3600)
+
+    async def consumir(self, clave: str, regla: Regla) -> Tuple[bool, int]:
+        # Sin awaits entre leer y escribir: atómico dentro del event loop
+        ahora = time.monotonic()
+        tokens, antes = self.buckets.get(clave) or (regla.capacidad, ahora)
+        tokens = min(regla.capacidad, tokens + (ahora - antes) * regla.tasa)
+        permitido = tokens >= 1
+        if permitido:
+            tokens -= 1
+        self.buckets.set(clave, (tokens, ahora), ttl=regla.periodo)
+        return permitido, 0 if permitido else _espera(tokens, regla)
+
+
+# now() es fijo dentro del statement: las tres evaluaciones dan lo mismo
+_REPUESTOS = (
+    "least(CAST(:capacidad AS float8), "
+    "b.tokens + CAST(extract(epoch FROM now() - b.actualizado) AS float8) * CAST(:tasa AS float8))"
+)
+
+_SQL_CONSUMIR = f"""
+    INSERT INTO rate_limit_buckets AS b (clave, tokens, permitido, actualizado)
+    VALUES (:clave, CAST(:capacidad AS float8) - 1, true, now())
+    ON CONFLICT (clave) DO UPDATE SET
+        tokens = CASE WHEN {_REPUESTOS} >= 1 THEN {_REPUESTOS} - 1 ELSE {_REPUESTOS} END,
+        permitido = {_REPUESTOS} >= 1,
+        actualizado = now()
+    RETURNING tokens, permitido
+"""
+
+_SQL_PURGAR = """
+    DELETE FROM rate_limit_buckets
+    WHERE actualizado < now() - make_interval(secs => CAST(:segundos AS float8))
+"""
+
+
+class BackendPostgres:
+    # Cada ~N chequeos se borran los buckets que ya estarían llenos
+    PURGAR_CADA = 1000
+
+    def __init__(self, engine=None):
+        if engine is None:
+            from app.db.session import async_engine as engine
+        self.engine = engine
+        self._periodo_max = max(
+            (regla.periodo for rr in reglas_configuradas().values() for regla in (rr.ip, rr.dni) if regla),
+            default=3600,
+        )
+
+    async def consumir(self, clave: str, regla: Regla) -> Tuple[bool, int]:
+        async with self.engine.begin() as conn:
+            tokens, permitido = (await conn.execute(text(_SQL_CONSUMIR), {
+                "clave": clave, "capacidad": regla.capacidad, "tasa": regla.tasa,
+            })).one()
+            if random.random() < 1 / self.PURGAR_CADA:
+                await conn.execute(text(_SQL_PURGAR), {"segundos": self._periodo_max})
+        return permitido, 0 if permitido else _espera(tokens, regla)
+
+
+def reglas_configuradas() -> Dict[Tuple[str, str], ReglasRuta]:
+    reglas = {}
+    for ruta, spec in settings.RATE_LIMIT_RUTAS.items():
+        metodo, _, path = ruta.partition(" ")
+        reglas[(metodo.upper(), settings.API_V1_STR + path)] = parsear_reglas(ruta, spec)
+    return reglas
+
+
+def crear_backend():
+    if settings.RATE_LIMIT_BACKEND == "postgres":
+        return BackendPostgres()
+    if settings.RATE_LIMIT_BACKEND == "memoria":
+        return BackendMemoria(settings.RATE_LIMIT_MAX_CLAVES)
+    raise ValueError(f"RATE_LIMIT_BACKEND desconocido: {settings.RATE_LIMIT_BACKEND}")
+
+
+class Limitador:
+    def __init__(self, backend=None, reglas=None):
+        self.backend = backend or crear_backend()
+        self.reglas = reglas if reglas is not None else reglas_configuradas()
+        self.rechazos: Counter = Counter()
+        self.errores = 0
+
+    async def consumir(self, clave: str, regla: Regla) -> Tuple[bool, int]:
+        try:
+            return await self.backend.consumir(clave, regla)
+        except Exception:
+            # Fail-open: un backend caído no debe tumbar el login
+            self.errores += 1
+            logger.warning("rate_limit.backend_error clave=%s", clave, exc_info=True)
+            return True, 0
+
+    def stats(self) -> dict:
+        return {
+            "habilitado": settings.RATE_LIMIT_HABILITADO,
+            "backend": type(self.backend).__name__,
+            "rutas": {
+                r.ruta: {"ip": r.ip and r.ip._asdict(), "dni": r.dni and r.dni._asdict()}
+                for r in self.reglas.values()
+            },
+            "rechazos": dict(self.rechazos),
+            "errores_backend": self.errores,
+        }
+
+
+limitador = Limitador()
+
+
+def _dni_de_token(headers: Dict[bytes, bytes]) -> Optional[str]:
+    autorizacion = headers.get(b"authorization", b"").decode("latin-1")
+    esquema, _, token = autorizacion.partition(" ")
+    if esquema.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"]).get("sub")
+    except JWTError:
+        return None
+
+
+def _dni_de_body(body: bytes, fuente: str) -> Optional[str]:
+    formato, _, campo = fuente.partition(":")
+    try:
+        if formato == "json":
+            data = json.loads(body)
+            valor = data.get(campo) if isinstance(data, dict) else None
+        else:
+            valor = (parse_qs(body.decode()).get(campo) or [None])[0]
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return str(valor).strip() if valor else None
+
+
+def _ip_cliente(scope) -> str:
+    """IP para el bucket: la que vio el proxy de confianza más externo."""
+    saltos = settings.RATE_LIMIT_PROXIES_CONFIABLES
+    if saltos > 0:
+        cabecera = dict(scope["headers"]).get(b"x-forwarded-for", b"").decode("latin-1")
+        ips = [ip.strip() for ip in cabecera.split(",") if ip.strip()]
+        if len(ips) >= saltos:
+            return ips[-saltos]
+    return scope["client"][0] if scope.get("client") else "desconocida"
+
+
+async def _leer_body(receive):
+    """Lee el body (hasta MAX_BODY_DNI) y devuelve un `receive` que lo repite."""
+    mensajes, body = [], b""
+    while True:
+        mensaje = await receive()
+        mensajes.append(mensaje)
+        if mensaje["type"] != "http.request":
+            break
+        body += mensaje.get("body", b"")
+        if not mensaje.get("more_body") or len(body) > MAX_BODY_DNI:
+            break
+
+    async def repetir():
+        if mensajes:
+            return mensajes.pop(0)
+        return await receive()
+
+    return body, repetir
+
+
+async def _responder_429(send, espera: int):
+    cuerpo = json.dumps({"detail": f"Demasiadas solicitudes. Intente nuevamente en {espera} s."}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(cuerpo)).encode()),
+            (b"retry-after", str(espera).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": cuerpo})
+
+
+class LimitadorMiddleware:
+    """Middleware ASGI puro: no envuelve la respuesta, solo decide si pasa."""
+
+    def __init__(self, app, limitador: Limitador = limitador):
+        self.app = app
+        self.limitador = limitador
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.RATE_LIMIT_HABILITADO:
+            return await self.app(scope, receive, send)
+        reglas = self.limitador.reglas.get((scope["method"], scope["path"]))
+        if reglas is None:
+            return await self.app(scope, receive, send)
+
+        if reglas.ip:
+            ip = _ip_cliente(scope)
+            permitido, espera = await self.limitador.consumir(f"{reglas.ruta}|ip|{ip}", reglas.ip)
+            if not permitido:
+                self.limitador.rechazos[f"{reglas.ruta} ip"] += 1
+                return await _responder_429(send, espera)
+
+        if reglas.dni:
+            fuente = FUENTE_DNI.get(reglas.ruta, "token")
+            if fuente == "token":
+                dni = _dni_de_token(dict(scope["headers"]))
+            else:
+                body, receive = await _leer_body(receive)
+                dni = _dni_de_body(body, fuente)
+            if dni:
+                permitido, espera = await self.limitador.consumir(f"{reglas.ruta}|dni|{dni[:20]}", reglas.dni)
+                if not permitido:
+                    self.limitador.rechazos[f"{reglas.ruta} dni"] += 1
+                    return await _responder_429(send, espera)
+
+        await self.app(scope, receive, send)
@@ -0,0 +1,87 @@
+import base64
+import json
+from typing import Any, Optional
+
+from fastapi import HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+# Paginación por keyset: la respuesta sigue siendo una lista (compatibilidad
+# con el frontend) y el cursor de la siguiente página viaja en cabeceras.
+HEADER_CURSOR = "X-Next-Cursor"
+HEADER_TOTAL = "X-Total-Estimate"
+
+
+def codificar_cursor(valores: dict) -> str:
+    raw = json.dumps(valores, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+# Tipo JSON esperado por clave: el cursor llega del cliente y sus valores van
+# directo a comparaciones SQL (un str contra Libro.id revienta en Postgres)
+TIPOS_CURSOR = {"id": (int,), "titulo": (str,), "nombre": (str,), "rank": (int, float)}
+
+
+def decodificar_cursor(cursor: Optional[str], *claves: str) -> Optional[dict]:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        valores = json.loads(raw)
+        if not isinstance(valores, dict) or any(
+            c not in valores or isinstance(valores[c], bool) or not isinstance(valores[c], TIPOS_CURSOR[c])
+            for c in claves
+        ):
+            raise ValueError
+        return {c: valores[c] for c in claves}
+    except ValueError:
+        raise HTTPException(400, "Cursor inválido")
+
+
+def cortar_pagina(filas: list, limit: int, clave) -> tuple:
+    """
+    Recibe limit+1 filas; devuelve (página, cursor_siguiente).
+    `clave(fila)` arma el dict del cursor a partir de la última fila.
+    """
+    if len(filas) <= limit:
+        return filas, None
+    pagina = filas[:limit]
+    return pagina, codificar_cursor(clave(pagina[-1]))
+
+
+def escribir_headers(response: Response, siguiente: Optional[str], total: Optional[int] = None):
+    if siguiente:
+        response.headers[HEADER_CURSOR] = siguiente
+    if total is not None:
+        response.headers[HEADER_TOTAL] = str(total)
+
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) de un SELECT, con los parámetros enlazados normalmente."""
+    inherit_cache = False
+
+    def __init__(self, stmt: Select):
+        self.statement = stmt
+
+
+@compiles(Explain, "postgresql")
+def _compilar_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def _filas_plan(plan: Any) -> int:
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def estimar_filas(db: Session, stmt: Select) -> int:
+    """Estimación del planner (sin COUNT): O(1) sin importar el tamaño de la tabla."""
+    return _filas_plan(db.execute(Explain(stmt)).scalar())
+
+
+async def estimar_filas_async(db: AsyncSession, stmt: Select) -> int:
+    return _filas_plan((await db.execute(Explain(stmt))).scalar())
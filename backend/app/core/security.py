@@ -1,10 +1,16 @@
 from datetime import datetime, timedelta
-from typing import Any, Union, Optional
+from typing import Any, NamedTuple, Union, Optional
+import base64
+import binascii
+import hashlib
+import hmac
+import struct
 from jose import jwt
-from passlib.context import CryptContext
 from app.core.config import settings
+from app.core.hashing import contexto
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Uso directo (scripts); los endpoints pasan por app.core.hashing.pool_hashing
+pwd_context = contexto(settings.BCRYPT_ROUNDS)
 
 ALGORITHM = "HS256"
 
@@ -24,4 +30,68 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+# --- QR firmados ---
+# Sobre compacto firmado con HMAC-SHA256 (clave derivada de SECRET_KEY):
+#   versión(1) tipo(1) código(3) inicio(4) fin(4) + MAC truncado a 16 bytes
+# en base64url con el prefijo "Q1.". La puerta valida firma y ventana sin ir
+# a la BD y luego busca la reserva por `code` (índice único).
+
+QR_PREFIJO = "Q1."
+_QR_VERSION = 1
+_QR_TIPOS = ("LIBRO", "SALA")
+_QR_FORMATO = struct.Struct(">BB3sII")
+_QR_MAC_BYTES = 16
+_QR_EPOCH = datetime(1970, 1, 1)
+_CLAVE_QR = hmac.new(settings.SECRET_KEY.encode(), b"bnp-qr-v1", hashlib.sha256).digest()
+
+
+class QRInvalido(Exception):
+    pass
+
+
+class QRFirmado(NamedTuple):
+    code: str
+    tipo: str
+    inicio: datetime  # hora Perú (naive), igual que en la BD
+    fin: datetime
+
+
+def _segundos(dt: datetime) -> int:
+    return int((dt - _QR_EPOCH).total_seconds())
+
+
+def firmar_qr(code: str, tipo: str, inicio: datetime, fin: datetime) -> str:
+    """Token del QR para la reserva `code` (formato XX-1A2B3C)."""
+    cuerpo = _QR_FORMATO.pack(
+        _QR_VERSION, _QR_TIPOS.index(tipo), bytes.fromhex(code[3:]), _segundos(inicio), _segundos(fin)
+    )
+    mac = hmac.new(_CLAVE_QR, cuerpo, hashlib.sha256).digest()[:_QR_MAC_BYTES]
+    return QR_PREFIJO + base64.urlsafe_b64encode(cuerpo + mac).rstrip(b"=").decode()
+
+
+def verificar_qr(token: str) -> QRFirmado:
+    """Valida la firma (tiempo constante) y decodifica; lanza QRInvalido si no es nuestro."""
+    if not token.startswith(QR_PREFIJO):
+        raise QRInvalido("No es un QR firmado")
+    try:
+        crudo = base64.urlsafe_b64decode(token[len(QR_PREFIJO):] + "==")
+    except (ValueError, binascii.Error):
+        raise QRInvalido("QR mal formado")
+    if len(crudo) != _QR_FORMATO.size + _QR_MAC_BYTES:
+        raise QRInvalido("QR mal formado")
+    cuerpo, mac = crudo[:_QR_FORMATO.size], crudo[_QR_FORMATO.size:]
+    esperado = hmac.new(_CLAVE_QR, cuerpo, hashlib.sha256).digest()[:_QR_MAC_BYTES]
+    if not hmac.compare_digest(mac, esperado):
+        raise QRInvalido("Firma inválida")
+    version, tipo, codigo, inicio, fin = _QR_FORMATO.unpack(cuerpo)
+    if version != _QR_VERSION or tipo >= len(_QR_TIPOS):
+        raise QRInvalido("Versión de QR no soportada")
+    tipo = _QR_TIPOS[tipo]
+    return QRFirmado(
+        code=f"{tipo[:2]}-{codigo.hex().upper()}",
+        tipo=tipo,
+        inicio=_QR_EPOCH + timedelta(seconds=inicio),
+        fin=_QR_EPOCH + timedelta(seconds=fin),
+    )
@@ -1,2 +1,2 @@
 from app.models.models import Base  # noqa
-from app.models.models import Usuario, Libro, Recurso, Reserva, Sede, AuditLog # noqa
\ No newline at end of file
+from app.models.models import Usuario, Libro, Recurso, Reserva, Sede, AuditLog, LibroOcupacionDiaria, ReservaResumenDiario, EmailOutbox # noqa
\ No newline at end of file
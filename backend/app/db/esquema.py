@@ -0,0 +1,34 @@
+"""
+Objetos que solo crean las migraciones (columnas generadas, triggers).
+
+El create_all del arranque crea tablas e índices declarados en los modelos,
+pero no esto. Si falta algo la API no arranca: sin el trigger de ocupación,
+por ejemplo, el chequeo de stock pasaría siempre y se sobrevenderían libros
+sin ningún error.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+_SQL_COLUMNA = "SELECT 1 FROM information_schema.columns WHERE table_name = '{tabla}' AND column_name = '{columna}'"
+_SQL_TRIGGER = "SELECT 1 FROM pg_trigger WHERE tgname = '{trigger}' AND tgrelid = to_regclass('{tabla}')"
+
+# descripción (con la migración que lo crea) -> consulta que devuelve fila si existe
+REQUERIDOS = {
+    "columna libros.busqueda (ea9659b51b8f)": _SQL_COLUMNA.format(tabla="libros", columna="busqueda"),
+    "columna usuarios.dni_rechazado (6e2f0c8d1a47)": _SQL_COLUMNA.format(tabla="usuarios", columna="dni_rechazado"),
+    "trigger trg_reservas_ocupacion (e5377d7e3683)": _SQL_TRIGGER.format(tabla="reservas", trigger="trg_reservas_ocupacion"),
+    "trigger trg_reservas_resumen (9222145e26a7)": _SQL_TRIGGER.format(tabla="reservas", trigger="trg_reservas_resumen"),
+}
+
+
+class EsquemaIncompleto(RuntimeError):
+    pass
+
+
+def verificar_esquema(engine: Engine):
+    with engine.connect() as conn:
+        faltan = [nombre for nombre, sql in REQUERIDOS.items() if conn.execute(text(sql)).first() is None]
+    if faltan:
+        raise EsquemaIncompleto(
+            "La base no está migrada, faltan: " + ", ".join(faltan) + ". Ejecutar `alembic upgrade head`."
+        )
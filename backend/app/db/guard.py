@@ -0,0 +1,103 @@
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import event
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Lista mutable compartida por request: el threadpool de Starlette copia el
+# contexto, así que mutar (no reasignar) la lista propaga el conteo.
+_conteo: ContextVar[Optional[list]] = ContextVar("conteo_queries", default=None)
+
+# Statements de infraestructura que no son parte del request (p. ej. el SET
+# LOCAL statement_timeout del evento "begin"): se ejecutan con estas opciones.
+SIN_CONTEO = {"contar_query": False}
+
+# Conteo atado a una conexión (conn.info), para generadores de streaming: el
+# threadpool copia el contexto en cada next(), así que un ContextVar no
+# puede abrirse en un bloque y cerrarse en otro.
+_CLAVE_CONEXION = "conteo_queries"
+
+
+def registrar_query(statement: str):
+    """Suma un statement al conteo activo (el listener, o la sesión falsa de contar_queries.py --sin-bd)."""
+    conteo = _conteo.get()
+    if conteo is not None:
+        conteo.append(statement)
+
+
+def instrumentar_conteo(engine):
+    """Cuenta cada statement ejecutado por el engine dentro de un contexto activo."""
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and not context.execution_options.get("contar_query", True):
+            return
+        registrar_query(statement)
+        por_conexion = conn.info.get(_CLAVE_CONEXION)
+        if por_conexion is not None:
+            por_conexion.append(statement)
+    event.listen(engine, "before_cursor_execute", _antes)
+
+
+@contextmanager
+def contar_queries():
+    """Uso en tests: `with contar_queries() as qs: ...; assert len(qs) <= N`."""
+    conteo = []
+    token = _conteo.set(conteo)
+    try:
+        yield conteo
+    finally:
+        _conteo.reset(token)
+
+
+def _verificar(conteo: list, maximo: int):
+    if len(conteo) > maximo:
+        mensaje = f"{len(conteo)} queries (máximo {maximo})"
+        if settings.QUERY_GUARD == "raise":
+            raise HTTPException(500, f"Query guard: {mensaje}")
+        logger.warning("Query guard: %s", mensaje)
+
+
+@contextmanager
+def limite_queries_conexion(conn, maximo: int):
+    """
+    Como limite_queries, pero cuenta lo que se ejecuta en `conn` mientras dura
+    el bloque. Para el streaming de exportaciones, que corre después de que
+    las dependencias del request ya cerraron; ahí "raise" corta la descarga.
+    """
+    if settings.QUERY_GUARD == "off":
+        yield
+        return
+    conteo = []
+    conn.info[_CLAVE_CONEXION] = conteo
+    try:
+        yield
+    finally:
+        # conn.info vive con la conexión del pool: no dejar el conteo colgado
+        conn.info.pop(_CLAVE_CONEXION, None)
+    _verificar(conteo, maximo)
+
+
+def limite_queries(maximo: int):
+    """
+    Dependencia que falla (QUERY_GUARD=raise) o avisa (=warn) si el request
+    ejecuta más de `maximo` statements, sin importar cuántas filas devuelva.
+    Pensada para detectar N+1 en los endpoints de catálogo y exportación.
+    """
+    async def _guard():
+        if settings.QUERY_GUARD == "off":
+            yield
+            return
+        conteo = []
+        token = _conteo.set(conteo)
+        try:
+            yield
+        finally:
+            _conteo.reset(token)
+        _verificar(conteo, maximo)
+    _guard.maximo = maximo  # scripts/contar_queries.py lee el máximo de la ruta
+    return _guard
@@ -0,0 +1,90 @@
+import threading
+import time
+
+from sqlalchemy import event, exc
+
+
+class PoolMetrics:
+    """Contadores del pool de conexiones (latencia de checkout, saturación y churn)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.iniciado_en = time.time()
+            self.checkouts = 0
+            self.checkins = 0
+            self.conexiones_abiertas = 0   # conexiones físicas nuevas
+            self.conexiones_cerradas = 0
+            self.invalidadas = 0
+            self.timeouts = 0
+            self.checkout_total_ms = 0.0
+            self.checkout_max_ms = 0.0
+
+    def registrar_checkout(self, ms: float):
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_total_ms += ms
+            self.checkout_max_ms = max(self.checkout_max_ms, ms)
+
+    def incrementar(self, campo: str):
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            uptime = max(time.time() - self.iniciado_en, 1e-9)
+            data = {
+                "pool": type(pool).__name__,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "checkout_promedio_ms": round(self.checkout_total_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                "checkout_max_ms": round(self.checkout_max_ms, 3),
+                "timeouts": self.timeouts,
+                "conexiones_abiertas": self.conexiones_abiertas,
+                "conexiones_cerradas": self.conexiones_cerradas,
+                "invalidadas": self.invalidadas,
+                # Churn: conexiones físicas abiertas por checkout (NullPool ~ 1.0)
+                "churn": round(self.conexiones_abiertas / self.checkouts, 3) if self.checkouts else 0.0,
+                "conexiones_por_minuto": round(self.conexiones_abiertas * 60 / uptime, 2),
+            }
+
+        # Saturación solo tiene sentido en pools con tamaño fijo (QueuePool)
+        if hasattr(pool, "checkedout") and hasattr(pool, "size"):
+            capacidad = pool.size() + max(pool._max_overflow, 0)
+            data.update({
+                "tamano": pool.size(),
+                "en_uso": pool.checkedout(),
+                "libres": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "saturacion": round(pool.checkedout() / capacidad, 3) if capacidad else 0.0,
+            })
+        return data
+
+
+def metered(pool_cls, metrics: PoolMetrics):
+    """Subclase del pool que mide el tiempo de espera de cada checkout."""
+
+    class MeteredPool(pool_cls):
+        def _do_get(self):
+            inicio = time.perf_counter()
+            try:
+                return super()._do_get()
+            except exc.TimeoutError:
+                metrics.incrementar("timeouts")
+                raise
+            finally:
+                metrics.registrar_checkout((time.perf_counter() - inicio) * 1000)
+
+    MeteredPool.__name__ = f"Metered{pool_cls.__name__}"
+    return MeteredPool
+
+
+def instrumentar(pool, metrics: PoolMetrics):
+    """Registra los eventos de ciclo de vida de conexiones del pool."""
+    event.listen(pool, "connect", lambda *a: metrics.incrementar("conexiones_abiertas"))
+    event.listen(pool, "close", lambda *a: metrics.incrementar("conexiones_cerradas"))
+    event.listen(pool, "checkin", lambda *a: metrics.incrementar("checkins"))
+    event.listen(pool, "invalidate", lambda *a: metrics.incrementar("invalidadas"))
@@ -1,12 +1,69 @@
-from sqlalchemy import create_engine
+import uuid
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import NullPool, QueuePool, AsyncAdaptedQueuePool
 from app.core.config import settings
+from app.db.metrics import PoolMetrics, metered, instrumentar
+from app.db.guard import SIN_CONTEO, instrumentar_conteo
 
-# Usamos NullPool para Supabase Session Pooler
-engine = create_engine(
-    settings.get_database_url(),
-    poolclass=NullPool if settings.NULL_POOL else None
-)
+pool_metrics = PoolMetrics()
+async_pool_metrics = PoolMetrics()
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
\ No newline at end of file
+
+def _engine_kwargs(asincrono: bool = False) -> dict:
+    metrics = async_pool_metrics if asincrono else pool_metrics
+    kwargs = {}
+    # pgbouncer en modo transacción rechaza parámetros de arranque ("options"),
+    # así que ahí el statement_timeout se fija por transacción (ver abajo).
+    timeout_en_arranque = settings.DB_STATEMENT_TIMEOUT_MS and not settings.DB_PGBOUNCER_TRANSACTION_MODE
+    if asincrono:
+        connect_args = {}
+        if timeout_en_arranque:
+            connect_args["server_settings"] = {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}
+        if settings.DB_PGBOUNCER_TRANSACTION_MODE:
+            # Sin caché de statements y con nombres únicos para no chocar entre backends
+            connect_args["statement_cache_size"] = 0
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+        if connect_args:
+            kwargs["connect_args"] = connect_args
+    elif timeout_en_arranque:
+        kwargs["connect_args"] = {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+
+    # NullPool para Supabase Session Pooler: una conexión física por request
+    if settings.NULL_POOL:
+        kwargs["poolclass"] = metered(NullPool, metrics)
+        return kwargs
+
+    kwargs.update(
+        poolclass=metered(AsyncAdaptedQueuePool if asincrono else QueuePool, metrics),
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+    return kwargs
+
+
+engine = create_engine(settings.get_database_url(), **_engine_kwargs())
+instrumentar(engine.pool, pool_metrics)
+instrumentar_conteo(engine)
+
+# Engine async (asyncpg) para endpoints de lectura con alta concurrencia:
+# no ocupa un hilo del threadpool de Starlette mientras espera a Postgres.
+async_engine = create_async_engine(settings.get_async_database_url(), **_engine_kwargs(asincrono=True))
+instrumentar(async_engine.sync_engine.pool, async_pool_metrics)
+instrumentar_conteo(async_engine.sync_engine)
+
+if settings.DB_STATEMENT_TIMEOUT_MS and settings.DB_PGBOUNCER_TRANSACTION_MODE:
+    def _statement_timeout_local(conn):
+        conn.exec_driver_sql(
+            f"SET LOCAL statement_timeout = {int(settings.DB_STATEMENT_TIMEOUT_MS)}", execution_options=SIN_CONTEO
+        )
+
+    event.listen(engine, "begin", _statement_timeout_local)
+    event.listen(async_engine.sync_engine, "begin", _statement_timeout_local)
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
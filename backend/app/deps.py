@@ -1,16 +1,46 @@
-from typing import Generator
+from typing import Generator, AsyncGenerator, Optional
+from dataclasses import dataclass
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import jwt, JWTError
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
-from app.db.session import SessionLocal
+from app.db.session import SessionLocal, AsyncSessionLocal
+from app.core.cache import TTLCache
 from app.core.config import settings
 from app.models.models import Usuario
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
+TZ_PERU = timezone(timedelta(hours=-5))
+
+@dataclass(frozen=True)
+class Principal:
+    """Proyección mínima del usuario autenticado (sin password_hash ni tokens)."""
+    dni: str
+    nombre: Optional[str]
+    email: Optional[str]
+    rol: str
+    banned_until: Optional[datetime]
+
+principal_cache = TTLCache(
+    "principales", maxsize=settings.PRINCIPAL_CACHE_MAX, ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
+
+def invalidar_principal(db: Session, dni: str):
+    """Marca el principal para invalidarse cuando la transacción haga commit."""
+    db.info.setdefault("principales_invalidados", set()).add(dni)
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_principales(session):
+    # Se invalida después del commit: si se hiciera antes, otro request podría
+    # volver a cachear la fila vieja (sin el strike/baneo) mientras tanto.
+    for dni in session.info.pop("principales_invalidados", ()):
+        principal_cache.invalidate(dni)
+
 def get_db() -> Generator:
     db = SessionLocal()
     try:
@@ -18,32 +48,60 @@ def get_db() -> Generator:
     finally:
         db.close()
 
-def get_current_user(
-    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
-) -> Usuario:
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    # Para endpoints "async def" de solo lectura (catálogo, disponibilidad)
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def _decodificar_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-        dni: str = payload.get("sub")
-        if dni is None:
+        if payload.get("sub") is None:
             raise HTTPException(status_code=401, detail="Token inválido")
     except JWTError:
         raise HTTPException(status_code=401, detail="Token inválido")
-    
-    user = db.query(Usuario).filter(Usuario.dni == dni).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="Usuario no encontrado")
-        
-    # VALIDACIÓN DE BANEO
-    if user.banned_until:
-        if user.banned_until > datetime.now(timezone.utc):
+    return payload
+
+def _validar_baneo(principal: Principal) -> Principal:
+    # banned_until se guarda en hora Perú sin zona horaria
+    if principal.banned_until:
+        if principal.banned_until > datetime.now(TZ_PERU).replace(tzinfo=None):
             raise HTTPException(
                 status_code=403, 
-                detail=f"Cuenta suspendida hasta {user.banned_until}"
+                detail=f"Cuenta suspendida hasta {principal.banned_until}"
             )
-            
+    return principal
+
+def get_current_user(
+    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
+) -> Principal:
+    dni: str = _decodificar_token(token)["sub"]
+
+    principal = principal_cache.get(dni)
+    if principal is None:
+        row = db.query(
+            Usuario.dni, Usuario.nombre, Usuario.email, Usuario.rol, Usuario.banned_until
+        ).filter(Usuario.dni == dni).first()
+        if not row:
+            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+        principal = Principal(
+            dni=row.dni, nombre=row.nombre, email=row.email,
+            rol=getattr(row.rol, "value", row.rol), banned_until=row.banned_until
+        )
+        principal_cache.set(dni, principal)
+
+    # VALIDACIÓN DE BANEO
+    return _validar_baneo(principal)
+
+def require_admin(user: Principal = Depends(get_current_user)):
+    if user.rol != "ADMIN":
+        raise HTTPException(status_code=403, detail="Requiere permisos de administrador")
     return user
 
-def require_admin(user: Usuario = Depends(get_current_user)):
+def require_admin_lectura(user: Principal = Depends(get_current_user)):
+    # Mismo principal que require_admin (caché + BD): el JWT no lleva baneo ni
+    # versión de rol, así que confiar solo en su "role" dejaba a un admin
+    # baneado o degradado leyendo reportes hasta que venciera el token.
     if user.rol != "ADMIN":
         raise HTTPException(status_code=403, detail="Requiere permisos de administrador")
-    return user
\ No newline at end of file
+    return user
@@ -1,14 +1,46 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
+from app.core.hashing import pool_hashing
+from app.core.limitador import LimitadorMiddleware
 from app.api.api import api_router
-from app.db.session import engine
+from app.core.paginacion import HEADER_CURSOR, HEADER_TOTAL
+from app.db.esquema import verificar_esquema
+from app.db.session import engine, async_engine
 from app.models.models import Base
+from app.services.apiperu import cliente_apiperu
+from app.services.barrido import barrendero
+from app.services.email import cerrar_transporte
+from app.services.outbox import worker as outbox_worker
 
-# Crear tablas (en prod usar Alembic, aquí por seguridad)
+# Crear tablas (en prod usar Alembic, aquí por seguridad). Triggers y columnas
+# generadas solo los crean las migraciones: se verifican al arrancar.
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title=settings.PROJECT_NAME)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    verificar_esquema(engine)
+    # Worker de correos en el mismo proceso (ver services/outbox.py)
+    if settings.EMAIL_WORKER_EN_PROCESO:
+        outbox_worker.iniciar()
+    # NO_SHOW y devoluciones vencidas (ver services/barrido.py)
+    if settings.BARRIDO_EN_PROCESO:
+        barrendero.iniciar()
+    yield
+    await barrendero.detener()
+    await outbox_worker.detener()
+    cerrar_transporte()
+    pool_hashing.cerrar()
+    await cliente_apiperu.cerrar()
+    # Cerrar conexiones del pool async al apagar la instancia
+    await async_engine.dispose()
+
+app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
+
+# Antes que CORS: así los 429 también llevan los headers CORS (el último
+# middleware agregado es el más externo)
+app.add_middleware(LimitadorMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,6 +48,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[HEADER_CURSOR, HEADER_TOTAL, "ETag", "Retry-After"],  # para que el navegador pueda leerlas
 )
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
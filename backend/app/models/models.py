@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum, ForeignKey, Text, func
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, Enum, Float, ForeignKey, Index, Text, func, text
 from sqlalchemy.orm import relationship, declarative_base
 import enum
 from datetime import datetime
@@ -40,6 +40,10 @@ class Usuario(Base):
     password_hash = Column(String, nullable=False)
     rol = Column(Enum(Rol), default=Rol.USER)
     strikes = Column(Integer, default=0)
+    # False si se registró con el proveedor de DNI caído (verificación diferida)
+    dni_verificado = Column(Boolean, nullable=False, default=True, server_default=text("true"))
+    # El proveedor respondió que el DNI no existe: sale de la cola de verificación
+    dni_rechazado = Column(Boolean, nullable=False, default=False, server_default=text("false"))
     
     # Fechas SIN zona horaria (Se guardará la hora Perú tal cual)
     banned_until = Column(DateTime(timezone=False), nullable=True)
@@ -47,6 +51,13 @@ class Usuario(Base):
     recovery_expires = Column(DateTime(timezone=False), nullable=True)
     creado_en = Column(DateTime(timezone=False), server_default=func.now())
 
+    __table_args__ = (
+        Index(
+            "ix_usuarios_dni_pendiente", "creado_en",
+            postgresql_where=text("NOT dni_verificado AND NOT dni_rechazado"),
+        ),
+    )
+
 class Libro(Base):
     __tablename__ = "libros"
     id = Column(Integer, primary_key=True, index=True)
@@ -93,11 +104,89 @@ class Reserva(Base):
     # Auditoría de tiempos
     check_in_at = Column(DateTime(timezone=False), nullable=True)
     check_out_at = Column(DateTime(timezone=False), nullable=True)
+    # Strike ya cobrado por esta reserva (NO_SHOW o devolución tardía)
+    strike_aplicado_en = Column(DateTime(timezone=False), nullable=True)
     
     usuario = relationship("Usuario")
     libro = relationship("Libro")
     recurso = relationship("Recurso")
 
+    __table_args__ = (
+        # Un turno de sala solo puede tener una reserva viva (ver crear_reserva)
+        Index(
+            "uq_reservas_sala_turno_activo", "recurso_id", "hora_inicio", unique=True,
+            postgresql_where=text("recurso_id IS NOT NULL AND estado IN ('PENDIENTE', 'EN_USO')"),
+        ),
+        # Rutas de acceso de las consultas calientes (migración 203a40dc0f66)
+        Index("ix_reservas_recurso_estado_inicio", "recurso_id", "estado", "hora_inicio"),
+        Index("ix_reservas_libro_estado_periodo", "libro_id", "estado", "hora_inicio", "hora_fin"),
+        Index("ix_reservas_usuario_tipo_estado", "usuario_dni", "tipo_servicio", "estado"),
+        Index("ix_reservas_estado_fecha", "estado", "fecha_reserva"),
+        Index("ix_reservas_fecha_reserva", "fecha_reserva"),
+        # Candidatas del barrido de vencidas (migración 3c759898a79e)
+        Index("ix_reservas_barrido_salas", "hora_inicio",
+              postgresql_where=text("estado = 'PENDIENTE' AND tipo_servicio = 'SALA'")),
+        Index("ix_reservas_barrido_prestamos", "hora_fin",
+              postgresql_where=text("estado = 'ENTREGADO' AND strike_aplicado_en IS NULL")),
+    )
+
+class LibroOcupacionDiaria(Base):
+    # Mantenida por el trigger trg_reservas_ocupacion (ver migración e5377d7e3683):
+    # ejemplares ocupados por día según reservas PENDIENTE/ENTREGADO.
+    __tablename__ = "libro_ocupacion_diaria"
+    libro_id = Column(Integer, ForeignKey("libros.id", ondelete="CASCADE"), primary_key=True)
+    dia = Column(Date, primary_key=True)
+    reservados = Column(Integer, nullable=False, default=0)
+
+class ReservaResumenDiario(Base):
+    # Mantenida por el trigger trg_reservas_resumen (ver migración 9222145e26a7):
+    # conteos por día de fecha_reserva y por libro (LIBRO) o recurso (SALA).
+    __tablename__ = "reservas_resumen_diario"
+    tipo_servicio = Column(String, primary_key=True)
+    dia = Column(Date, primary_key=True)
+    item_id = Column(Integer, primary_key=True)
+    reservas = Column(Integer, nullable=False, default=0)
+    completadas = Column(Integer, nullable=False, default=0)
+    no_shows = Column(Integer, nullable=False, default=0)
+
+class EmailOutbox(Base):
+    # Correos pendientes, escritos en la misma transacción que el cambio que los
+    # origina. Los envía el worker de app/services/outbox.py.
+    __tablename__ = "email_outbox"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    destinatario = Column(String, nullable=False)
+    asunto = Column(String, nullable=False)
+    html = Column(Text, nullable=False)
+    estado = Column(String, nullable=False, default="PENDIENTE")  # PENDIENTE | ENVIADO | FALLIDO
+    intentos = Column(Integer, nullable=False, default=0)
+    proximo_intento = Column(DateTime(timezone=False), nullable=False, server_default=func.now())
+    ultimo_error = Column(Text, nullable=True)
+    creado_en = Column(DateTime(timezone=False), server_default=func.now())
+    enviado_en = Column(DateTime(timezone=False), nullable=True)
+
+    __table_args__ = (
+        Index("ix_email_outbox_pendientes", "proximo_intento", postgresql_where=text("estado = 'PENDIENTE'")),
+    )
+
+class DniConsulta(Base):
+    # Caché persistente de apiperu.dev (ver app/services/apiperu.py)
+    __tablename__ = "dni_consultas"
+    dni = Column(String(8), primary_key=True)
+    nombre = Column(String, nullable=False)
+    consultado_en = Column(DateTime(timezone=False), nullable=False, server_default=func.now())
+
+class RateLimitBucket(Base):
+    # Token buckets compartidos entre instancias (RATE_LIMIT_BACKEND=postgres,
+    # ver app/core/limitador.py). UNLOGGED: si se pierde tras un crash solo
+    # se reinician los contadores.
+    __tablename__ = "rate_limit_buckets"
+    clave = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    permitido = Column(Boolean, nullable=False)
+    actualizado = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+
 class AuditLog(Base):
     __tablename__ = "audit_log"
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
-from datetime import datetime
-from typing import Optional
+from pydantic import BaseModel, Field
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
 from app.models.models import TipoServicio, EstadoReserva
 
 class ReservaCreate(BaseModel):
@@ -21,4 +21,28 @@ class ReservaOut(BaseModel):
     qr_token: str
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+TZ_PERU = timezone(timedelta(hours=-5))
+
+class Escaneo(BaseModel):
+    token: str                      # qr_token o código legible
+    escaneado_en: datetime          # hora del dispositivo (sin zona = hora Perú)
+    id_local: Optional[str] = None  # id de la cola del escáner, se devuelve tal cual
+
+    def escaneado_en_peru(self) -> datetime:
+        if self.escaneado_en.tzinfo is None:
+            return self.escaneado_en
+        return self.escaneado_en.astimezone(TZ_PERU).replace(tzinfo=None)
+
+class EscaneoLote(BaseModel):
+    escaneos: List[Escaneo] = Field(..., min_length=1, max_length=1000)
+
+class EscaneoResultado(BaseModel):
+    id_local: Optional[str] = None
+    token: str
+    reserva_id: Optional[int] = None
+    dni: Optional[str] = None
+    ok: bool
+    status: str
+    mensaje: str
@@ -17,6 +17,7 @@ class UsuarioOut(UsuarioBase):
     nombre: str
     rol: str
     strikes: int
+    dni_verificado: bool = True
     
     class Config:
         from_attributes = True
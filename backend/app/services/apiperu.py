@@ -0,0 +1,213 @@
+"""
+Validación de DNI contra apiperu.dev.
+
+- Un solo httpx.AsyncClient por proceso (conexiones keep-alive, sin un
+  handshake TLS por registro); se cierra en el lifespan.
+- Caché persistente DNI -> nombre en la tabla dni_consultas (APIPERU_CACHE_DIAS).
+- Circuit breaker: tras APIPERU_CB_FALLOS fallas seguidas deja de llamar
+  durante APIPERU_CB_ESPERA_SEGUNDOS y falla al instante; luego deja pasar
+  una llamada de prueba (semiabierto) para decidir si se cierra.
+
+Con APIPERU_URL apuntando a scripts/mock_apiperu.py se prueba sin el proveedor.
+"""
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+import httpx
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.deps import invalidar_principal
+from app.models.models import DniConsulta, Usuario
+
+logger = logging.getLogger(__name__)
+
+
+class DniNoEncontrado(Exception):
+    pass
+
+
+class ProveedorNoDisponible(Exception):
+    pass
+
+
+class CircuitBreaker:
+    CERRADO, ABIERTO, SEMIABIERTO = "CERRADO", "ABIERTO", "SEMIABIERTO"
+
+    def __init__(self, max_fallos: int, espera: float):
+        self.max_fallos = max_fallos
+        self.espera = espera
+        self.fallos = 0
+        self.abierto_desde: Optional[float] = None
+        self._probando = False
+        self.rechazados = 0
+
+    @property
+    def estado(self) -> str:
+        if self.abierto_desde is None:
+            return self.CERRADO
+        if time.monotonic() - self.abierto_desde >= self.espera:
+            return self.SEMIABIERTO
+        return self.ABIERTO
+
+    def permitir(self) -> bool:
+        estado = self.estado
+        if estado == self.CERRADO:
+            return True
+        if estado == self.SEMIABIERTO and not self._probando:
+            self._probando = True  # una sola llamada de prueba a la vez
+            return True
+        self.rechazados += 1
+        return False
+
+    def exito(self):
+        self.fallos = 0
+        self.abierto_desde = None
+        self._probando = False
+
+    def fallo(self):
+        self.fallos += 1
+        if self._probando or self.fallos >= self.max_fallos:
+            if self.abierto_desde is None:
+                logger.warning("apiperu.circuito_abierto fallos=%s", self.fallos)
+            self.abierto_desde = time.monotonic()
+        self._probando = False
+
+    def liberar(self):
+        """La llamada se canceló sin respuesta: ni éxito ni fallo, pero suelta la prueba."""
+        self._probando = False
+
+    def stats(self) -> dict:
+        return {"estado": self.estado, "fallos_seguidos": self.fallos, "rechazados": self.rechazados}
+
+
+class ClienteApiPeru:
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.breaker = CircuitBreaker(settings.APIPERU_CB_FALLOS, settings.APIPERU_CB_ESPERA_SEGUNDOS)
+        self.consultas = 0
+        self.cache_hits = 0
+
+    def _cliente(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=settings.APIPERU_URL,
+                headers={
+                    "Authorization": f"Bearer {settings.APIPERU_TOKEN}",
+                    "Content-Type": "application/json",
+                    "Accept": "application/json",
+                },
+                timeout=settings.APIPERU_TIMEOUT_SECONDS,
+                limits=httpx.Limits(
+                    max_connections=settings.APIPERU_MAX_CONEXIONES,
+                    max_keepalive_connections=settings.APIPERU_MAX_CONEXIONES,
+                ),
+            )
+        return self._client
+
+    async def cerrar(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _consultar_proveedor(self, dni: str) -> str:
+        if not self.breaker.permitir():
+            raise ProveedorNoDisponible("Circuito abierto")
+        self.consultas += 1
+        try:
+            response = await self._cliente().post("/dni", json={"dni": dni})
+        except httpx.HTTPError as e:
+            self.breaker.fallo()
+            raise ProveedorNoDisponible(type(e).__name__) from e
+        except Exception:
+            self.breaker.fallo()
+            raise
+        except BaseException:
+            # Cancelada (p. ej. el cliente cortó): si era la prueba, _probando quedaría en True para siempre
+            self.breaker.liberar()
+            raise
+
+        # 5xx, 429, 401 (token vencido): problema del proveedor o nuestro, no del DNI
+        if response.status_code >= 500 or response.status_code in (401, 403, 429):
+            self.breaker.fallo()
+            raise ProveedorNoDisponible(f"HTTP {response.status_code}")
+        self.breaker.exito()
+
+        try:
+            cuerpo = response.json() if response.status_code == 200 else {}
+        except ValueError:
+            cuerpo = {}
+        if not cuerpo.get("success"):
+            raise DniNoEncontrado(dni)
+        d = cuerpo.get("data") or {}
+        nombre = f"{d.get('nombres') or ''} {d.get('apellido_paterno') or ''} {d.get('apellido_materno') or ''}"
+        nombre = " ".join(nombre.split())
+        if not nombre:
+            raise DniNoEncontrado(dni)
+        return nombre
+
+    async def nombre_por_dni(self, db: AsyncSession, dni: str) -> str:
+        """
+        Nombre completo del DNI (caché persistente o proveedor). Lanza
+        DniNoEncontrado o ProveedorNoDisponible. Guarda en caché sin commit.
+        """
+        vigente_desde = datetime.utcnow() - timedelta(days=settings.APIPERU_CACHE_DIAS)
+        nombre = await db.scalar(
+            select(DniConsulta.nombre).where(DniConsulta.dni == dni, DniConsulta.consultado_en >= vigente_desde)
+        )
+        if nombre:
+            self.cache_hits += 1
+            return nombre
+
+        nombre = await self._consultar_proveedor(dni)
+        ahora = datetime.utcnow()
+        await db.execute(
+            insert(DniConsulta).values(dni=dni, nombre=nombre, consultado_en=ahora)
+            .on_conflict_do_update(index_elements=[DniConsulta.dni], set_={"nombre": nombre, "consultado_en": ahora})
+        )
+        return nombre
+
+    def stats(self) -> dict:
+        return {
+            "url": settings.APIPERU_URL,
+            "consultas": self.consultas,
+            "cache_hits": self.cache_hits,
+            "circuito": self.breaker.stats(),
+        }
+
+
+cliente_apiperu = ClienteApiPeru()
+
+
+async def verificar_pendientes(db: AsyncSession, limite: int = 100) -> dict:
+    """
+    Reintenta los DNI registrados con verificación diferida. Corta apenas el
+    proveedor vuelve a fallar (el circuito se abre y el resto queda para luego).
+    Los que el proveedor no encuentra quedan rechazados y no se reintentan.
+    """
+    dnis = (await db.scalars(
+        select(Usuario.dni).where(Usuario.dni_verificado.is_(False), Usuario.dni_rechazado.is_(False))
+        .order_by(Usuario.creado_en).limit(limite)
+    )).all()
+    resultado = {"pendientes": len(dnis), "verificados": 0, "no_encontrados": [], "error": None}
+    for dni in dnis:
+        try:
+            nombre = await cliente_apiperu.nombre_por_dni(db, dni)
+        except DniNoEncontrado:
+            # Estado terminal: si no, ocuparían la cabeza de la cola para siempre
+            await db.execute(update(Usuario).where(Usuario.dni == dni).values(dni_rechazado=True))
+            await db.commit()
+            resultado["no_encontrados"].append(dni)
+            continue
+        except ProveedorNoDisponible as e:
+            resultado["error"] = str(e)
+            break
+        await db.execute(update(Usuario).where(Usuario.dni == dni).values(nombre=nombre, dni_verificado=True))
+        invalidar_principal(db.sync_session, dni)  # el principal cacheado tiene el nombre provisional
+        await db.commit()
+        resultado["verificados"] += 1
+    return resultado
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+from typing import Callable, NamedTuple, Optional
+
+from app.core.config import settings
+from app.core.security import QRFirmado
+from app.models.models import Reserva, EstadoReserva, TipoServicio
+
+# Margen de cortesía para entrar antes de la hora de inicio
+MARGEN_ENTRADA = timedelta(minutes=15)
+
+
+class ResultadoEscaneo(NamedTuple):
+    ok: bool
+    status: str
+    mensaje: str
+
+
+def _mensaje_faltan(hora_inicio: datetime, ahora: datetime) -> str:
+    falta = hora_inicio - ahora
+    # Formato amigable de tiempo restante
+    dias = falta.days
+    horas, resto = divmod(falta.seconds, 3600)
+    minutos = resto // 60
+
+    tiempo_txt = f"{horas}h {minutos}m"
+    if dias > 0:
+        tiempo_txt = f"{dias} días, {tiempo_txt}"
+    return f"Aún no inicia tu reserva. Faltan {tiempo_txt}."
+
+
+def rechazo_por_ventana(qr: QRFirmado, ahora: datetime) -> Optional[str]:
+    """
+    Chequeo previo de un QR firmado, sin BD: demasiado temprano o vencido.
+    Devuelve el motivo del rechazo o None si hay que seguir con la reserva.
+    """
+    if ahora < qr.inicio - MARGEN_ENTRADA:
+        return _mensaje_faltan(qr.inicio, ahora)
+    # Margen amplio: una devolución tardía también se escanea
+    if ahora > qr.fin + timedelta(days=settings.QR_VIGENCIA_TRAS_FIN_DIAS):
+        return "QR vencido."
+    return None
+
+
+def no_show_revertible(reserva: Reserva, hora: datetime) -> bool:
+    """
+    Escaneo offline hecho a tiempo que llega después de que la sala pasó a
+    NO_SHOW (barrido o un escaneo tardío de otro dispositivo): el strike se
+    cobró después de que el usuario ya había llegado.
+    """
+    if reserva.estado != EstadoReserva.NO_SHOW or reserva.check_in_at is not None:
+        return False
+    if reserva.strike_aplicado_en is None or reserva.strike_aplicado_en <= hora:
+        return False
+    limite_tolerancia = reserva.hora_inicio + timedelta(minutes=settings.TOLERANCIA_NO_SHOW_MINUTOS)
+    return reserva.hora_inicio - MARGEN_ENTRADA <= hora <= limite_tolerancia
+
+
+def procesar_escaneo(reserva: Reserva, ahora: datetime, cobrar_strike: Callable[[str], None]) -> ResultadoEscaneo:
+    """
+    Reglas de check-in / check-out de validar-qr sobre una reserva ya cargada.
+    Modifica la reserva en memoria (el commit lo hace quien llama) y usa
+    cobrar_strike(dni) para los strikes. `ahora` es la hora del escaneo.
+    """
+    # --- CASO 1: CHECK-IN (Entrada / Recojo) ---
+    if reserva.estado == EstadoReserva.PENDIENTE:
+
+        # REGLA CRÍTICA: No permitir entrada antes de tiempo
+        if ahora < reserva.hora_inicio - MARGEN_ENTRADA:
+            return ResultadoEscaneo(False, "RECHAZADO", _mensaje_faltan(reserva.hora_inicio, ahora))
+
+        # Validación de Tolerancia (Solo Salas) - Llegada tarde
+        if reserva.tipo_servicio == TipoServicio.SALA:
+            limite_tolerancia = reserva.hora_inicio + timedelta(minutes=settings.TOLERANCIA_NO_SHOW_MINUTOS)
+            if ahora > limite_tolerancia:
+                reserva.estado = EstadoReserva.NO_SHOW
+                reserva.strike_aplicado_en = ahora
+                cobrar_strike(reserva.usuario_dni)
+                return ResultadoEscaneo(
+                    False, "NO_SHOW",
+                    f"Tolerancia de {settings.TOLERANCIA_NO_SHOW_MINUTOS} min excedida. Se aplicó Strike y se canceló el turno.",
+                )
+
+        # Check-in Exitoso
+        reserva.estado = EstadoReserva.EN_USO if reserva.tipo_servicio == TipoServicio.SALA else EstadoReserva.ENTREGADO
+        reserva.check_in_at = ahora
+        return ResultadoEscaneo(True, "CHECK-IN EXITOSO", f"Entrada registrada a las {ahora.strftime('%H:%M')}.")
+
+    # --- CASO 2: CHECK-OUT (Salida / Devolución) ---
+    elif reserva.estado in [EstadoReserva.EN_USO, EstadoReserva.ENTREGADO]:
+
+        reserva.estado = EstadoReserva.FINALIZADA
+        reserva.check_out_at = ahora
+
+        mensaje_extra = ""
+
+        # REGLA CRÍTICA: Devolución Tardía = Strike
+        if ahora > reserva.hora_fin:
+            # El barrido periódico puede haber cobrado ya el strike del atraso
+            if reserva.strike_aplicado_en is None:
+                reserva.strike_aplicado_en = ahora
+                cobrar_strike(reserva.usuario_dni)
+                aviso_strike = "Se aplicó 1 Strike."
+            else:
+                aviso_strike = "El Strike ya se había aplicado."
+            retraso = ahora - reserva.hora_fin
+
+            # Calcular cuánto se pasó
+            dias = retraso.days
+            horas = retraso.seconds // 3600
+
+            tiempo_txt = f"{dias} días" if dias > 0 else f"{horas} horas"
+            mensaje_extra = f"⚠️ ENTREGA TARDÍA (+{tiempo_txt}). {aviso_strike}"
+
+        return ResultadoEscaneo(True, "CHECK-OUT REGISTRADO", f"Salida registrada. {mensaje_extra}")
+
+    else:
+        return ResultadoEscaneo(
+            False, "RECHAZADO", f"La reserva ya finalizó o fue cancelada (Estado: {reserva.estado})."
+        )
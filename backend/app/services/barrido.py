@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.deps import invalidar_principal
+
+logger = logging.getLogger(__name__)
+
+TZ_PERU = timezone(timedelta(hours=-5))
+
+# Barrido de reservas vencidas en un solo statement:
+#  - Salas PENDIENTE cuya tolerancia ya pasó -> NO_SHOW.
+#  - Préstamos ENTREGADO con hora_fin vencida -> se marcan (strike_aplicado_en).
+#  - Un strike por cada reserva afectada, con baneo al llegar a 3 (misma regla
+#    que aplicar_strike en admin.py).
+#
+# Es idempotente: cada reserva cambia de estado o de marca una sola vez, y
+# un segundo barrido (o uno concurrente en otra instancia, que espera el lock
+# de fila y reevalúa el WHERE) ya no la encuentra.
+_SQL_BARRIDO = text("""
+    WITH no_show AS (
+        UPDATE reservas SET estado = 'NO_SHOW', strike_aplicado_en = :ahora
+        WHERE tipo_servicio = 'SALA' AND estado = 'PENDIENTE' AND hora_inicio < :limite_tolerancia
+        RETURNING usuario_dni
+    ), vencidos AS (
+        UPDATE reservas SET strike_aplicado_en = :ahora
+        WHERE estado = 'ENTREGADO' AND strike_aplicado_en IS NULL AND hora_fin < :ahora
+        RETURNING usuario_dni
+    ), strikes AS (
+        SELECT usuario_dni, count(*) AS n
+        FROM (SELECT usuario_dni FROM no_show UNION ALL SELECT usuario_dni FROM vencidos) t
+        WHERE usuario_dni IS NOT NULL
+        GROUP BY usuario_dni
+    ), usuarios_afectados AS (
+        UPDATE usuarios u
+        SET strikes = u.strikes + s.n,
+            banned_until = CASE WHEN u.strikes + s.n >= 3 THEN CAST(:ban_hasta AS timestamp) ELSE u.banned_until END
+        FROM strikes s
+        WHERE u.dni = s.usuario_dni
+        RETURNING u.dni
+    )
+    SELECT (SELECT count(*) FROM no_show) AS no_shows,
+           (SELECT count(*) FROM vencidos) AS vencidos,
+           ARRAY(SELECT dni FROM usuarios_afectados) AS dnis
+""")
+
+
+def barrer_reservas(db: Session, ahora: datetime = None) -> dict:
+    """Ejecuta un barrido y hace commit. Devuelve los conteos."""
+    # Entre instancias basta con que barra una: las demás saltan esta vuelta
+    if not db.execute(text("SELECT pg_try_advisory_xact_lock(hashtext('barrido_reservas'))")).scalar():
+        db.rollback()
+        return {"no_shows": 0, "vencidos": 0, "usuarios": 0, "omitido": True}
+
+    ahora = ahora or datetime.now(TZ_PERU).replace(tzinfo=None)
+    fila = db.execute(_SQL_BARRIDO, {
+        "ahora": ahora,
+        "limite_tolerancia": ahora - timedelta(minutes=settings.TOLERANCIA_NO_SHOW_MINUTOS),
+        "ban_hasta": ahora + timedelta(days=180),
+    }).one()
+    for dni in fila.dnis:
+        invalidar_principal(db, dni)
+    db.commit()
+    return {"no_shows": fila.no_shows, "vencidos": fila.vencidos, "usuarios": len(fila.dnis), "omitido": False}
+
+
+def _barrer() -> dict:
+    db = SessionLocal()
+    try:
+        return barrer_reservas(db)
+    finally:
+        db.close()
+
+
+class Barrendero:
+    """Tarea periódica en el proceso de la API (ver BARRIDO_EN_PROCESO)."""
+
+    def __init__(self):
+        self._tarea = None
+        self._detener = None
+        self.ultimo = None
+
+    def iniciar(self):
+        self._detener = asyncio.Event()
+        self._tarea = asyncio.create_task(self._correr())
+        return self._tarea
+
+    async def detener(self):
+        if self._tarea is None:
+            return
+        self._detener.set()
+        await self._tarea
+        self._tarea = None
+
+    async def _correr(self):
+        while not self._detener.is_set():
+            try:
+                self.ultimo = await asyncio.to_thread(_barrer)
+                if self.ultimo["no_shows"] or self.ultimo["vencidos"]:
+                    logger.info(
+                        "barrido no_shows=%s vencidos=%s usuarios=%s",
+                        self.ultimo["no_shows"], self.ultimo["vencidos"], self.ultimo["usuarios"],
+                    )
+            except Exception:
+                logger.exception("Error en el barrido de reservas")
+            try:
+                await asyncio.wait_for(self._detener.wait(), settings.BARRIDO_INTERVALO_SEGUNDOS)
+            except asyncio.TimeoutError:
+                pass
+
+
+barrendero = Barrendero()
@@ -0,0 +1,50 @@
+import re
+from typing import Optional, Tuple
+
+from sqlalchemy import func, literal_column, or_
+from sqlalchemy.sql import ColumnElement
+
+from app.models.models import Libro
+
+# Columna generada por la migración ea9659b51b8f (no mapeada en el modelo
+# para que create_all no dependa de la función f_unaccent).
+BUSQUEDA = literal_column("libros.busqueda")
+
+_ISBN_RE = re.compile(r"^(?:\d{9}[\dXx]|\d{13})$")
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalizar_isbn(q: str) -> Optional[str]:
+    """Devuelve el ISBN sin guiones/espacios si q parece un ISBN-10/13."""
+    limpio = re.sub(r"[\s-]", "", q)
+    return limpio.upper() if _ISBN_RE.match(limpio) else None
+
+
+def _tsquery_prefijo(q: str) -> Optional[str]:
+    # "garcia marq" -> "garcia:* & marq:*" (búsqueda mientras se escribe)
+    tokens = _TOKEN_RE.findall(q)
+    return " & ".join(f"{t}:*" for t in tokens) if tokens else None
+
+
+def filtro_libros(q: str) -> Tuple[ColumnElement, ColumnElement]:
+    """
+    Condición WHERE y expresión de ranking para buscar libros por texto.
+
+    Combina full-text (tsvector en español, sin tildes, con prefijos) y
+    similitud por trigramas sobre título/autor para tolerar errores de
+    tipeo. Ambas ramas usan índices GIN.
+    """
+    texto = func.f_unaccent(func.lower(q))
+    titulo = func.f_unaccent(func.lower(Libro.titulo))
+    autor = func.f_unaccent(func.lower(Libro.autor))
+
+    condiciones = [texto.op("<%")(titulo), texto.op("<%")(autor)]
+    rank = func.greatest(func.word_similarity(texto, titulo), func.word_similarity(texto, autor))
+
+    tsq_str = _tsquery_prefijo(q)
+    if tsq_str:
+        tsq = func.to_tsquery("spanish", func.f_unaccent(tsq_str))
+        condiciones.insert(0, BUSQUEDA.op("@@")(tsq))
+        rank = func.ts_rank_cd(BUSQUEDA, tsq) + rank
+
+    return or_(*condiciones), rank
@@ -0,0 +1,108 @@
+from datetime import date, datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+from app.models.models import Libro, LibroOcupacionDiaria, EstadoReserva, Reserva
+
+# Estados que ocupan un ejemplar de libro (el trigger usa la misma regla)
+ESTADOS_LIBRO_ACTIVOS = (EstadoReserva.PENDIENTE, EstadoReserva.ENTREGADO)
+# Estados que ocupan un turno de sala (igual que uq_reservas_sala_turno_activo)
+ESTADOS_SALA_ACTIVOS = (EstadoReserva.PENDIENTE, EstadoReserva.EN_USO)
+
+
+def rango_del_dia(dia: date) -> Tuple[datetime, datetime]:
+    """
+    [00:00 del día, 00:00 del siguiente): comparar la columna contra este rango
+    usa los índices sobre timestamps, func.date(columna) == dia no.
+    """
+    inicio = datetime.combine(dia, datetime.min.time())
+    return inicio, inicio + timedelta(days=1)
+
+
+def horas_ocupadas_sala(recurso_id: int, dia: date):
+    """SELECT de los turnos vivos de la sala en el día (índice recurso_id, estado, hora_inicio)."""
+    inicio, fin = rango_del_dia(dia)
+    return select(Reserva.hora_inicio).where(
+        Reserva.recurso_id == recurso_id,
+        Reserva.estado.in_(ESTADOS_SALA_ACTIVOS),
+        Reserva.hora_inicio >= inicio,
+        Reserva.hora_inicio < fin,
+    ).order_by(Reserva.hora_inicio)
+
+
+def ocupados_libro_en(dia: date):
+    """Subconsulta correlacionada con Libro: ejemplares reservados en `dia` (lookup por PK)."""
+    return func.coalesce(
+        select(LibroOcupacionDiaria.reservados)
+        .where(LibroOcupacionDiaria.libro_id == Libro.id, LibroOcupacionDiaria.dia == dia)
+        .correlate(Libro)
+        .scalar_subquery(),
+        0,
+    )
+
+
+def stock_disponible_en(dia: date):
+    """Columna `stock_disponible` para un SELECT sobre Libro (nunca negativa)."""
+    return func.greatest(Libro.stock_total - ocupados_libro_en(dia), 0).label("stock_disponible")
+
+
+def dias_sin_stock(libro_id: int, desde: date, hasta: date):
+    """SELECT de los días del rango en que el libro ya no tiene ejemplares libres."""
+    return (
+        select(LibroOcupacionDiaria.dia)
+        .join(Libro, Libro.id == LibroOcupacionDiaria.libro_id)
+        .where(
+            LibroOcupacionDiaria.libro_id == libro_id,
+            LibroOcupacionDiaria.dia.between(desde, hasta),
+            LibroOcupacionDiaria.reservados >= Libro.stock_total,
+        )
+        .order_by(LibroOcupacionDiaria.dia)
+    )
+
+
+# --- Mantenimiento (scripts/ocupacion.py) ---
+
+_SQL_ESPERADA = """
+    SELECT r.libro_id, d::date AS dia, count(*) AS reservados
+    FROM reservas r
+    CROSS JOIN LATERAL generate_series(r.hora_inicio::date, r.hora_fin::date, interval '1 day') AS d
+    WHERE r.libro_id IS NOT NULL AND r.hora_inicio IS NOT NULL AND r.hora_fin IS NOT NULL
+      AND r.estado::text IN ('PENDIENTE', 'ENTREGADO')
+      AND (CAST(:libro_id AS integer) IS NULL OR r.libro_id = :libro_id)
+    GROUP BY r.libro_id, d::date
+"""
+
+
+def verificar_ocupacion(db: Session, libro_id: Optional[int] = None) -> list:
+    """Diferencias entre la tabla y lo que dicen las reservas (lista vacía = consistente)."""
+    sql = text(f"""
+        WITH esperada AS ({_SQL_ESPERADA}),
+        actual AS (
+            SELECT libro_id, dia, reservados FROM libro_ocupacion_diaria
+            WHERE reservados <> 0 AND (CAST(:libro_id AS integer) IS NULL OR libro_id = :libro_id)
+        )
+        SELECT coalesce(e.libro_id, a.libro_id) AS libro_id, coalesce(e.dia, a.dia) AS dia,
+               coalesce(e.reservados, 0) AS esperado, coalesce(a.reservados, 0) AS actual
+        FROM esperada e
+        FULL OUTER JOIN actual a ON a.libro_id = e.libro_id AND a.dia = e.dia
+        WHERE coalesce(e.reservados, 0) <> coalesce(a.reservados, 0)
+        ORDER BY 1, 2
+    """)
+    return db.execute(sql, {"libro_id": libro_id}).all()
+
+
+def reconstruir_ocupacion(db: Session, libro_id: Optional[int] = None) -> int:
+    """Recalcula la tabla desde reservas. Bloquea escrituras en reservas mientras dura."""
+    db.execute(text("LOCK TABLE reservas IN SHARE ROW EXCLUSIVE MODE"))
+    db.execute(
+        text("DELETE FROM libro_ocupacion_diaria WHERE CAST(:libro_id AS integer) IS NULL OR libro_id = :libro_id"),
+        {"libro_id": libro_id},
+    )
+    insertadas = db.execute(
+        text(f"INSERT INTO libro_ocupacion_diaria (libro_id, dia, reservados) {_SQL_ESPERADA}"),
+        {"libro_id": libro_id},
+    ).rowcount
+    db.commit()
+    return insertadas
@@ -1,55 +1,180 @@
-from sendgrid import SendGridAPIClient
+from html import escape
+from pathlib import Path
+from string import Template
 from sendgrid.helpers.mail import Mail
 from app.core.config import settings
+from app.services.qr import url_qr
+import httpx
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
-def send_email(to_email: str, subject: str, html_content: str):
+_SENDGRID_URL = "https://api.sendgrid.com/v3/mail/send"
+_PLANTILLAS = Path(__file__).parent / "plantillas"
+
+
+class EmailNoConfigurado(Exception):
+    """Faltan credenciales: reintentar no sirve de nada."""
+
+
+class TransporteSendGrid:
     """
-    Envía un correo electrónico real usando SendGrid.
+    Cliente HTTP de larga vida contra la API v3 de SendGrid: reutiliza las
+    conexiones TLS (keep-alive) en lugar de abrir una por correo como hacía
+    SendGridAPIClient. httpx.Client es thread-safe, se comparte entre hilos.
     """
-    if not settings.SENDGRID_API_KEY:
-        logger.warning("⚠️ SENDGRID_API_KEY no configurada. El correo no se enviará.")
-        return False
 
-    if not settings.SENDGRID_SENDER:
-        logger.warning("⚠️ SENDGRID_SENDER no configurado. El correo no se enviará.")
-        return False
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
 
-    message = Mail(
-        from_email=settings.SENDGRID_SENDER,
-        to_emails=to_email,
-        subject=subject,
-        html_content=html_content
-    )
-    
+    def _get_client(self) -> httpx.Client:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(
+                        headers={"Authorization": f"Bearer {settings.SENDGRID_API_KEY}"},
+                        timeout=settings.SENDGRID_TIMEOUT_SECONDS,
+                        limits=httpx.Limits(
+                            max_connections=settings.EMAIL_WORKER_CONCURRENCIA,
+                            max_keepalive_connections=settings.EMAIL_WORKER_CONCURRENCIA,
+                        ),
+                    )
+        return self._client
+
+    def enviar(self, to_email: str, subject: str, html_content: str):
+        """Envía el correo; lanza excepción si SendGrid no lo acepta."""
+        if not settings.SENDGRID_API_KEY:
+            raise EmailNoConfigurado("SENDGRID_API_KEY no configurada")
+        if not settings.SENDGRID_SENDER:
+            raise EmailNoConfigurado("SENDGRID_SENDER no configurado")
+
+        message = Mail(
+            from_email=settings.SENDGRID_SENDER,
+            to_emails=to_email,
+            subject=subject,
+            html_content=html_content
+        )
+        dominio = to_email.rpartition("@")[2]
+        inicio = time.perf_counter()
+        try:
+            response = self._get_client().post(_SENDGRID_URL, json=message.get())
+        except httpx.HTTPError as e:
+            latencia = (time.perf_counter() - inicio) * 1000
+            logger.warning(
+                "email.error dominio=%s latencia_ms=%.1f error=%s", dominio, latencia, type(e).__name__,
+                extra={"evento": "email.error", "dominio": dominio, "latencia_ms": latencia, "error": type(e).__name__},
+            )
+            raise
+        latencia = (time.perf_counter() - inicio) * 1000
+        datos = {"dominio": dominio, "status": response.status_code, "latencia_ms": latencia, "bytes": len(html_content)}
+        if response.is_error:
+            logger.warning(
+                "email.rechazado dominio=%s status=%s latencia_ms=%.1f detalle=%s",
+                dominio, response.status_code, latencia, response.text[:500],
+                extra={"evento": "email.rechazado", **datos},
+            )
+            response.raise_for_status()
+        logger.info(
+            "email.enviado dominio=%s status=%s latencia_ms=%.1f bytes=%s",
+            dominio, response.status_code, latencia, len(html_content),
+            extra={"evento": "email.enviado", **datos},
+        )
+
+    def cerrar(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+class TransporteFalso:
+    """Guarda los correos en memoria en lugar de enviarlos (tests / desarrollo)."""
+
+    def __init__(self):
+        self.enviados = []
+        self.fallos_pendientes = 0  # para simular errores del proveedor
+        self._lock = threading.Lock()
+
+    def enviar(self, to_email: str, subject: str, html_content: str):
+        with self._lock:
+            if self.fallos_pendientes > 0:
+                self.fallos_pendientes -= 1
+                raise RuntimeError("Fallo simulado del transporte")
+            self.enviados.append({"to": to_email, "subject": subject, "html": html_content})
+
+    def cerrar(self):
+        pass
+
+
+_TRANSPORTES = {"sendgrid": TransporteSendGrid, "falso": TransporteFalso}
+_transporte = None
+
+
+def get_transporte():
+    global _transporte
+    if _transporte is None:
+        _transporte = _TRANSPORTES[settings.EMAIL_TRANSPORTE]()
+    return _transporte
+
+
+def cerrar_transporte():
+    if _transporte is not None:
+        _transporte.cerrar()
+
+
+def send_email(to_email: str, subject: str, html_content: str):
+    """
+    Envía un correo en el momento (sin outbox). Para correos originados por
+    una request usar app.services.outbox.encolar_email.
+    """
     try:
-        sg = SendGridAPIClient(settings.SENDGRID_API_KEY)
-        response = sg.send(message)
-        print(f"✅ SendGrid Status: {response.status_code}") # Debug
+        get_transporte().enviar(to_email, subject, html_content)
         return True
-    except Exception as e:
-        # IMPRIMIR EL ERROR COMPLETO
-        print(f"❌ Error SendGrid: {str(e)}")
-        if hasattr(e, 'body'):
-            print(f"❌ Detalle: {e.body}") # Esto te dirá por qué falla
+    except EmailNoConfigurado as e:
+        logger.warning(f"⚠️ {e}. El correo no se enviará.")
+        return False
+    except Exception:
+        logger.exception("Error enviando correo")
         return False
 
-def send_otp_email(to_email: str, code: str):
+
+class Plantilla:
+    """
+    Plantilla HTML leída y parseada una sola vez (al importar el módulo).
+    Todos los valores se escapan al renderizar: nombres o títulos con < o &
+    no rompen ni inyectan HTML.
+    """
+
+    def __init__(self, archivo: str):
+        self.nombre = archivo
+        self._template = Template((_PLANTILLAS / archivo).read_text(encoding="utf-8"))
+
+    def render(self, **contexto) -> str:
+        # substitute (no safe_substitute): una variable faltante es un error
+        return self._template.substitute({k: escape(str(v)) for k, v in contexto.items()})
+
+
+PLANTILLA_OTP = Plantilla("otp.html")
+PLANTILLA_CONFIRMACION_RESERVA = Plantilla("confirmacion_reserva.html")
+
+
+def mensaje_otp(code: str):
     """
-    Plantilla específica para enviar códigos OTP.
+    Plantilla específica para enviar códigos OTP. Devuelve (asunto, html).
     """
     subject = "Código de Recuperación - BNP Servicios"
-    content = f"""
-    <div style="font-family: Arial, sans-serif; color: #333;">
-        <h2>Recuperación de Cuenta</h2>
-        <p>Has solicitado restablecer tu contraseña o verificar tu identidad.</p>
-        <p>Tu código de verificación es:</p>
-        <h1 style="color: #D91023; letter-spacing: 5px;">{code}</h1>
-        <p>Este código expirará en <strong>{settings.OTP_EXP_MINUTES} minutos</strong>.</p>
-        <hr>
-        <p style="font-size: 12px; color: #777;">Si no solicitaste este código, ignora este mensaje.</p>
-    </div>
-    """
-    return send_email(to_email, subject, content)
\ No newline at end of file
+    return subject, PLANTILLA_OTP.render(code=code, minutos=settings.OTP_EXP_MINUTES)
+
+def mensaje_confirmacion_reserva(nombre_usuario: str, servicio: str, item: str, fecha_mostrar: str, code: str, qr_token: str):
+    """
+    Confirmación de reserva con el QR de ingreso. Devuelve (asunto, html).
+    """
+    # QR (token firmado) servido por la propia API (GET /reservas/{token}/qr.png), cacheable
+    qr_url = url_qr(qr_token)
+    html = PLANTILLA_CONFIRMACION_RESERVA.render(
+        nombre_usuario=nombre_usuario, servicio=servicio, item=item,
+        fecha_mostrar=fecha_mostrar, qr_url=qr_url, code=code,
+    )
+    return f"Confirmación - {code}", html
@@ -0,0 +1,262 @@
+import csv
+import io
+import zipfile
+import zlib
+from datetime import date, datetime, timedelta
+from itertools import groupby, islice
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import aliased
+
+from app.db.guard import limite_queries_conexion
+from app.db.session import engine
+from app.models.models import Reserva, Usuario, Libro, Recurso, Sede, EstadoReserva, TipoServicio
+
+# Exportaciones en streaming: cursor del lado del servidor (psycopg2 named
+# cursor vía stream_results) + generador que emite el CSV por bloques.
+# La memoria no depende del tamaño de la tabla y el primer byte sale de
+# inmediato (el encabezado).
+#
+# El generador abre su propia conexión: FastAPI cierra las dependencias con
+# yield (get_db) antes de empezar a enviar el cuerpo de la respuesta.
+
+FILAS_POR_LOTE = 2000
+BYTES_POR_BLOQUE = 64 * 1024
+
+
+def _rango_fechas(columna, desde: Optional[date], hasta: Optional[date]):
+    """Filtro semiabierto [desde, hasta + 1 día): sargable sobre la columna."""
+    condiciones = []
+    if desde:
+        condiciones.append(columna >= datetime.combine(desde, datetime.min.time()))
+    if hasta:
+        condiciones.append(columna < datetime.combine(hasta + timedelta(days=1), datetime.min.time()))
+    return condiciones
+
+
+def consulta_reservas(desde: Optional[date] = None, hasta: Optional[date] = None, sede_id: Optional[int] = None):
+    # La sede sale del libro o del recurso según el tipo
+    sede_libro = aliased(Sede)
+    sede_recurso = aliased(Sede)
+    stmt = select(
+        Reserva.id, Reserva.code, Reserva.usuario_dni, Reserva.tipo_servicio,
+        Reserva.fecha_reserva, Reserva.estado,
+        func.coalesce(sede_libro.nombre, sede_recurso.nombre, "-").label("sede"),
+    ).outerjoin(Libro, Reserva.libro_id == Libro.id)\
+     .outerjoin(sede_libro, Libro.sede_id == sede_libro.id)\
+     .outerjoin(Recurso, Reserva.recurso_id == Recurso.id)\
+     .outerjoin(sede_recurso, Recurso.sede_id == sede_recurso.id)\
+     .where(*_rango_fechas(Reserva.fecha_reserva, desde, hasta))\
+     .order_by(Reserva.id)
+    if sede_id:
+        stmt = stmt.where(or_(Libro.sede_id == sede_id, Recurso.sede_id == sede_id))
+    return stmt
+
+
+def consulta_usuarios(desde: Optional[date] = None, hasta: Optional[date] = None):
+    return select(Usuario.dni, Usuario.nombre, Usuario.email, Usuario.strikes, Usuario.banned_until)\
+        .where(*_rango_fechas(Usuario.creado_en, desde, hasta))\
+        .order_by(Usuario.dni)
+
+
+def consulta_libros(sede_id: Optional[int] = None):
+    stmt = select(
+        Libro.codigo_inventario, Libro.titulo, Sede.nombre.label("sede"), Libro.disponible, Libro.stock_total
+    ).join(Sede, Libro.sede_id == Sede.id).order_by(Libro.id)
+    return stmt.where(Libro.sede_id == sede_id) if sede_id else stmt
+
+
+def consulta_recursos(sede_id: Optional[int] = None):
+    stmt = select(
+        Recurso.codigo_inventario, Recurso.tipo_recurso, Recurso.nombre, Sede.nombre.label("sede"),
+        Recurso.disponible, Recurso.capacidad
+    ).join(Sede, Recurso.sede_id == Sede.id).order_by(Recurso.id)
+    return stmt.where(Recurso.sede_id == sede_id) if sede_id else stmt
+
+
+def iterar_filas(stmt, filas_por_lote: int = FILAS_POR_LOTE) -> Iterator:
+    """
+    Recorre el SELECT con un cursor del servidor, trayendo filas por lotes.
+    Un solo statement por sección (los lotes son FETCH del cursor, no queries):
+    el guard lo exige aunque el export tenga millones de filas.
+    """
+    with engine.connect() as conn, limite_queries_conexion(conn, 1):
+        resultado = conn.execution_options(stream_results=True, yield_per=filas_por_lote).execute(stmt)
+        for particion in resultado.partitions():
+            yield from particion
+
+
+def csv_en_bloques(
+    encabezado: list,
+    secciones: Iterable[tuple],
+    comprimir: bool = False,
+) -> Iterator[bytes]:
+    """
+    Genera el CSV por bloques de ~64 KB. Cada sección es (stmt, transformar),
+    donde transformar convierte una fila en la lista de celdas (None = tal cual).
+    Con comprimir=True la salida es gzip, comprimida sobre la marcha.
+    """
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if comprimir else None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def vaciar(sincronizar: bool = False) -> bytes:
+        datos = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        if not gzip:
+            return datos
+        comprimido = gzip.compress(datos)
+        return comprimido + gzip.flush(zlib.Z_SYNC_FLUSH) if sincronizar else comprimido
+
+    writer.writerow(encabezado)
+    yield vaciar(sincronizar=True)  # primer byte inmediato, antes de la consulta
+
+    for stmt, transformar in secciones:
+        for fila in iterar_filas(stmt):
+            writer.writerow(transformar(fila) if transformar else fila)
+            if buffer.tell() >= BYTES_POR_BLOQUE:
+                bloque = vaciar()
+                if bloque:
+                    yield bloque
+
+    final = vaciar()
+    if gzip:
+        final += gzip.flush()
+    if final:
+        yield final
+
+
+# --- Exportación columnar (Parquet / Arrow IPC) ---
+# pyarrow es opcional: solo se importa al exportar en estos formatos.
+
+FILAS_POR_GRUPO = 50000  # filas por row group (Parquet) o record batch (Arrow)
+
+EXTENSIONES_COLUMNAR = {"parquet": "parquet", "arrow": "arrows"}
+
+
+def consulta_reservas_historial(desde: Optional[date] = None, hasta: Optional[date] = None, sede_id: Optional[int] = None):
+    """Historial completo de reservas con tipos nativos, ordenado por fecha (para particionar por mes)."""
+    sede_id_col = func.coalesce(Libro.sede_id, Recurso.sede_id)
+    stmt = select(
+        Reserva.id, Reserva.code, Reserva.usuario_dni, Reserva.tipo_servicio, Reserva.estado,
+        Reserva.libro_id, Reserva.recurso_id, sede_id_col.label("sede_id"), Sede.nombre.label("sede"),
+        Reserva.fecha_reserva, Reserva.hora_inicio, Reserva.hora_fin,
+        Reserva.check_in_at, Reserva.check_out_at,
+    ).outerjoin(Libro, Reserva.libro_id == Libro.id)\
+     .outerjoin(Recurso, Reserva.recurso_id == Recurso.id)\
+     .outerjoin(Sede, Sede.id == sede_id_col)\
+     .where(*_rango_fechas(Reserva.fecha_reserva, desde, hasta))\
+     .order_by(Reserva.fecha_reserva, Reserva.id)
+    if sede_id:
+        stmt = stmt.where(sede_id_col == sede_id)
+    return stmt
+
+
+def _esquema_reservas(pa):
+    enum = pa.dictionary(pa.int8(), pa.string())
+    ts = pa.timestamp("us")  # hora Perú, sin zona (igual que en la BD)
+    return pa.schema([
+        ("id", pa.int32()), ("code", pa.string()), ("usuario_dni", pa.string()),
+        ("tipo_servicio", enum), ("estado", enum),
+        ("libro_id", pa.int32()), ("recurso_id", pa.int32()), ("sede_id", pa.int32()), ("sede", pa.string()),
+        ("fecha_reserva", ts), ("hora_inicio", ts), ("hora_fin", ts),
+        ("check_in_at", ts), ("check_out_at", ts),
+    ])
+
+
+def _record_batch(pa, esquema, filas: list):
+    columnas = list(zip(*filas)) if filas else [()] * len(esquema)
+    arrays = []
+    for campo, valores in zip(esquema, columnas):
+        if pa.types.is_dictionary(campo.type):
+            # Diccionario fijo con todos los valores del enum: mismo esquema en todos los lotes
+            enum = TipoServicio if campo.name == "tipo_servicio" else EstadoReserva
+            posiciones = {m: i for i, m in enumerate(enum)}
+            indices = pa.array([posiciones[v] if v is not None else None for v in valores], pa.int8())
+            arrays.append(pa.DictionaryArray.from_arrays(indices, pa.array([m.value for m in enum])))
+        else:
+            arrays.append(pa.array(valores, campo.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=esquema)
+
+
+class _Sumidero(io.RawIOBase):
+    """Archivo de solo escritura y no 'seekable': acumula bytes hasta que el generador los retira."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._posicion = 0
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._buffer += datos
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def retirar(self) -> bytes:
+        datos = bytes(self._buffer)
+        self._buffer.clear()
+        return datos
+
+
+def columnar_en_bloques(stmt, formato: str = "parquet", particionar_por_mes: bool = False) -> Iterator[bytes]:
+    """
+    Escribe el historial en Parquet (row groups) o Arrow IPC stream, lote a lote
+    desde el cursor del servidor. Con particionar_por_mes la salida es un ZIP
+    con un archivo por mes en formato Hive (mes=AAAA-MM/...), también en streaming.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = _esquema_reservas(pa)
+    extension = EXTENSIONES_COLUMNAR[formato]
+
+    def abrir(destino):
+        if formato == "parquet":
+            return pq.ParquetWriter(destino, esquema, compression="zstd")
+        return pa.ipc.new_stream(destino, esquema)
+
+    sumidero = _Sumidero()
+    contenedor = zipfile.ZipFile(sumidero, "w", zipfile.ZIP_STORED) if particionar_por_mes else None
+    escritor = miembro = mes_actual = None
+
+    def cerrar_particion():
+        if escritor is not None:
+            escritor.close()
+        if miembro is not None:
+            miembro.close()
+
+    filas = iterar_filas(stmt, FILAS_POR_GRUPO)
+    while True:
+        lote = list(islice(filas, FILAS_POR_GRUPO))
+        if not lote:
+            break
+        if particionar_por_mes:
+            # Las filas vienen ordenadas por fecha: cada mes es un tramo contiguo
+            for mes, tramo in groupby(lote, key=lambda f: f.fecha_reserva.strftime("%Y-%m")):
+                if mes != mes_actual:
+                    cerrar_particion()
+                    miembro = contenedor.open(f"mes={mes}/reservas.{extension}", "w", force_zip64=True)
+                    escritor = abrir(miembro)
+                    mes_actual = mes
+                escritor.write_batch(_record_batch(pa, esquema, list(tramo)))
+        else:
+            if escritor is None:
+                escritor = abrir(sumidero)
+            escritor.write_batch(_record_batch(pa, esquema, lote))
+        datos = sumidero.retirar()
+        if datos:
+            yield datos
+
+    if escritor is None and not particionar_por_mes:
+        escritor = abrir(sumidero)  # archivo vacío pero con esquema
+    cerrar_particion()
+    if contenedor is not None:
+        contenedor.close()
+    yield sumidero.retirar()
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import random
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.models import EmailOutbox
+from app.services.email import EmailNoConfigurado, get_transporte
+
+logger = logging.getLogger(__name__)
+
+# Una fila reclamada queda "alquilada" este tiempo: si el worker muere a mitad
+# de envío, otra vuelta la vuelve a tomar (entrega al-menos-una-vez).
+_LEASE_SEGUNDOS = 300
+
+_SQL_RECLAMAR = text("""
+    UPDATE email_outbox
+    SET intentos = intentos + 1,
+        proximo_intento = now() + CAST(:lease AS integer) * interval '1 second'
+    WHERE id IN (
+        SELECT id FROM email_outbox
+        WHERE estado = 'PENDIENTE' AND proximo_intento <= now()
+        ORDER BY proximo_intento
+        LIMIT :lote
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, destinatario, asunto, html, intentos
+""")
+
+_SQL_ENVIADOS = text("""
+    UPDATE email_outbox SET estado = 'ENVIADO', enviado_en = now(), ultimo_error = NULL
+    WHERE id = ANY(CAST(:ids AS integer[]))
+""")
+
+_SQL_REINTENTAR = text("""
+    UPDATE email_outbox
+    SET proximo_intento = now() + CAST(:espera AS integer) * interval '1 second', ultimo_error = :error
+    WHERE id = :id
+""")
+
+_SQL_FALLIDO = text("UPDATE email_outbox SET estado = 'FALLIDO', ultimo_error = :error WHERE id = :id")
+
+
+def encolar_email(db: Session, destinatario: str, asunto: str, html: str):
+    """Agrega el correo a la transacción actual; se envía tras el commit."""
+    db.add(EmailOutbox(destinatario=destinatario, asunto=asunto, html=html))
+    db.info["outbox_pendiente"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _despertar_worker(session):
+    if session.info.pop("outbox_pendiente", False):
+        worker.notificar()
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_aviso(session):
+    session.info.pop("outbox_pendiente", None)
+
+
+def _espera_backoff(intentos: int) -> int:
+    """Backoff exponencial con jitter: base * 2^(n-1), entre la mitad y el total."""
+    espera = settings.EMAIL_BACKOFF_SEGUNDOS * 2 ** (intentos - 1)
+    return int(random.uniform(espera / 2, espera))
+
+
+class OutboxWorker:
+    """Drena email_outbox en segundo plano (varias instancias conviven gracias a SKIP LOCKED)."""
+
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self._session_factory = session_factory
+        self._despertar = None
+        self._detener = None
+        self._loop = None
+        self._tarea = None
+        self.enviados = 0
+        self.reintentos = 0
+        self.fallidos = 0
+
+    def iniciar(self):
+        self._loop = asyncio.get_running_loop()
+        self._despertar = asyncio.Event()
+        self._detener = asyncio.Event()
+        self._tarea = asyncio.create_task(self.correr())
+        return self._tarea
+
+    async def detener(self):
+        if self._tarea is None:
+            return
+        self._detener.set()
+        self._despertar.set()
+        await self._tarea
+        self._tarea = None
+
+    def notificar(self):
+        """Despierta al worker; se puede llamar desde hilos del threadpool."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._despertar.set)
+
+    async def correr(self):
+        while not self._detener.is_set():
+            try:
+                procesados = await self.procesar_lote()
+            except Exception:
+                logger.exception("Error drenando email_outbox")
+                procesados = 0
+            if procesados < settings.EMAIL_WORKER_LOTE:
+                try:
+                    await asyncio.wait_for(self._despertar.wait(), settings.EMAIL_WORKER_INTERVALO)
+                except asyncio.TimeoutError:
+                    pass
+                self._despertar.clear()
+
+    async def procesar_lote(self) -> int:
+        async with self._session_factory() as db:
+            filas = (await db.execute(
+                _SQL_RECLAMAR, {"lease": _LEASE_SEGUNDOS, "lote": settings.EMAIL_WORKER_LOTE}
+            )).all()
+            await db.commit()
+        if not filas:
+            return 0
+
+        # El envío va fuera de la transacción y con concurrencia acotada
+        semaforo = asyncio.Semaphore(settings.EMAIL_WORKER_CONCURRENCIA)
+        transporte = get_transporte()
+
+        async def enviar(fila):
+            async with semaforo:
+                try:
+                    await asyncio.to_thread(transporte.enviar, fila.destinatario, fila.asunto, fila.html)
+                    return None
+                except Exception as e:
+                    return e
+
+        errores = await asyncio.gather(*[enviar(f) for f in filas])
+
+        async with self._session_factory() as db:
+            enviados = [f.id for f, e in zip(filas, errores) if e is None]
+            if enviados:
+                await db.execute(_SQL_ENVIADOS, {"ids": enviados})
+            for fila, error in zip(filas, errores):
+                if error is None:
+                    continue
+                detalle = f"{type(error).__name__}: {error}"[:1000]
+                if isinstance(error, EmailNoConfigurado) or fila.intentos >= settings.EMAIL_MAX_INTENTOS:
+                    await db.execute(_SQL_FALLIDO, {"id": fila.id, "error": detalle})
+                    self.fallidos += 1
+                    logger.error(f"Correo {fila.id} a dead letter tras {fila.intentos} intentos: {detalle}")
+                else:
+                    espera = _espera_backoff(fila.intentos)
+                    await db.execute(_SQL_REINTENTAR, {"id": fila.id, "espera": espera, "error": detalle})
+                    self.reintentos += 1
+                    logger.warning(f"Correo {fila.id} falló (intento {fila.intentos}), reintento en {espera}s: {detalle}")
+            await db.commit()
+        self.enviados += len(enviados)
+        return len(filas)
+
+    def stats(self) -> dict:
+        return {
+            "activo": self._tarea is not None,
+            "enviados": self.enviados,
+            "reintentos": self.reintentos,
+            "fallidos": self.fallidos,
+        }
+
+
+worker = OutboxWorker()
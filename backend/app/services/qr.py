@@ -0,0 +1,64 @@
+import hashlib
+import io
+import re
+
+import qrcode
+from qrcode.image.pure import PyPNGImage
+from qrcode.image.svg import SvgPathImage
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.security import QRInvalido, verificar_qr
+
+# Código humano de la reserva: SA-1A2B3C / LI-1A2B3C (ver crear_reserva), o
+# el token firmado (Q1.…). Solo se renderizan esos: el endpoint no es un
+# generador de QR abierto.
+PATRON_CODIGO = re.compile(r"^[A-Z]{2}-[0-9A-F]{6}$")
+
+# El QR de un código nunca cambia: LRU con TTL largo
+qr_cache = TTLCache("qr", maxsize=settings.QR_CACHE_MAX, ttl=24 * 3600)
+
+_FORMATOS = {
+    "png": (PyPNGImage, "image/png"),
+    "svg": (SvgPathImage, "image/svg+xml"),
+}
+
+
+def codigo_valido(code: str) -> bool:
+    if PATRON_CODIGO.match(code):
+        return True
+    try:
+        verificar_qr(code)
+        return True
+    except QRInvalido:
+        return False
+
+
+def render_qr(code: str, formato: str):
+    """Devuelve (bytes, media_type, etag) del QR para el código de reserva."""
+    clave = (code, formato)
+    cacheado = qr_cache.get(clave)
+    if cacheado is not None:
+        return cacheado
+
+    fabrica, media_type = _FORMATOS[formato]
+    qr = qrcode.QRCode(
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        box_size=settings.QR_BOX_SIZE,
+        border=4,
+        image_factory=fabrica,
+    )
+    qr.add_data(code)
+    qr.make(fit=True)
+    buffer = io.BytesIO()
+    qr.make_image().save(buffer)
+    contenido = buffer.getvalue()
+
+    resultado = (contenido, media_type, f'"{hashlib.sha256(contenido).hexdigest()[:32]}"')
+    qr_cache.set(clave, resultado)
+    return resultado
+
+
+def url_qr(code: str) -> str:
+    """URL pública del PNG (para los correos); `code` puede ser el token firmado."""
+    return f"{settings.API_PUBLIC_URL.rstrip('/')}{settings.API_V1_STR}/reservas/{code}/qr.png"
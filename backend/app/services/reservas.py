@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models.models import TipoServicio
+
+# Pipeline de crear_reserva en un solo round trip. Son dos statements en el
+# mismo envío (psycopg2 los manda juntos): el primero toma el lock del usuario
+# y el segundo, que arranca con un snapshot nuevo (READ COMMITTED), valida e
+# inserta con un CTE. Si alguna regla falla no se inserta nada y se devuelve
+# el código del motivo.
+#
+# Las garantías finales contra carreras siguen en la BD: el índice único de
+# turnos de sala y el chequeo de stock del trigger de ocupación.
+
+_SQL_LOCK_USUARIO = "SELECT pg_advisory_xact_lock(hashtext(:clave_usuario));"
+
+_SQL_INSERTAR = """
+    INSERT INTO reservas (code, qr_token, usuario_dni, libro_id, recurso_id, tipo_servicio,
+                          fecha_reserva, hora_inicio, hora_fin, motivo, estado)
+    SELECT :code, :qr_token, :dni, CAST(:libro_id AS integer), CAST(:recurso_id AS integer),
+           CAST(:tipo AS tiposervicio), :fecha_reserva, :inicio, :fin, 'Web',
+           CAST('PENDIENTE' AS estadoreserva)
+    FROM motivo WHERE codigo IS NULL
+    RETURNING id
+"""
+
+_SQL_SALA = _SQL_LOCK_USUARIO + f"""
+    WITH usuario AS (
+        SELECT banned_until, dni_verificado FROM usuarios WHERE dni = :dni
+    ), recurso AS (
+        SELECT nombre FROM recursos WHERE id = :recurso_id
+    ), motivo AS (
+        SELECT CASE
+            WHEN (SELECT banned_until FROM usuario) > :ahora THEN 'BANEADO'
+            WHEN (SELECT dni_verificado FROM usuario) IS FALSE THEN 'DNI_NO_VERIFICADO'
+            WHEN NOT EXISTS (SELECT 1 FROM recurso) THEN 'NO_ENCONTRADO'
+            WHEN EXISTS (
+                SELECT 1 FROM reservas
+                WHERE recurso_id = :recurso_id AND hora_inicio = :inicio
+                  AND estado IN ('PENDIENTE', 'EN_USO')
+            ) THEN 'HORARIO_RESERVADO'
+            WHEN EXISTS (
+                SELECT 1 FROM reservas
+                WHERE usuario_dni = :dni AND tipo_servicio = 'SALA'
+                  AND estado IN ('PENDIENTE', 'EN_USO')
+                  AND hora_inicio >= :dia_desde AND hora_inicio < :dia_hasta
+            ) THEN 'LIMITE_TURNOS'
+        END AS codigo
+    ), nueva AS ({_SQL_INSERTAR})
+    SELECT m.codigo, (SELECT nombre FROM recurso) AS nombre,
+           NULL::date AS dia, (SELECT id FROM nueva) AS id
+    FROM motivo m
+"""
+
+_SQL_LIBRO = _SQL_LOCK_USUARIO + f"""
+    WITH usuario AS (
+        SELECT banned_until, dni_verificado FROM usuarios WHERE dni = :dni
+    ), libro AS (
+        SELECT id, titulo, stock_total FROM libros WHERE id = :libro_id
+    ), sin_stock AS (
+        SELECT min(o.dia) AS dia
+        FROM libro_ocupacion_diaria o JOIN libro l ON l.id = o.libro_id
+        WHERE o.dia BETWEEN CAST(:dia_desde AS date) AND CAST(:fin AS date)
+          AND o.reservados >= l.stock_total
+    ), motivo AS (
+        SELECT CASE
+            WHEN (SELECT banned_until FROM usuario) > :ahora THEN 'BANEADO'
+            WHEN (SELECT dni_verificado FROM usuario) IS FALSE THEN 'DNI_NO_VERIFICADO'
+            WHEN NOT EXISTS (SELECT 1 FROM libro) THEN 'NO_ENCONTRADO'
+            WHEN (SELECT dia FROM sin_stock) IS NOT NULL THEN 'SIN_STOCK'
+            WHEN (
+                SELECT count(*) FROM reservas
+                WHERE usuario_dni = :dni AND tipo_servicio = 'LIBRO'
+                  AND estado IN ('PENDIENTE', 'ENTREGADO')
+            ) >= :max_prestamos THEN 'LIMITE_PRESTAMOS'
+        END AS codigo
+    ), nueva AS ({_SQL_INSERTAR})
+    SELECT m.codigo, (SELECT titulo FROM libro) AS nombre,
+           (SELECT dia FROM sin_stock) AS dia, (SELECT id FROM nueva) AS id
+    FROM motivo m
+"""
+
+MAX_PRESTAMOS_ACTIVOS = 2
+
+
+def validar_e_insertar(
+    db: Session, *, tipo: TipoServicio, dni: str, code: str, qr_token: str,
+    libro_id, recurso_id, fecha_reserva: datetime, inicio: datetime, fin: datetime,
+    ahora: datetime,
+):
+    """
+    Ejecuta el pipeline y devuelve la fila (codigo, nombre, dia, id).
+    codigo es None si la reserva se insertó; no hace commit.
+    """
+    dia_desde = datetime.combine(inicio.date(), datetime.min.time())
+    params = {
+        "clave_usuario": f"usuario:{dni}",
+        "dni": dni, "code": code, "qr_token": qr_token,
+        "libro_id": libro_id, "recurso_id": recurso_id, "tipo": tipo.value,
+        "fecha_reserva": fecha_reserva, "inicio": inicio, "fin": fin, "ahora": ahora,
+        "dia_desde": dia_desde, "dia_hasta": dia_desde + timedelta(days=1),
+        "max_prestamos": MAX_PRESTAMOS_ACTIVOS,
+    }
+    sql = _SQL_SALA if tipo == TipoServicio.SALA else _SQL_LIBRO
+    return db.execute(text(sql), params).one()
@@ -0,0 +1,31 @@
+"""
+Barrido de reservas vencidas como proceso aparte (cron), con
+BARRIDO_EN_PROCESO=False en la API.
+
+Uso:
+    python scripts/barrido.py     # un barrido y sale
+"""
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.db.session import SessionLocal  # noqa: E402
+from app.services.barrido import barrer_reservas  # noqa: E402
+
+
+def main():
+    db = SessionLocal()
+    try:
+        resultado = barrer_reservas(db)
+    finally:
+        db.close()
+    if resultado["omitido"]:
+        print("Otro proceso está barriendo; nada que hacer")
+    else:
+        print(f"no_shows={resultado['no_shows']} vencidos={resultado['vencidos']} usuarios={resultado['usuarios']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Benchmark HTTP simple contra una instancia levantada de la API.
+
+Uso:
+    python scripts/bench.py --url http://localhost:8000/api/v1 --escenario catalogo -c 50 -n 2000
+
+Para comparar pooling, correr dos veces cambiando NULL_POOL en el .env del
+servidor (True / False) y revisar además GET /admin/sistema/pool.
+
+Para comparar sync vs async, correr el mismo escenario contra dos instancias
+(una en el commit anterior) subiendo -c hasta que el p95 llegue al objetivo:
+el throughput a esa latencia es el número a comparar.
+
+Login bajo carga (bcrypt en el pool de procesos): scripts/bench_login.py.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+ESCENARIOS = {
+    "catalogo": ["/catalogo/libros", "/catalogo/recursos", "/catalogo/sedes"],
+    # Sobre el catálogo sintético de scripts/seed_catalogo.py
+    "busqueda": [
+        "/catalogo/libros?q=vargas",
+        "/catalogo/libros?q=cien%20a%C3%B1os",
+        "/catalogo/libros?q=soleda",             # prefijo (mientras se escribe)
+        "/catalogo/libros?q=arguedsa",           # error de tipeo (trigramas)
+        "/catalogo/libros?q=978-0000012345",     # ISBN exacto
+    ],
+    "disponibilidad": [
+        "/reservas/disponibilidad?tipo=SALA&recurso_id={recurso_id}&fecha={fecha}",
+        "/reservas/disponibilidad?tipo=LIBRO&libro_id={libro_id}&mes={mes}",
+    ],
+}
+
+
+async def _worker(client, rutas, cola, latencias, errores):
+    while True:
+        try:
+            i = cola.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        inicio = time.perf_counter()
+        try:
+            r = await client.get(rutas[i % len(rutas)])
+            if r.status_code >= 400:
+                errores.append(r.status_code)
+        except httpx.HTTPError as e:
+            errores.append(type(e).__name__)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+
+
+async def correr(args):
+    rutas = [
+        r.format(recurso_id=args.recurso_id, libro_id=args.libro_id, fecha=args.fecha, mes=args.fecha[:7])
+        for r in ESCENARIOS[args.escenario]
+    ]
+    cola = asyncio.Queue()
+    for i in range(args.n):
+        cola.put_nowait(i)
+
+    latencias, errores = [], []
+    limits = httpx.Limits(max_connections=args.c, max_keepalive_connections=args.c)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30.0) as client:
+        inicio = time.perf_counter()
+        await asyncio.gather(*[_worker(client, rutas, cola, latencias, errores) for _ in range(args.c)])
+        total = time.perf_counter() - inicio
+
+    latencias.sort()
+    p = lambda q: latencias[min(int(len(latencias) * q), len(latencias) - 1)]
+    print(f"escenario={args.escenario} concurrencia={args.c} requests={len(latencias)} errores={len(errores)}")
+    print(f"throughput={len(latencias) / total:.1f} req/s")
+    print(f"p50={p(0.50):.1f}ms p95={p(0.95):.1f}ms p99={p(0.99):.1f}ms media={statistics.mean(latencias):.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000/api/v1")
+    parser.add_argument("--escenario", choices=ESCENARIOS.keys(), default="catalogo")
+    parser.add_argument("-c", type=int, default=20, help="concurrencia")
+    parser.add_argument("-n", type=int, default=1000, help="total de requests")
+    parser.add_argument("--recurso-id", type=int, default=1)
+    parser.add_argument("--libro-id", type=int, default=1)
+    parser.add_argument("--fecha", default=time.strftime("%Y-%m-%d"))
+    asyncio.run(correr(parser.parse_args()))
@@ -0,0 +1,115 @@
+"""
+Benchmark de login bajo carga: throughput de bcrypt por núcleo y latencia del
+catálogo con y sin ráfaga de logins.
+
+Corre dos fases de la misma duración:
+  1. solo catálogo (línea base)
+  2. catálogo + logins concurrentes con usuarios sintéticos (DNI 9xxxxxxx,
+     contraseña "carga", los mismos de scripts/carga_reservas.py)
+
+Con bcrypt en el pool de procesos el p95 del catálogo en la fase 2 debería
+quedar cerca de la línea base; logins/s por núcleo ≈ 1 / costo de un hash.
+
+Los logins salen de una IP: con el rate limit activo (POST /auth/login
+ip=30/60) casi todos serían 429 rápidos y no se mediría bcrypt. La API debe
+correr con RATE_LIMIT_HABILITADO=false (se consulta en GET
+/admin/sistema/rate-limit; --forzar para correr igual). Los 429 se cuentan
+aparte y no entran en logins/s.
+
+Uso:
+    python scripts/bench_login.py --url http://localhost:8000/api/v1 -u 200 -c 32 -d 20 --nucleos 4
+    python scripts/carga_reservas.py --limpiar
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from carga_reservas import exigir_rate_limit_apagado, preparar_usuarios  # noqa: E402
+
+RUTAS_CATALOGO = ["/catalogo/libros", "/catalogo/recursos", "/catalogo/sedes"]
+
+
+async def _bucle(client, hasta, pedir, latencias, errores, limitados):
+    i = 0
+    while time.perf_counter() < hasta:
+        inicio = time.perf_counter()
+        try:
+            r = await pedir(client, i)
+            if r.status_code == 429:
+                limitados.append(r.status_code)
+            elif r.status_code >= 400:
+                errores.append(r.status_code)
+        except httpx.HTTPError as e:
+            errores.append(type(e).__name__)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        i += 1
+
+
+def _resumen(nombre, latencias, errores, limitados, duracion):
+    if not latencias:
+        print(f"{nombre}: sin requests")
+        return
+    latencias.sort()
+    p = lambda q: latencias[min(int(len(latencias) * q), len(latencias) - 1)]
+    print(
+        f"{nombre}: requests={len(latencias)} errores={len(errores)} 429={len(limitados)} "
+        f"throughput={len(latencias) / duracion:.1f} req/s "
+        f"p50={p(0.50):.1f}ms p95={p(0.95):.1f}ms p99={p(0.99):.1f}ms media={statistics.mean(latencias):.1f}ms"
+    )
+
+
+async def fase(args, dnis, con_logins: bool):
+    catalogo, err_catalogo, lim_catalogo = [], [], []
+    logins, err_logins, lim_logins = [], [], []
+
+    async def pedir_catalogo(client, i):
+        return await client.get(RUTAS_CATALOGO[i % len(RUTAS_CATALOGO)])
+
+    async def pedir_login(client, i):
+        dni = random.choice(dnis)
+        return await client.post("/auth/login", data={"username": dni, "password": "carga"})
+
+    limits = httpx.Limits(max_connections=args.c + args.cl)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60.0) as client:
+        hasta = time.perf_counter() + args.d
+        tareas = [_bucle(client, hasta, pedir_catalogo, catalogo, err_catalogo, lim_catalogo) for _ in range(args.cl)]
+        if con_logins:
+            tareas += [_bucle(client, hasta, pedir_login, logins, err_logins, lim_logins) for _ in range(args.c)]
+        await asyncio.gather(*tareas)
+
+    _resumen("catalogo", catalogo, err_catalogo, lim_catalogo, args.d)
+    if con_logins:
+        _resumen("login", logins, err_logins, lim_logins, args.d)
+        ok = len(logins) - len(err_logins) - len(lim_logins)
+        print(f"logins/s por núcleo={ok / args.d / args.nucleos:.2f} (nucleos={args.nucleos})")
+
+
+async def correr(args):
+    exigir_rate_limit_apagado(args.url, args.forzar)
+    dnis = preparar_usuarios(args.u)
+    print(f"--- fase 1: solo catálogo ({args.d}s, {args.cl} clientes)")
+    await fase(args, dnis, con_logins=False)
+    print(f"--- fase 2: catálogo + {args.c} clientes haciendo login ({args.d}s)")
+    await fase(args, dnis, con_logins=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000/api/v1")
+    parser.add_argument("-u", type=int, default=200, help="usuarios sintéticos")
+    parser.add_argument("-c", type=int, default=32, help="clientes haciendo login en paralelo")
+    parser.add_argument("--cl", type=int, default=8, help="clientes leyendo el catálogo")
+    parser.add_argument("-d", type=float, default=20.0, help="segundos por fase")
+    parser.add_argument("--nucleos", type=int, default=int(os.environ.get("BCRYPT_WORKERS") or os.cpu_count() or 1),
+                        help="procesos de hashing del servidor (GET /admin/sistema/hashing)")
+    parser.add_argument("--forzar", action="store_true", help="correr aunque el rate limit esté activo")
+    asyncio.run(correr(parser.parse_args()))
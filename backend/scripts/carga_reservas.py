@@ -0,0 +1,166 @@
+"""
+Prueba de carga concurrente de POST /reservas/ (ráfaga sobre un mismo recurso).
+
+Crea usuarios sintéticos (DNI 9xxxxxxx), les emite tokens con SECRET_KEY y
+dispara todas las reservas a la vez contra la API. Al final verifica en la
+BD que no haya sobreventa y reporta reservas por segundo.
+
+Todas las reservas salen de una IP: con el rate limit activo (POST /reservas/
+ip=60/60) casi todo serían 429. La API debe correr con
+RATE_LIMIT_HABILITADO=false; el script lo consulta en GET
+/admin/sistema/rate-limit y no corre si no (--forzar para correr igual).
+Los 429 se reportan aparte.
+
+Uso:
+    python scripts/carga_reservas.py --url http://localhost:8000/api/v1 --sala 3 --fecha 2026-11-02T10:00:00 -u 300
+    python scripts/carga_reservas.py --url http://localhost:8000/api/v1 --libro 7 --fecha 2026-11-02T10:00:00 -u 300
+    python scripts/carga_reservas.py --limpiar
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import httpx
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import text  # noqa: E402
+
+from app.core.security import create_access_token, get_password_hash  # noqa: E402
+from app.db.session import engine  # noqa: E402
+
+PREFIJO_DNI = "9"
+# Los usuarios sintéticos se reconocen por el email, no por el DNI: un
+# 9xxxxxxx puede ser un usuario real
+_SINTETICOS = "SELECT dni FROM usuarios WHERE email LIKE '%@carga.local'"
+
+
+def preparar_usuarios(n: int) -> list:
+    dnis = [f"{PREFIJO_DNI}{i:07d}" for i in range(n)]
+    password_hash = get_password_hash("carga")
+    with engine.begin() as conn:
+        ajenos = conn.execute(text("""
+            SELECT dni FROM usuarios
+            WHERE dni = ANY(CAST(:dnis AS text[])) AND email NOT LIKE '%@carga.local'
+        """), {"dnis": dnis}).scalars().all()
+        if ajenos:
+            # No emitir tokens ni crear reservas a nombre de usuarios reales
+            raise SystemExit(
+                f"{len(ajenos)} DNI de prueba pertenecen a usuarios reales (p. ej. {ajenos[0]}); usar menos usuarios"
+            )
+        conn.execute(text("""
+            INSERT INTO usuarios (dni, email, nombre, password_hash, rol, strikes)
+            SELECT d, d || '@carga.local', 'Carga ' || d, :ph, 'USER', 0 FROM unnest(CAST(:dnis AS text[])) AS d
+            ON CONFLICT (dni) DO NOTHING
+        """), {"dnis": dnis, "ph": password_hash})
+    return dnis
+
+
+def exigir_rate_limit_apagado(url: str, forzar: bool = False):
+    """Corta (o avisa con --forzar) si el servidor no reporta el rate limit apagado."""
+    with engine.connect() as conn:
+        admin = conn.execute(text("SELECT dni FROM usuarios WHERE rol = 'ADMIN' LIMIT 1")).scalar()
+    if admin is None:
+        motivo = "no hay un ADMIN en la BD para consultar GET /admin/sistema/rate-limit"
+    else:
+        token = create_access_token(admin, role="ADMIN")
+        try:
+            r = httpx.get(f"{url}/admin/sistema/rate-limit", headers={"Authorization": f"Bearer {token}"}, timeout=10.0)
+        except httpx.HTTPError as e:
+            raise SystemExit(f"No se pudo consultar el rate limit del servidor: {type(e).__name__}")
+        if r.status_code != 200:
+            motivo = f"GET /admin/sistema/rate-limit respondió {r.status_code}"
+        elif r.json().get("habilitado", True):
+            motivo = "el servidor tiene RATE_LIMIT_HABILITADO=true"
+        else:
+            return
+    if forzar:
+        print(f"AVISO: {motivo}; los resultados incluirán 429")
+        return
+    raise SystemExit(f"{motivo}. Levantar la API con RATE_LIMIT_HABILITADO=false (o usar --forzar).")
+
+
+def limpiar():
+    with engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM reservas WHERE usuario_dni IN ({_SINTETICOS})"))
+        conn.execute(text("DELETE FROM usuarios WHERE email LIKE '%@carga.local'"))
+
+
+def verificar(args) -> int:
+    """Reservas vivas por encima de la capacidad (0 = sin sobreventa)."""
+    with engine.connect() as conn:
+        if args.sala:
+            return conn.execute(text("""
+                SELECT coalesce(sum(c - 1), 0) FROM (
+                    SELECT count(*) AS c FROM reservas
+                    WHERE recurso_id = :id AND estado IN ('PENDIENTE', 'EN_USO')
+                    GROUP BY hora_inicio HAVING count(*) > 1
+                ) t
+            """), {"id": args.sala}).scalar()
+        return conn.execute(text("""
+            SELECT coalesce(max(o.reservados - l.stock_total), 0)
+            FROM libro_ocupacion_diaria o JOIN libros l ON l.id = o.libro_id
+            WHERE o.libro_id = :id AND o.reservados > l.stock_total
+        """), {"id": args.libro}).scalar()
+
+
+async def correr(args):
+    exigir_rate_limit_apagado(args.url, args.forzar)
+    dnis = preparar_usuarios(args.u)
+    inicio = datetime.fromisoformat(args.fecha)
+    payload = {
+        "tipo": "SALA" if args.sala else "LIBRO",
+        "recurso_id": args.sala,
+        "libro_id": args.libro,
+        "fecha_reserva": inicio.isoformat(),
+        "hora_inicio": inicio.isoformat(),
+        "hora_fin": (inicio + (timedelta(hours=1) if args.sala else timedelta(days=2))).isoformat(),
+    }
+    tokens = [create_access_token(dni) for dni in dnis]
+
+    resultados = Counter()
+    limits = httpx.Limits(max_connections=args.c)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60.0) as client:
+        async def reservar(token):
+            try:
+                r = await client.post("/reservas/", json=payload, headers={"Authorization": f"Bearer {token}"})
+                resultados[r.status_code] += 1
+            except httpx.HTTPError as e:
+                resultados[type(e).__name__] += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*[reservar(t) for t in tokens])
+        total = time.perf_counter() - t0
+
+    print(f"requests={len(tokens)} tiempo={total:.2f}s -> {len(tokens) / total:.1f} req/s")
+    print(f"resultados={dict(resultados)} (exitosas: {resultados[200]} -> {resultados[200] / total:.1f} reservas/s)")
+    if resultados[429]:
+        print(f"AVISO: {resultados[429]} rechazadas por rate limit (429): no miden el pipeline de reservas")
+    exceso = verificar(args)
+    print("OK: sin sobreventa" if exceso == 0 else f"ERROR: sobreventa de {exceso}")
+    return 0 if exceso == 0 else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000/api/v1")
+    grupo = parser.add_mutually_exclusive_group()
+    grupo.add_argument("--sala", type=int, help="recurso_id de la sala")
+    grupo.add_argument("--libro", type=int, help="libro_id")
+    parser.add_argument("--fecha", help="inicio de la reserva (ISO, hora Perú)")
+    parser.add_argument("-u", type=int, default=200, help="usuarios concurrentes")
+    parser.add_argument("-c", type=int, default=100, help="conexiones HTTP simultáneas")
+    parser.add_argument("--limpiar", action="store_true", help="borra usuarios y reservas sintéticos")
+    parser.add_argument("--forzar", action="store_true", help="correr aunque el rate limit esté activo")
+    args = parser.parse_args()
+
+    if args.limpiar:
+        limpiar()
+        sys.exit(0)
+    if not (args.sala or args.libro) or not args.fecha:
+        parser.error("indicar --sala o --libro y --fecha")
+    sys.exit(asyncio.run(correr(args)))
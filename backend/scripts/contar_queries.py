@@ -0,0 +1,184 @@
+"""
+Verifica que el catálogo y las exportaciones no tengan N+1: cuenta los
+statements (app.db.guard.contar_queries) de cada endpoint con una página de
+1 fila y con una de PAGE_SIZE_MAX, y exige que el conteo no crezca con las
+filas y no pase del máximo de su limite_queries. Sale con código 1 si algo falla.
+
+Con --sin-bd no necesita Postgres (sirve en CI): corre los handlers de
+/catalogo con una sesión falsa que devuelve filas sintéticas y cuenta cada
+execute, dentro del mismo limite_queries de la ruta con QUERY_GUARD=raise.
+Solo cubre el catálogo: la exportación abre su propia conexión.
+
+Uso:
+    python scripts/contar_queries.py
+    python scripts/contar_queries.py -v     # imprime los statements
+    python scripts/contar_queries.py --sin-bd
+"""
+import argparse
+import asyncio
+import sys
+from collections import namedtuple
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from fastapi import HTTPException, Response  # noqa: E402
+from sqlalchemy.dialects import postgresql  # noqa: E402
+
+from app.api.endpoints import admin, catalogo  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.db.guard import contar_queries, limite_queries, registrar_query  # noqa: E402
+from app.db.session import AsyncSessionLocal  # noqa: E402
+from app.models.models import Libro, Recurso, Sede  # noqa: E402
+
+
+def casos_catalogo():
+    """(nombre, ruta, llamada(db, limit)): replica los parámetros de cada ruta."""
+    yield "GET /catalogo/sedes", "/sedes", lambda db, limit: catalogo.obtener_sedes_publicas(db=db)
+    yield "GET /catalogo/libros", "/libros", lambda db, limit: catalogo.buscar_libros(
+        Response(), q=None, sede_id=None, categoria=None, fecha=None, cursor=None,
+        limit=limit, estimar_total=False, db=db,
+    )
+    yield "GET /catalogo/libros?q=", "/libros", lambda db, limit: catalogo.buscar_libros(
+        Response(), q="a", sede_id=None, categoria=None, fecha=None, cursor=None,
+        limit=limit, estimar_total=False, db=db,
+    )
+    yield "GET /catalogo/libros?estimar_total=", "/libros", lambda db, limit: catalogo.buscar_libros(
+        Response(), q=None, sede_id=None, categoria=None, fecha=None, cursor=None,
+        limit=limit, estimar_total=True, db=db,
+    )
+    yield "GET /catalogo/recursos", "/recursos", lambda db, limit: catalogo.buscar_recursos(
+        Response(), tipo=None, sede_id=None, cursor=None, limit=limit, estimar_total=False, db=db,
+    )
+
+
+# --- Sin BD ---
+
+FilaLibro = namedtuple("FilaLibro", "Libro nombre stock_disponible rank")
+FilaRecurso = namedtuple("FilaRecurso", "Recurso nombre")
+
+# Filas sintéticas por ruta, con la forma del SELECT del endpoint
+FILAS_FALSAS = {
+    "/sedes": lambda n: [Sede(id=i, nombre=f"Sede {i}") for i in range(n)],
+    "/libros": lambda n: [FilaLibro(Libro(id=i, titulo=f"Libro {i}"), "Sede", 1, 0.5) for i in range(n)],
+    "/recursos": lambda n: [FilaRecurso(Recurso(id=i, nombre=f"Sala {i}"), "Sede") for i in range(n)],
+}
+
+
+class ResultadoFalso:
+    def __init__(self, filas: list):
+        self.filas = filas
+
+    def all(self):
+        return self.filas
+
+    def scalars(self):
+        return self
+
+    def scalar(self):
+        return [{"Plan": {"Plan Rows": len(self.filas)}}]  # EXPLAIN de estimar_total
+
+
+class SesionFalsa:
+    """AsyncSession mínima: cada execute es una query y devuelve `n` filas."""
+
+    def __init__(self, filas, n: int):
+        self.filas, self.n = filas, n
+        self.queries = []
+
+    async def execute(self, stmt):
+        sql = str(stmt.compile(dialect=postgresql.dialect()))
+        self.queries.append(sql)
+        registrar_query(sql)
+        return ResultadoFalso(self.filas(self.n))
+
+
+def maximo_de_ruta(path: str) -> int:
+    """El máximo del limite_queries declarado en la ruta (no una copia a mano)."""
+    ruta = next(r for r in catalogo.router.routes if r.path == path)
+    return next(d.dependency.maximo for d in ruta.dependencies if hasattr(d.dependency, "maximo"))
+
+
+async def correr_sin_bd(verbose: bool) -> int:
+    settings.QUERY_GUARD = "raise"
+    fallos = 0
+    for nombre, path, llamada in casos_catalogo():
+        maximo = maximo_de_ruta(path)
+        conteos = []
+        try:
+            for limit in (1, settings.PAGE_SIZE_MAX):
+                # limit + 1 filas: la página llena más la que indica que hay siguiente
+                db = SesionFalsa(FILAS_FALSAS[path], limit + 1)
+                # El mismo guard de la ruta, abierto y cerrado como lo hace FastAPI
+                async with asynccontextmanager(limite_queries(maximo))():
+                    await llamada(db, limit)
+                conteos.append(db.queries)
+        except HTTPException as e:
+            fallos += reportar(nombre, False, e.detail, db.queries, verbose)
+            continue
+        una, muchas = conteos
+        fallos += reportar(
+            nombre, len(una) == len(muchas),
+            f"{len(una)} queries con limit=1, {len(muchas)} con limit={settings.PAGE_SIZE_MAX} (máximo {maximo})",
+            muchas, verbose,
+        )
+    return 1 if fallos else 0
+
+
+# --- Contra la BD ---
+
+async def contar_catalogo(llamada, limit: int) -> list:
+    async with AsyncSessionLocal() as db:
+        with contar_queries() as qs:
+            await llamada(db, limit)
+    return qs
+
+
+async def contar_exportacion(tipo: str) -> list:
+    """Exporta completo (incluido el streaming, que corre en el threadpool)."""
+    with contar_queries() as qs:
+        respuesta = admin.exportar_data(
+            tipo, desde=None, hasta=None, sede_id=None, gzip=False, formato="csv", particionar=None, admin=None,
+        )
+        async for _ in respuesta.body_iterator:
+            pass
+    return qs
+
+
+def reportar(nombre: str, ok: bool, detalle: str, qs: list, verbose: bool) -> int:
+    print(f"{'OK   ' if ok else 'FALLA'} {nombre}: {detalle}")
+    if verbose or not ok:
+        for statement in qs:
+            print("      " + " ".join(statement.split())[:200])
+    return 0 if ok else 1
+
+
+async def correr(verbose: bool) -> int:
+    fallos = 0
+    for nombre, path, llamada in casos_catalogo():
+        maximo = maximo_de_ruta(path)
+        una = await contar_catalogo(llamada, 1)
+        muchas = await contar_catalogo(llamada, settings.PAGE_SIZE_MAX)
+        ok = len(una) == len(muchas) <= maximo
+        fallos += reportar(
+            nombre, ok, f"{len(una)} queries con limit=1, {len(muchas)} con limit={settings.PAGE_SIZE_MAX} "
+            f"(máximo {maximo})", muchas, verbose,
+        )
+
+    # Un statement por sección del CSV, sin importar cuántas filas salgan
+    for tipo, secciones in (("reservas", 1), ("usuarios", 1), ("inventario", 2)):
+        qs = await contar_exportacion(tipo)
+        fallos += reportar(
+            f"GET /admin/reportes/exportar/{tipo}", len(qs) == secciones,
+            f"{len(qs)} queries (esperado {secciones})", qs, verbose,
+        )
+    return 1 if fallos else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-v", action="store_true", help="imprime los statements")
+    parser.add_argument("--sin-bd", action="store_true", help="solo catálogo, con una sesión falsa (sin Postgres)")
+    args = parser.parse_args()
+    sys.exit(asyncio.run((correr_sin_bd if args.sin_bd else correr)(args.v)))
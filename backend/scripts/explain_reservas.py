@@ -0,0 +1,116 @@
+"""
+Verifica con EXPLAIN que las consultas calientes sobre reservas usan índices.
+
+Corre cada consulta con enable_seqscan=off (dentro de una transacción que se
+descarta): si aun así el plan no toca alguno de los índices esperados, el
+predicado no es sargable o falta el índice. Sale con código 1 si algo falla.
+
+Uso:
+    python scripts/explain_reservas.py
+    python scripts/explain_reservas.py -v     # imprime los planes
+"""
+import argparse
+import json
+import sys
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import func, or_, select, text  # noqa: E402
+
+from app.core.paginacion import Explain  # noqa: E402
+from app.db.session import SessionLocal  # noqa: E402
+from app.models.models import Reserva, EstadoReserva, TipoServicio  # noqa: E402
+from app.services.disponibilidad import ESTADOS_LIBRO_ACTIVOS, ESTADOS_SALA_ACTIVOS, horas_ocupadas_sala, rango_del_dia  # noqa: E402
+
+HOY = date.today()
+INICIO, FIN = rango_del_dia(HOY)
+
+
+def casos():
+    """(nombre, consulta, índices aceptables): la consulta replica la del endpoint."""
+    yield (
+        "disponibilidad de sala (GET /reservas/disponibilidad)",
+        horas_ocupadas_sala(1, HOY),
+        {"ix_reservas_recurso_estado_inicio", "uq_reservas_sala_turno_activo"},
+    )
+    yield (
+        "reservas vivas de un libro en un periodo",
+        select(func.count()).select_from(Reserva).where(
+            Reserva.libro_id == 1, Reserva.estado.in_(ESTADOS_LIBRO_ACTIVOS),
+            Reserva.hora_inicio <= FIN + timedelta(days=4), Reserva.hora_fin >= INICIO,
+        ),
+        {"ix_reservas_libro_estado_periodo"},
+    )
+    yield (
+        "límite de 1 turno por día (crear_reserva)",
+        select(Reserva.id).where(
+            Reserva.usuario_dni == "00000000", Reserva.tipo_servicio == TipoServicio.SALA,
+            Reserva.estado.in_(ESTADOS_SALA_ACTIVOS),
+            Reserva.hora_inicio >= INICIO, Reserva.hora_inicio < FIN,
+        ).limit(1),
+        {"ix_reservas_usuario_tipo_estado"},
+    )
+    yield (
+        "préstamos activos del usuario (crear_reserva)",
+        select(func.count()).select_from(Reserva).where(
+            Reserva.usuario_dni == "00000000", Reserva.tipo_servicio == TipoServicio.LIBRO,
+            Reserva.estado.in_(ESTADOS_LIBRO_ACTIVOS),
+        ),
+        {"ix_reservas_usuario_tipo_estado"},
+    )
+    yield (
+        "listado admin por día (GET /admin/reservas?fecha=)",
+        select(Reserva.id).where(Reserva.fecha_reserva >= INICIO, Reserva.fecha_reserva < FIN)
+        .order_by(Reserva.fecha_reserva.desc()).limit(100),
+        {"ix_reservas_fecha_reserva", "ix_reservas_estado_fecha"},
+    )
+    yield (
+        "listado admin por estado y día",
+        select(Reserva.id).where(
+            Reserva.estado == EstadoReserva.NO_SHOW, Reserva.fecha_reserva >= INICIO, Reserva.fecha_reserva < FIN,
+        ).order_by(Reserva.fecha_reserva.desc()).limit(100),
+        {"ix_reservas_estado_fecha"},
+    )
+    yield (
+        "escaneo de QR (POST /admin/validar-qr)",
+        select(Reserva.id).where(or_(Reserva.qr_token == "x", Reserva.code == "x")),
+        {"ix_reservas_qr_token", "reservas_qr_token_key"},
+    )
+
+
+def indices_del_plan(nodo) -> set:
+    encontrados = {nodo["Index Name"]} if "Index Name" in nodo else set()
+    for hijo in nodo.get("Plans", []):
+        encontrados |= indices_del_plan(hijo)
+    return encontrados
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-v", action="store_true", help="imprime los planes")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    fallos = 0
+    try:
+        db.execute(text("SET LOCAL enable_seqscan = off"))
+        for nombre, stmt, esperados in casos():
+            plan = db.execute(Explain(stmt)).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            usados = indices_del_plan(plan[0]["Plan"])
+            ok = bool(usados & esperados)
+            fallos += not ok
+            print(f"{'OK   ' if ok else 'FALLA'} {nombre}: usa {sorted(usados) or 'ningún índice'}")
+            if args.v or not ok:
+                print(json.dumps(plan[0]["Plan"], indent=2))
+    finally:
+        db.rollback()
+        db.close()
+    return 1 if fallos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
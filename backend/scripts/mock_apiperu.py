@@ -0,0 +1,66 @@
+"""
+Servidor local que imita POST /api/dni de apiperu.dev, para pruebas y
+benchmarks del registro sin gastar consultas del proveedor.
+
+Responde un nombre sintético para cualquier DNI de 8 dígitos, salvo los que
+empiezan con 0 (no encontrado). Se puede simular un proveedor lento o caído.
+
+Uso:
+    python scripts/mock_apiperu.py --puerto 8099 --latencia 0.2 --errores 0.1
+    # en el .env de la API:
+    APIPERU_URL=http://localhost:8099/api
+    APIPERU_TOKEN=mock
+"""
+import argparse
+import asyncio
+import random
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="mock apiperu.dev")
+config = {"latencia": 0.0, "errores": 0.0, "caido": False}
+contadores = {"consultas": 0}
+
+
+@app.post("/api/dni")
+async def consultar_dni(request: Request):
+    contadores["consultas"] += 1
+    if config["latencia"]:
+        await asyncio.sleep(config["latencia"])
+    if config["caido"] or random.random() < config["errores"]:
+        return JSONResponse({"success": False, "message": "Servicio no disponible"}, status_code=503)
+
+    dni = str((await request.json()).get("dni", ""))
+    if len(dni) != 8 or not dni.isdigit() or dni.startswith("0"):
+        return {"success": False, "message": "No se encontraron resultados"}
+    return {
+        "success": True,
+        "data": {
+            "numero": dni,
+            "nombres": f"NOMBRE{dni[-3:]}",
+            "apellido_paterno": "PRUEBA",
+            "apellido_materno": f"MOCK{dni[:2]}",
+        },
+    }
+
+
+@app.post("/control")
+async def control(caido: Optional[bool] = None, latencia: Optional[float] = None, errores: Optional[float] = None):
+    """Cambia el comportamiento en caliente (p. ej. para abrir el circuit breaker)."""
+    for clave, valor in (("caido", caido), ("latencia", latencia), ("errores", errores)):
+        if valor is not None:
+            config[clave] = valor
+    return {**config, **contadores}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--puerto", type=int, default=8099)
+    parser.add_argument("--latencia", type=float, default=0.0, help="segundos por respuesta")
+    parser.add_argument("--errores", type=float, default=0.0, help="fracción de respuestas 503")
+    args = parser.parse_args()
+    config.update(latencia=args.latencia, errores=args.errores)
+    uvicorn.run(app, host="127.0.0.1", port=args.puerto, log_level="warning")
@@ -0,0 +1,45 @@
+"""
+Verifica o reconstruye libro_ocupacion_diaria a partir de reservas.
+
+Uso:
+    python scripts/ocupacion.py                 # solo verifica (exit 1 si hay diferencias)
+    python scripts/ocupacion.py --reconstruir   # recalcula toda la tabla
+    python scripts/ocupacion.py --libro-id 42 --reconstruir
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.db.session import SessionLocal  # noqa: E402
+from app.services.disponibilidad import verificar_ocupacion, reconstruir_ocupacion  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--libro-id", type=int, default=None)
+    parser.add_argument("--reconstruir", action="store_true")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.reconstruir:
+            filas = reconstruir_ocupacion(db, args.libro_id)
+            print(f"Reconstruida: {filas} filas (libro, día)")
+            return 0
+
+        diferencias = verificar_ocupacion(db, args.libro_id)
+        for d in diferencias[:50]:
+            print(f"libro={d.libro_id} dia={d.dia} esperado={d.esperado} actual={d.actual}")
+        if diferencias:
+            print(f"{len(diferencias)} diferencias. Ejecutar con --reconstruir para corregir.")
+            return 1
+        print("OK: ocupación consistente")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
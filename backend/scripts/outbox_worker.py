@@ -0,0 +1,37 @@
+"""
+Worker de correos como proceso aparte (con EMAIL_WORKER_EN_PROCESO=False en la API).
+
+Uso:
+    python scripts/outbox_worker.py            # corre hasta Ctrl+C
+    python scripts/outbox_worker.py --una-vez  # drena lo pendiente y sale
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.services.outbox import worker  # noqa: E402
+
+
+async def main(args):
+    if args.una_vez:
+        total = 0
+        while (n := await worker.procesar_lote()) > 0:
+            total += n
+        print(f"procesados={total} {worker.stats()}")
+        return
+    await worker.iniciar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--una-vez", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,77 @@
+"""
+Genera un catálogo sintético de libros para benchmarks (no usar en producción).
+
+Uso:
+    python scripts/seed_catalogo.py --sede-id 1 -n 1000000
+
+Los libros se crean con disponible=True y codigo_inventario "BENCH-…" para
+poder borrarlos luego con --limpiar.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import text  # noqa: E402
+
+from app.db.session import engine  # noqa: E402
+
+PALABRAS = [
+    "historia", "perú", "andes", "poesía", "cien", "años", "soledad", "ciudad", "perros",
+    "río", "profundo", "conversación", "catedral", "túpac", "amaru", "inca", "mar", "sol",
+    "memoria", "guerra", "tiempo", "amor", "cólera", "pájaros", "nación", "lima", "selva",
+]
+AUTORES = [
+    "Mario Vargas Llosa", "José María Arguedas", "César Vallejo", "Ciro Alegría",
+    "Julio Ramón Ribeyro", "Gabriel García Márquez", "Isabel Allende", "Jorge Luis Borges",
+]
+
+SQL_INSERT = text("""
+    INSERT INTO libros (codigo_inventario, titulo, autor, isbn, categoria, sede_id, stock_total, disponible)
+    SELECT
+        'BENCH-' || g,
+        initcap((:palabras)[1 + (g * 7) % cardinality(:palabras)] || ' ' ||
+                (:palabras)[1 + (g * 13) % cardinality(:palabras)] || ' ' ||
+                (:palabras)[1 + (g * 31) % cardinality(:palabras)]) || ' ' || g,
+        (:autores)[1 + g % cardinality(:autores)],
+        (9780000000000 + g)::text,
+        'Bench',
+        :sede_id,
+        1 + g % 3,
+        true
+    FROM generate_series(:desde, :hasta) AS g
+""")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sede-id", type=int, required=True)
+    parser.add_argument("-n", type=int, default=1_000_000)
+    parser.add_argument("--lote", type=int, default=100_000)
+    parser.add_argument("--limpiar", action="store_true", help="borra los libros BENCH-*")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        if args.limpiar:
+            borrados = conn.execute(text("DELETE FROM libros WHERE codigo_inventario LIKE 'BENCH-%'")).rowcount
+            print(f"Eliminados {borrados} libros sintéticos")
+            return
+
+    inicio = time.perf_counter()
+    for desde in range(1, args.n + 1, args.lote):
+        hasta = min(desde + args.lote - 1, args.n)
+        with engine.begin() as conn:
+            conn.execute(SQL_INSERT, {
+                "palabras": PALABRAS, "autores": AUTORES, "sede_id": args.sede_id,
+                "desde": desde, "hasta": hasta,
+            })
+        print(f"{hasta}/{args.n} ({time.perf_counter() - inicio:.1f}s)")
+
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE libros"))
+
+
+if __name__ == "__main__":
+    main()
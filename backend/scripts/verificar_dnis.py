@@ -0,0 +1,42 @@
+"""
+Verificación diferida de DNI: reintenta contra apiperu.dev los usuarios que
+se registraron con el proveedor caído (usuarios.dni_verificado = false).
+Pensado para cron; también está POST /admin/sistema/apiperu/verificar-pendientes.
+
+Uso:
+    python scripts/verificar_dnis.py --limite 200
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.db.session import AsyncSessionLocal, async_engine  # noqa: E402
+from app.services.apiperu import cliente_apiperu, verificar_pendientes  # noqa: E402
+
+
+async def main(limite: int) -> int:
+    try:
+        async with AsyncSessionLocal() as db:
+            resultado = await verificar_pendientes(db, limite)
+    finally:
+        await cliente_apiperu.cerrar()
+        await async_engine.dispose()
+    print(
+        f"pendientes={resultado['pendientes']} verificados={resultado['verificados']} "
+        f"no_encontrados={len(resultado['no_encontrados'])}"
+    )
+    for dni in resultado["no_encontrados"]:
+        print(f"  sin datos en el proveedor (marcado dni_rechazado): {dni}")
+    if resultado["error"]:
+        print(f"Proveedor no disponible ({resultado['error']}); el resto queda para la próxima corrida")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--limite", type=int, default=100, help="usuarios por corrida")
+    sys.exit(asyncio.run(main(parser.parse_args().limite)))
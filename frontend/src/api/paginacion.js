@@ -0,0 +1,8 @@
+import client from './client';
+
+// Los listados paginados devuelven un arreglo y el cursor de la página
+// siguiente en la cabecera X-Next-Cursor (ausente en la última página).
+export async function obtenerPagina(url, cursor) {
+  const res = await client.get(url, { params: cursor ? { cursor } : undefined });
+  return { items: res.data, siguiente: res.headers['x-next-cursor'] || null };
+}
@@ -0,0 +1,23 @@
+import React, { useState } from 'react';
+
+export default function CargarMas({ visible, onClick }) {
+  const [cargando, setCargando] = useState(false);
+  if (!visible) return null;
+
+  const handleClick = async () => {
+    setCargando(true);
+    try { await onClick(); } finally { setCargando(false); }
+  };
+
+  return (
+    <div className="flex justify-center mt-6">
+      <button
+        onClick={handleClick}
+        disabled={cargando}
+        className="px-6 py-2.5 rounded-lg font-bold border border-neutral-300 text-neutral-700 bg-white hover:bg-neutral-100 transition disabled:opacity-50"
+      >
+        {cargando ? 'Cargando...' : 'Cargar más'}
+      </button>
+    </div>
+  );
+}
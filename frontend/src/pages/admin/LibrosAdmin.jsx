@@ -1,10 +1,13 @@
 import React, { useEffect, useState } from 'react';
 import client from '../../api/client';
+import { obtenerPagina } from '../../api/paginacion';
+import CargarMas from '../../components/CargarMas';
 import { Book, Pencil, Power, RotateCcw, XCircle } from 'lucide-react';
 
 export default function LibrosAdmin() {
   const [libros, setLibros] = useState([]);
   const [sedes, setSedes] = useState([]);
+  const [cursor, setCursor] = useState(null);
   const [editingId, setEditingId] = useState(null);
 
   const [form, setForm] = useState({ 
@@ -14,14 +17,21 @@ export default function LibrosAdmin() {
   useEffect(() => { fetchData(); }, []);
 
   const fetchData = async () => {
-    const [resLibros, resSedes] = await Promise.all([
-      client.get('/admin/libros'),
+    const [pagina, resSedes] = await Promise.all([
+      obtenerPagina('/admin/libros'),
       client.get('/admin/sedes')
     ]);
-    setLibros(resLibros.data);
+    setLibros(pagina.items);
+    setCursor(pagina.siguiente);
     setSedes(resSedes.data.filter(s => s.activo));
   };
 
+  const cargarMas = async () => {
+    const pagina = await obtenerPagina('/admin/libros', cursor);
+    setLibros(prev => [...prev, ...pagina.items]);
+    setCursor(pagina.siguiente);
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     if (!form.sede_id) return alert('Debes seleccionar una sede');
@@ -170,6 +180,7 @@ export default function LibrosAdmin() {
             </table>
           </div>
           {libros.length === 0 && <div className="p-8 text-center text-neutral-400 border border-dashed border-neutral-200 rounded-xl bg-white mt-4">No hay libros registrados.</div>}
+          <CargarMas visible={!!cursor} onClick={cargarMas} />
         </div>
       </div>
     </div>
@@ -1,10 +1,13 @@
 import React, { useEffect, useState } from 'react';
 import client from '../../api/client';
+import { obtenerPagina } from '../../api/paginacion';
+import CargarMas from '../../components/CargarMas';
 import { Monitor, Users, Trash2, Pencil, Power, XCircle, RotateCcw } from 'lucide-react';
 
 export default function RecursosAdmin() {
   const [items, setItems] = useState([]);
   const [sedes, setSedes] = useState([]);
+  const [cursor, setCursor] = useState(null);
   const [editingId, setEditingId] = useState(null);
   
   const [form, setForm] = useState({ 
@@ -14,14 +17,21 @@ export default function RecursosAdmin() {
   useEffect(() => { fetchData(); }, []);
 
   const fetchData = async () => {
-    const [resItems, resSedes] = await Promise.all([
-      client.get('/admin/recursos'),
+    const [pagina, resSedes] = await Promise.all([
+      obtenerPagina('/admin/recursos'),
       client.get('/admin/sedes')
     ]);
-    setItems(resItems.data);
+    setItems(pagina.items);
+    setCursor(pagina.siguiente);
     setSedes(resSedes.data.filter(s => s.activo));
   };
 
+  const cargarMas = async () => {
+    const pagina = await obtenerPagina('/admin/recursos', cursor);
+    setItems(prev => [...prev, ...pagina.items]);
+    setCursor(pagina.siguiente);
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     if (!form.sede_id) return alert("Selecciona una sede");
@@ -180,6 +190,7 @@ export default function RecursosAdmin() {
             </table>
           </div>
           {items.length === 0 && <div className="p-8 text-center text-neutral-400 border border-dashed border-neutral-200 rounded-xl bg-white mt-4">No hay recursos registrados.</div>}
+          <CargarMas visible={!!cursor} onClick={cargarMas} />
         </div>
       </div>
     </div>
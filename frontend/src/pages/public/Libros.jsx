@@ -1,5 +1,7 @@
 import React, { useEffect, useState } from 'react';
 import client from '../../api/client';
+import { obtenerPagina } from '../../api/paginacion';
+import CargarMas from '../../components/CargarMas';
 import { useAuth } from '../../context/AuthContext';
 import ReservaModal from '../../components/modals/ReservaModal';
 import { Search, Filter, BookOpen, MapPin, AlertCircle } from 'lucide-react';
@@ -8,6 +10,8 @@ export default function Libros() {
   const [libros, setLibros] = useState([]);
   const [selectedBook, setSelectedBook] = useState(null);
   const [loading, setLoading] = useState(true);
+  // El cursor vale para la consulta que lo generó, no para los filtros en edición
+  const [listado, setListado] = useState({ url: null, cursor: null });
   const { user } = useAuth();
 
   // Estados para filtros
@@ -15,13 +19,19 @@ export default function Libros() {
   const [filtroSede, setFiltroSede] = useState('');
   const [busqueda, setBusqueda] = useState('');
 
+  const urlBusqueda = () => {
+    let url = `/catalogo/libros?q=${encodeURIComponent(busqueda)}`;
+    if (filtroSede) url += `&sede_id=${filtroSede}`;
+    return url;
+  };
+
   const cargarDatos = async () => {
     setLoading(true);
     try {
-      let url = `/catalogo/libros?q=${busqueda}`;
-      if (filtroSede) url += `&sede_id=${filtroSede}`;
-      const res = await client.get(url);
-      setLibros(res.data);
+      const url = urlBusqueda();
+      const pagina = await obtenerPagina(url);
+      setLibros(pagina.items);
+      setListado({ url, cursor: pagina.siguiente });
     } catch (error) {
       console.error("Error cargando libros", error);
     } finally {
@@ -34,6 +44,12 @@ export default function Libros() {
     cargarDatos();
   }, []);
 
+  const cargarMas = async () => {
+    const pagina = await obtenerPagina(listado.url, listado.cursor);
+    setLibros(prev => [...prev, ...pagina.items]);
+    setListado({ ...listado, cursor: pagina.siguiente });
+  };
+
   const handleReservarClick = (libro) => {
     setSelectedBook(libro);
   };
@@ -138,6 +154,7 @@ export default function Libros() {
               ))}
             </div>
           )}
+          {!loading && <CargarMas visible={!!listado.cursor} onClick={cargarMas} />}
         </div>
       </div>
 
@@ -1,5 +1,7 @@
 import React, { useEffect, useState } from 'react';
 import client from '../../api/client';
+import { obtenerPagina } from '../../api/paginacion';
+import CargarMas from '../../components/CargarMas';
 import { useAuth } from '../../context/AuthContext';
 import ReservaModal from '../../components/modals/ReservaModal';
 import { Monitor, Users, MapPin, Search, Filter, LayoutGrid } from 'lucide-react';
@@ -9,20 +11,28 @@ export default function Recursos() {
   const [sedes, setSedes] = useState([]);
   const [selectedItem, setSelectedItem] = useState(null);
   const [loading, setLoading] = useState(true);
+  // El cursor vale para la consulta que lo generó, no para los filtros en edición
+  const [listado, setListado] = useState({ url: null, cursor: null });
   const { user } = useAuth();
   
   // Filtros
   const [filtroSede, setFiltroSede] = useState('');
   const [filtroTipo, setFiltroTipo] = useState('');
 
+  const urlFiltros = () => {
+    let url = '/catalogo/recursos?';
+    if (filtroSede) url += `&sede_id=${filtroSede}`;
+    if (filtroTipo) url += `&tipo=${filtroTipo}`;
+    return url;
+  };
+
   const cargarDatos = async () => {
     setLoading(true);
     try {
-      let url = '/catalogo/recursos?';
-      if (filtroSede) url += `&sede_id=${filtroSede}`;
-      if (filtroTipo) url += `&tipo=${filtroTipo}`;
-      const res = await client.get(url);
-      setItems(res.data);
+      const url = urlFiltros();
+      const pagina = await obtenerPagina(url);
+      setItems(pagina.items);
+      setListado({ url, cursor: pagina.siguiente });
     } catch (error) {
       console.error(error);
     } finally {
@@ -35,6 +45,12 @@ export default function Recursos() {
     cargarDatos();
   }, []);
 
+  const cargarMas = async () => {
+    const pagina = await obtenerPagina(listado.url, listado.cursor);
+    setItems(prev => [...prev, ...pagina.items]);
+    setListado({ ...listado, cursor: pagina.siguiente });
+  };
+
   const handleAgendar = (item) => {
     setSelectedItem(item);
   };
@@ -149,6 +165,7 @@ export default function Recursos() {
               ))}
             </div>
           )}
+          {!loading && <CargarMas visible={!!listado.cursor} onClick={cargarMas} />}
         </div>
       </div>
 